@@ -0,0 +1,670 @@
+import argparse
+import asyncio
+import gc
+import os
+import re
+import shutil
+import tempfile
+import time
+import tracemalloc
+import json
+import urllib.parse
+
+import telegram
+from telegram import Update
+from telegram.ext import Application
+
+import bot
+
+
+#пользователь до перехода на __slots__, для сравнения / the user class before the switch to __slots__, for comparison
+class LegacyUser:
+    def __init__(self, user_id, full_name=None, passport=None, balance=0, on_hold=0, verified=False, language='ru'):
+        self.user_id = user_id
+        self.full_name = full_name
+        self.passport = passport
+        self.balance = balance
+        self.on_hold = on_hold
+        self.verified = verified
+        self.language = language
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'full_name': self.full_name,
+            'passport': self.passport,
+            'balance': self.balance,
+            'on_hold': self.on_hold,
+            'verified': self.verified,
+            'language': self.language
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            user_id=data['user_id'],
+            full_name=data['full_name'],
+            passport=data.get('passport'),
+            balance=data.get('balance', 0),
+            on_hold=data.get('on_hold', 0),
+            verified=data.get('verified', False),
+            language=data.get('language', 'ru')
+        )
+
+def make_user_records(count):
+    return [
+        {
+            'user_id': 100000000 + i,
+            'full_name': f"Пользователь {i}",
+            'passport': f"{1000 + i % 9000} {100000 + i % 900000}",
+            'balance': float(i % 50000),
+            'on_hold': float(i % 700),
+            'verified': i % 3 == 0,
+            'language': 'ru' if i % 4 else 'en'
+        }
+        for i in range(count)
+    ]
+
+def best_of(repeat, func):
+    #лучшее время из нескольких прогонов, сборщик мусора выключен как в timeit / best time out of several runs, GC is off like in timeit
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def measure_user_class(user_cls, records, repeat):
+    gc.collect()
+    tracemalloc.start()
+    users = [user_cls.from_dict(data) for data in records]
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    decode = best_of(repeat, lambda: [user_cls.from_dict(data) for data in records])
+    encode = best_of(repeat, lambda: [user.to_dict() for user in users])
+    return memory, decode, encode
+
+def bench_user_model(args):
+    records = make_user_records(args.count)
+    print(f"{args.count} пользователей / users, лучший из {args.repeat} / best of {args.repeat}")
+    print(f"{'class':<12}{'memory, MB':>12}{'bytes/user':>12}{'from_dict, ms':>16}{'to_dict, ms':>14}")
+    for name, user_cls in (('legacy', LegacyUser), ('slots', bot.User)):
+        memory, decode, encode = measure_user_class(user_cls, records, args.repeat)
+        print(
+            f"{name:<12}{memory / 1024 / 1024:>12.1f}{memory / args.count:>12.0f}"
+            f"{decode * 1000:>16.1f}{encode * 1000:>14.1f}"
+        )
+
+def sample_callback(route):
+    #подстановка значений в шаблон маршрута / filling the route pattern with values
+    return re.sub(r"\{\w+(?::(\w+))?\}", lambda m: "12345" if m.group(1) == 'int' else "ru", route.pattern)
+
+def linear_resolve(routes, data):
+    #прежняя цепочка if/elif: == для точных, startswith для параметризованных / the former if/elif chain: == for exact, startswith for parameterized
+    for route in routes:
+        if route.converters:
+            if data.startswith(route.prefix):
+                return route
+        elif data == route.pattern:
+            return route
+    return None
+
+def synthetic_router(count):
+    router = bot.CallbackRouter()
+    for i in range(count):
+        router.route(f"route_{i}_action")(None)
+        router.route(f"route_{i}_item_{{item_id:int}}")(None)
+    return router
+
+def per_call(repeat, calls, func):
+    return best_of(repeat, func) / calls * 1e9
+
+def bench_routing(args):
+    router = bot.callback_router
+    samples = [sample_callback(route) for route in router.routes]
+    calls = len(samples) * args.count
+    print(f"{len(router.routes)} маршрутов / routes, {args.count} проходов / passes, лучший из {args.repeat} / best of {args.repeat}")
+    
+    def run_router():
+        resolve = router.resolve
+        for _ in range(args.count):
+            for data in samples:
+                resolve(data)
+    
+    def run_linear():
+        routes = router.routes
+        for _ in range(args.count):
+            for data in samples:
+                linear_resolve(routes, data)
+    
+    print(f"{'':<16}{'router, ns':>12}{'if/elif, ns':>14}")
+    print(f"{'average':<16}{per_call(args.repeat, calls, run_router):>12.0f}{per_call(args.repeat, calls, run_linear):>14.0f}")
+    for label, data in (('first route', samples[0]), ('last route', samples[-1])):
+        router_ns = per_call(args.repeat, args.count, lambda: [router.resolve(data) for _ in range(args.count)])
+        linear_ns = per_call(args.repeat, args.count, lambda: [linear_resolve(router.routes, data) for _ in range(args.count)])
+        print(f"{label:<16}{router_ns:>12.0f}{linear_ns:>14.0f}")
+    
+    #время разбора не должно расти с числом маршрутов / resolve time must not grow with the number of routes
+    print(f"{'routes':<16}{'exact, ns':>12}{'prefix, ns':>14}")
+    for count in (50, 500, 5000):
+        synthetic = synthetic_router(count)
+        exact = f"route_{count - 1}_action"
+        prefixed = f"route_{count - 1}_item_12345"
+        exact_ns = per_call(args.repeat, args.count, lambda: [synthetic.resolve(exact) for _ in range(args.count)])
+        prefix_ns = per_call(args.repeat, args.count, lambda: [synthetic.resolve(prefixed) for _ in range(args.count)])
+        print(f"{count * 2:<16}{exact_ns:>12.0f}{prefix_ns:>14.0f}")
+
+def make_update(update_id, user_id, text):
+    #минимальное обновление в формате Bot API / a minimal update in the Bot API format
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f"Bench {user_id}"},
+        'text': text
+    }
+    if text.startswith("/"):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+#простой клиент HTTP/1.1 с keep-alive: httpx сам по себе медленнее сервера и искажал бы замер / a plain keep-alive HTTP/1.1 client: httpx alone is slower than the server and would skew the numbers
+async def post_updates(args):
+    url = urllib.parse.urlsplit(args.url or f"http://{bot.WEBHOOK_LISTEN}:{bot.WEBHOOK_PORT}{bot.WEBHOOK_PATH}")
+    secret = bot.WEBHOOK_SECRET_TOKEN if args.secret is None else args.secret
+    head = f"POST {url.path or '/'} HTTP/1.1\r\nHost: {url.netloc}\r\nContent-Type: application/json\r\n"
+    if secret:
+        head += f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n"
+    latencies = []
+    statuses = {}
+    
+    async def worker(update_ids):
+        reader = writer = None
+        try:
+            for update_id in update_ids:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+                body = json.dumps(make_update(update_id, args.first_user + update_id % args.users, args.text)).encode('utf-8')
+                started = time.perf_counter()
+                writer.write(f"{head}Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+                await writer.drain()
+                response = (await reader.readuntil(b"\r\n\r\n")).decode('latin-1').lower()
+                length = int(response.partition("content-length:")[2].split("\r\n", 1)[0] or 0)
+                await reader.readexactly(length)
+                latencies.append(time.perf_counter() - started)
+                status = int(response.split(" ", 2)[1])
+                statuses[status] = statuses.get(status, 0) + 1
+                if "connection: close" in response:
+                    writer.close()
+                    writer = None
+        finally:
+            if writer is not None:
+                writer.close()
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(range(i, args.count, args.concurrency)) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+def bench_webhook(args):
+    #время до ответа вебхука: разбор и постановка в очередь, без сети Telegram / time until the webhook answers: parsing and queueing, without the Telegram network
+    latencies, statuses, elapsed = asyncio.run(post_updates(args))
+    print(f"{args.count} обновлений / updates, {args.concurrency} соединений / connections, {args.users} пользователей / users")
+    print(f"статусы / statuses: {statuses}")
+    print(f"{'rps':>10}{'p50, ms':>10}{'p90, ms':>10}{'p99, ms':>10}{'max, ms':>10}")
+    print(
+        f"{args.count / elapsed:>10.0f}{percentile(latencies, 0.5) * 1000:>10.2f}{percentile(latencies, 0.9) * 1000:>10.2f}"
+        f"{percentile(latencies, 0.99) * 1000:>10.2f}{max(latencies) * 1000:>10.2f}"
+    )
+
+#офлайн-бот: вызовы Bot API не уходят в сеть, а считаются / offline bot: Bot API calls don't go to the network, they are counted
+class OfflineBot(telegram.Bot):
+    #атрибуты Bot заморожены после __init__, поэтому счетчик на классе / Bot attributes are frozen after __init__, so the counter lives on the class
+    calls = {}
+    
+    async def _post(self, endpoint, data=None, *args, **kwargs):
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        if endpoint == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': "Offline", 'username': "offline_bot"}
+        if endpoint in ('sendMessage', 'sendPhoto', 'editMessageText'):
+            chat_id = (data or {}).get('chat_id') or 1
+            return {'message_id': 1, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'}, 'text': (data or {}).get('text', "")}
+        return True
+
+def make_callback(update_id, user_id, data):
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"Bench {user_id}"},
+            'chat_instance': "bench",
+            'data': data,
+            'message': {'message_id': 1, 'date': 0, 'chat': {'id': user_id, 'type': 'private'}, 'text': "bench"}
+        }
+    }
+
+FIRST_SEEDED_USER = 100000000
+FIRST_NEW_USER = 900000000
+
+def seed_stores(backend, users, pending):
+    #пользователи с балансом; заявки: users штук истории и pending ожидающих на каждый тип / users with a balance; requests: users of history and pending waiting ones per kind
+    user_records = [
+        {
+            'user_id': FIRST_SEEDED_USER + i,
+            'full_name': f"Пользователь {i}",
+            'passport': f"{1000 + i % 9000} {100000 + i % 900000}",
+            'balance': 100000.0,
+            #у первых pending пользователей по заявке на вывод в холде / the first pending users each have a withdrawal on hold
+            'on_hold': 100.0 if i < pending else 0.0,
+            'verified': True,
+            'language': 'ru'
+        }
+        for i in range(users)
+    ]
+    requests = {'withdrawal': [], 'deposit': [], 'verification': []}
+    for i in range(users + pending):
+        status = 'pending' if i >= users else ('approved' if i % 2 else 'rejected')
+        user_id = FIRST_SEEDED_USER + (i - users if i >= users else i) % users
+        requests['withdrawal'].append({'request_id': i + 1, 'user_id': user_id, 'amount': 100.0, 'details': "4000 0000 0000 0000", 'status': status})
+        requests['deposit'].append({'request_id': i + 1, 'user_id': user_id, 'amount': 500.0, 'status': status})
+    for i in range(pending):
+        requests['verification'].append({'request_id': i + 1, 'user_id': FIRST_SEEDED_USER + i % users, 'photo_file_id': "bench", 'status': 'pending'})
+    
+    if backend == "sqlite":
+        storage = bot.SqliteStorage()
+        storage.init()
+        storage.import_users(user_records)
+        for kind, records in requests.items():
+            for record in records:
+                storage.add_request(kind, record)
+        storage.close()
+    else:
+        storage = bot.JsonStorage()
+        storage.init()
+        storage._write(bot.JSON_USERS_FILE, user_records, indent=None)
+        for kind, (file_path, _, _) in bot.REQUEST_KINDS.items():
+            storage._write(file_path, requests[kind], indent=None)
+
+def registration_flow(i, pending):
+    user_id = FIRST_NEW_USER + i
+    return [
+        make_update(i, user_id, "/start"),
+        make_callback(i, user_id, "register"),
+        make_update(i, user_id, f"Новый Пользователь {i}"),
+        make_update(i, user_id, "1234 567890"),
+    ]
+
+def withdrawal_flow(i, pending):
+    #пользователи без заявки в холде / users without a withdrawal on hold
+    user_id = FIRST_SEEDED_USER + pending + i
+    return [
+        make_callback(i, user_id, "withdraw"),
+        make_update(i, user_id, "4000 0000 0000 0000, 100"),
+    ]
+
+def approval_flow(i, pending, users):
+    request_id = users + i + 1
+    return [
+        make_callback(i, bot.ADMIN_IDS[0], f"admin_withdrawal_{request_id}"),
+        make_callback(i, bot.ADMIN_IDS[0], f"approve_withdrawal_{request_id}"),
+    ]
+
+def admin_lists_flow(i, pending):
+    admin_id = bot.ADMIN_IDS[0]
+    return [
+        make_callback(i, admin_id, "admin_withdrawals"),
+        make_callback(i, admin_id, "admin_deposits"),
+        make_callback(i, admin_id, "admin_verifications"),
+        make_callback(i, admin_id, "admin_users"),
+        make_callback(i, admin_id, f"admin_users_next_{FIRST_SEEDED_USER + i * bot.ADMIN_USERS_PAGE_SIZE}"),
+    ]
+
+def io_counters():
+    #байты чтения/записи процесса, только Linux / process read/write bytes, Linux only
+    try:
+        with open('/proc/self/io', 'r') as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def count_storage_calls(storage, counter):
+    #каждый публичный метод хранилища считает свои вызовы / every public storage method counts its calls
+    def counted(name, method):
+        def wrapper(*args, **kwargs):
+            counter[name] = counter.get(name, 0) + 1
+            return method(*args, **kwargs)
+        return wrapper
+    names = [name for name in dir(type(storage)) if not name.startswith("_") and callable(getattr(type(storage), name))]
+    for name in names:
+        setattr(storage, name, counted(name, getattr(storage, name)))
+    return names
+
+async def run_flow(application, flow, iterations):
+    latencies = []
+    storage_calls = {}
+    wrapped = count_storage_calls(bot.storage, storage_calls)
+    api_before = sum(OfflineBot.calls.values())
+    for i in range(iterations):
+        for data in flow(i):
+            update = Update.de_json(data, application.bot)
+            started = time.perf_counter()
+            await application.process_update(update)
+            latencies.append(time.perf_counter() - started)
+    api_calls = sum(OfflineBot.calls.values()) - api_before
+    
+    #отложенная запись, которую в боте делает фоновая задача / the write-behind the bot does in a background task
+    io_before = io_counters()
+    started = time.perf_counter()
+    bot.flush_storage()
+    flush_time = time.perf_counter() - started
+    io_after = io_counters()
+    written = io_after[1] - io_before[1] if io_before and io_after else None
+    
+    #счетчики снимаются с экземпляра, чтобы следующий поток начал с нуля / counters are removed from the instance so the next flow starts from zero
+    for name in wrapped:
+        delattr(bot.storage, name)
+    return latencies, api_calls, sum(storage_calls.values()), flush_time, written
+
+async def bench_backend(backend, users, args):
+    bot.STORAGE_BACKEND = backend
+    seed_stores(backend, users, args.pending)
+    started = time.perf_counter()
+    bot.init_storage()
+    startup = time.perf_counter() - started
+    application = Application.builder().bot(OfflineBot("1:offline")).build()
+    bot.register_handlers(application)
+    await application.initialize()
+    bot.flush_storage()
+    
+    iterations = min(args.iterations, args.pending)
+    flows = (
+        ('registration', registration_flow),
+        ('withdrawal', withdrawal_flow),
+        ('approval', lambda i, pending: approval_flow(i, pending, users)),
+        ('admin lists', admin_lists_flow),
+    )
+    rows = []
+    for name, flow in flows:
+        latencies, api_calls, storage_calls, flush_time, written = await run_flow(
+            application, lambda i: flow(i, args.pending), iterations
+        )
+        rows.append((name, latencies, api_calls, storage_calls, flush_time, written))
+    
+    await application.shutdown()
+    bot.flush_storage(force_snapshot=True)
+    bot.storage.close()
+    return startup, rows
+
+def bench_flows(args):
+    #кеши заявок грузятся при первом обращении, поэтому max первого потока включает прогрев / request caches load on first use, so the first flow's max includes the warm-up
+    print(f"каждый поток идет один раз, {args.iterations} итераций / each flow runs once, {args.iterations} iterations")
+    print(
+        f"{'backend':<8}{'users':>9}{'flow':>14}{'updates':>9}{'p50, ms':>9}{'p99, ms':>9}{'max, ms':>9}"
+        f"{'api/upd':>9}{'store/upd':>11}{'flush, ms':>11}{'flush, KB':>11}"
+    )
+    home = os.getcwd()
+    for backend in args.backends.split(","):
+        for users in (int(size) for size in args.sizes.split(",")):
+            with tempfile.TemporaryDirectory() as workdir:
+                os.chdir(workdir)
+                try:
+                    startup, rows = asyncio.run(bench_backend(backend, users, args))
+                finally:
+                    os.chdir(home)
+            print(f"{backend:<8}{users:>9}{'startup':>14}{'':>9}{startup * 1000:>9.0f}")
+            for name, latencies, api_calls, storage_calls, flush_time, written in rows:
+                updates = len(latencies)
+                print(
+                    f"{backend:<8}{users:>9}{name:>14}{updates:>9}"
+                    f"{percentile(latencies, 0.5) * 1000:>9.2f}{percentile(latencies, 0.99) * 1000:>9.2f}{max(latencies) * 1000:>9.1f}"
+                    f"{api_calls / updates:>9.1f}{storage_calls / updates:>11.2f}{flush_time * 1000:>11.1f}"
+                    f"{(written / 1024 if written is not None else float('nan')):>11.0f}"
+                )
+
+def make_photo(update_id, user_id):
+    message = make_update(update_id, user_id, "")
+    del message['message']['text']
+    message['message']['photo'] = [{'file_id': "replay", 'file_unique_id': "replay", 'width': 1, 'height': 1}]
+    return message
+
+def load_traffic(file_path):
+    #запуски из журнала идут подряд, у каждого свои псевдонимы и своя шкала времени / the log's runs go back to back, each with its own pseudonyms and timeline
+    runs = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if 'run' in entry:
+                runs.append([])
+            elif runs:
+                runs[-1].append(entry)
+    return runs
+
+def copy_data_files(source, target):
+    #копируются данные, но не сессии и не очередь уведомлений: у воспроизведения свои пользователи / the data is copied, but not sessions or the notification queue: the replay has its own users
+    names = [
+        bot.JSON_USERS_FILE, bot.JSON_STAFF_FILE, bot.JSON_SEQUENCES_FILE,
+        bot.JSON_LEDGER_FILE, bot.JSON_LEDGER_SNAPSHOT_FILE,
+        bot.SQLITE_DB_FILE, bot.SQLITE_DB_FILE + "-wal", bot.SQLITE_DB_FILE + "-shm",
+    ]
+    for file_path, _, _ in bot.REQUEST_KINDS.values():
+        journal_file = os.path.splitext(file_path)[0] + ".journal"
+        #прерванная свертка оставляет записи в .compacting, без него копия теряет заявки / an interrupted compaction leaves records in .compacting, without it the copy loses requests
+        names += [file_path, journal_file, journal_file + ".compacting"]
+    copied = 0
+    for name in names:
+        if os.path.exists(os.path.join(source, name)):
+            shutil.copy2(os.path.join(source, name), os.path.join(target, name))
+            copied += 1
+    return copied
+
+#псевдонимы из журнала -> реальные id копии данных: роль из журнала решает, кем станет псевдоним / log pseudonyms -> real ids of the data copy: the logged role decides who a pseudonym becomes
+class ReplayUsers:
+    def __init__(self):
+        staff = [record['user_id'] for record in bot.storage.load_staff()]
+        self.admins = list(bot.ADMIN_IDS)
+        self.staff = staff or self.admins
+        taken = set(self.admins) | set(staff)
+        self.registered = (record['user_id'] for record in bot.storage.load_users() if record['user_id'] not in taken)
+        self.next_new = FIRST_NEW_USER
+        self.ids = {}
+        self.assigned = {'a': 0, 's': 0, 'u': 0, 'n': 0}
+    
+    def reset(self):
+        self.ids = {}
+    
+    def _new(self):
+        while bot.get_user_from_json(self.next_new):
+            self.next_new += 1
+        self.next_new += 1
+        return self.next_new - 1
+    
+    def get(self, pseudonym, role='u'):
+        user_id = self.ids.get(pseudonym)
+        if user_id is not None:
+            return user_id
+        count = self.assigned[role]
+        self.assigned[role] += 1
+        if role == 'a':
+            user_id = self.admins[count % len(self.admins)]
+        elif role == 's':
+            user_id = self.staff[count % len(self.staff)]
+        else:
+            #зарегистрированных в копии может не хватить, тогда пользователь будет новым / the copy may run out of registered users, then the user is a new one
+            user_id = next(self.registered, None) if role == 'u' else None
+            if user_id is None:
+                user_id = self._new()
+        self.ids[pseudonym] = user_id
+        return user_id
+    
+    def callback_data(self, pattern, args):
+        names = re.findall(r"\{(\w+)", pattern)
+        values = iter(
+            self.get(arg) if name in bot.TrafficRecorder.USER_ID_PARAMS else arg
+            for name, arg in zip(names, args)
+        )
+        return re.sub(r"\{\w+(?::\w+)?\}", lambda match: str(next(values)), pattern)
+    
+    def build(self, update_id, entry):
+        user_id = self.get(entry['u'], entry.get('r', 'u'))
+        kind = entry['k']
+        if kind == 'cb' and entry.get('d'):
+            return make_callback(update_id, user_id, self.callback_data(entry['d'], entry.get('a', ())))
+        if kind in ('cmd', 'text'):
+            return make_update(update_id, user_id, entry['x'])
+        if kind == 'photo':
+            return make_photo(update_id, user_id)
+        return None
+
+async def replay_traffic(runs, speed):
+    bot.init_storage()
+    application = (
+        Application.builder()
+        .bot(OfflineBot("1:offline"))
+        .concurrent_updates(bot.ChatOrderedUpdateProcessor(bot.MAX_CONCURRENT_UPDATES))
+        .build()
+    )
+    bot.register_handlers(application)
+    await application.initialize()
+    #с фоновым сбросом и отправкой уведомлений, как в боте / with the background flush and notification sending, as in the bot
+    await bot.on_startup(application)
+    users = ReplayUsers()
+    latencies = {}
+    lags = []
+    tasks = set()
+    #ограничение на число ожидающих задач при max скорости / a cap on waiting tasks at max speed
+    slots = asyncio.Semaphore(bot.MAX_CONCURRENT_UPDATES * 4)
+    
+    async def process(update, kind, lag):
+        started = time.perf_counter()
+        try:
+            await application.update_processor.process_update(update, application.process_update(update))
+        finally:
+            latencies.setdefault(kind, []).append(time.perf_counter() - started)
+            lags.append(lag)
+            slots.release()
+    
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    offset = 0
+    update_id = 0
+    for run in runs:
+        users.reset()
+        for entry in run:
+            data = users.build(update_id + 1, entry)
+            if data is None:
+                continue
+            update_id += 1
+            lag = 0.0
+            if speed:
+                due = started + (offset + entry['t']) / 1000 / speed
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                lag = max(0.0, loop.time() - due)
+            await slots.acquire()
+            update = Update.de_json(data, application.bot)
+            task = asyncio.create_task(process(update, entry['k'], lag))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if run:
+            offset += run[-1]['t']
+    if tasks:
+        await asyncio.gather(*tasks)
+    elapsed = loop.time() - started
+    
+    await bot.on_stop(application)
+    await application.shutdown()
+    return latencies, lags, elapsed, users.assigned
+
+def bench_replay(args):
+    #записанный трафик через обработчики на копии данных: 1, 10 или max (0) — без пауз / recorded traffic through the handlers on a copy of the data: 1, 10 or max (0) meaning no pauses
+    speed = 0 if args.speed == "max" else float(args.speed)
+    runs = load_traffic(args.log)
+    source = os.path.abspath(args.data)
+    bot.STORAGE_BACKEND = args.backend or bot.STORAGE_BACKEND
+    #воспроизведение не должно записывать само себя / the replay must not record itself
+    bot.traffic_recorder.log_file = ""
+    #и не должно занимать порт метрик работающего бота / nor take the metrics port of a running bot
+    bot.METRICS_PORT = 0
+    home = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        copied = copy_data_files(source, workdir)
+        os.chdir(workdir)
+        try:
+            latencies, lags, elapsed, assigned = asyncio.run(replay_traffic(runs, speed))
+        finally:
+            os.chdir(home)
+    total = sum(len(values) for values in latencies.values())
+    print(f"{len(runs)} запусков / runs, {copied} файлов данных / data files, {bot.STORAGE_BACKEND}, скорость / speed {args.speed}")
+    print(f"пользователи / users: админы {assigned['a']}, сотрудники {assigned['s']}, зарегистрированные {assigned['u']}, новые {assigned['n']}")
+    if not total:
+        print("в журнале нет обновлений / the log has no updates")
+        return
+    #отставание от расписания показывает, успевает ли железо за реальным темпом / lag behind the schedule shows whether the hardware keeps up with the real pace
+    print(f"{total} обновлений / updates за {elapsed:.1f} с, {total / elapsed:.0f} в секунду / per second, отставание max / lag max {max(lags) * 1000:.0f} ms")
+    print(f"{'kind':<8}{'updates':>9}{'p50, ms':>9}{'p99, ms':>9}{'max, ms':>9}")
+    rows = sorted(latencies.items(), key=lambda item: -len(item[1]))
+    rows.append(('all', [latency for values in latencies.values() for latency in values]))
+    for kind, values in rows:
+        print(
+            f"{kind:<8}{len(values):>9}{percentile(values, 0.5) * 1000:>9.2f}"
+            f"{percentile(values, 0.99) * 1000:>9.2f}{max(values) * 1000:>9.1f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки BrokerBot / BrokerBot benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    user_model = commands.add_parser('user-model', help="память и (де)сериализация User / User memory and (de)serialization")
+    user_model.add_argument('--count', type=int, default=100000)
+    user_model.add_argument('--repeat', type=int, default=5)
+    user_model.set_defaults(func=bench_user_model)
+
+    routing = commands.add_parser('routing', help="разбор callback_data / callback_data routing")
+    routing.add_argument('--count', type=int, default=10000)
+    routing.add_argument('--repeat', type=int, default=5)
+    routing.set_defaults(func=bench_routing)
+
+    webhook = commands.add_parser('webhook', help="POST обновлений на локальный вебхук / POSTing updates to a local webhook")
+    webhook.add_argument('--url', help="по умолчанию из конфига bot.py / defaults to the bot.py config")
+    webhook.add_argument('--secret', help="по умолчанию WEBHOOK_SECRET_TOKEN / defaults to WEBHOOK_SECRET_TOKEN")
+    webhook.add_argument('--count', type=int, default=1000)
+    webhook.add_argument('--concurrency', type=int, default=8)
+    webhook.add_argument('--users', type=int, default=100)
+    webhook.add_argument('--first-user', type=int, default=900000000)
+    webhook.add_argument('--text', default="/start")
+    webhook.set_defaults(func=bench_webhook)
+
+    flows = commands.add_parser('flows', help="пользовательские сценарии через обработчики с офлайн-ботом / user flows through the handlers with an offline bot")
+    flows.add_argument('--backends', default="json,sqlite")
+    flows.add_argument('--sizes', default="1000,100000,1000000", help="пользователей и заявок в хранилище / users and requests in the store")
+    flows.add_argument('--iterations', type=int, default=200)
+    flows.add_argument('--pending', type=int, default=200, help="ожидающих заявок каждого типа / pending requests of each kind")
+    flows.set_defaults(func=bench_flows)
+
+    replay = commands.add_parser('replay', help="воспроизведение журнала TRAFFIC_LOG_FILE на копии данных / replaying the TRAFFIC_LOG_FILE log on a copy of the data")
+    replay.add_argument('log')
+    replay.add_argument('--data', default=".", help="каталог с файлами данных бота / directory with the bot's data files")
+    replay.add_argument('--backend', choices=("json", "sqlite"), help="по умолчанию STORAGE_BACKEND / defaults to STORAGE_BACKEND")
+    replay.add_argument('--speed', default="1", help="1, 10 или max / 1, 10 or max")
+    replay.set_defaults(func=bench_replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
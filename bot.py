@@ -1,8 +1,31 @@
 import os
+import sys
 import logging
 import json
+import math
+import string
+import functools
+import contextlib
+import re
+import bisect
+import sqlite3
+import asyncio
+import threading
+import time
+import hmac
+import http
+import signal
+import weakref
+import contextvars
+import cProfile
+import inspect
+import pstats
+import heapq
+import io
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from telegram.request import HTTPXRequest
+from telegram.ext import Application, BaseUpdateProcessor, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, filters, ContextTypes
 
 
 logging.basicConfig(
@@ -18,8 +41,51 @@ JSON_STAFF_FILE = "staff.json"
 JSON_WITHDRAWALS_FILE = "withdrawals.json"
 JSON_DEPOSITS_FILE = "deposits.json"
 JSON_VERIFICATIONS_FILE = "verifications.json"
+JSON_SEQUENCES_FILE = "sequences.json"
+JSON_LEDGER_FILE = "ledger.jsonl"
+JSON_LEDGER_SNAPSHOT_FILE = "ledger_snapshot.json"
+JSON_OUTBOX_FILE = "outbox.json"
+JSON_SESSIONS_DIR = "sessions"  #по файлу на сессию пользователя / one file per user session
+TRAFFIC_LOG_FILE = ""  #журнал обезличенного трафика для benchmark.py replay, пусто — не писать / anonymized traffic log for benchmark.py replay, empty disables it
+STORAGE_BACKEND = "json"  #"json" или "sqlite" / "json" or "sqlite"
+SQLITE_DB_FILE = "broker.db"
+JOURNAL_COMPACT_THRESHOLD = 1000  #записей в журнале до свертки в снимок / journal records before folding into the snapshot
+JOURNAL_COMPACT_INTERVAL = 60  #секунд между проверками / seconds between checks
+FLUSH_INTERVAL_MS = 200  #интервал отложенной записи на диск / write-behind flush interval
+STAFF_RELOAD_INTERVAL = 1  #секунд между проверками staff.json на внешние правки / seconds between checks of staff.json for outside edits
+ADMIN_USERS_PAGE_SIZE = 20  #пользователей на странице в панели / users per page in the panel
+BULK_PAGE_SIZE = 50  #заявок на экране пакетной обработки, у Telegram предел 100 кнопок / requests on the bulk screen, Telegram allows 100 buttons
+MAX_CONCURRENT_UPDATES = 256  #сколько обновлений обрабатывается одновременно / how many updates are processed at once
+MAX_WAITING_UPDATES = 4096  #сколько обновлений может ждать очереди своего чата / how many updates may wait for their chat's turn
+LEDGER_SNAPSHOT_EVERY = 1000  #проводок между снимками балансов / postings between balance snapshots
+ID_BLOCK_SIZE = 100  #сколько id заявок резервируется за раз / how many request ids are reserved at once
+KEYBOARD_CACHE_SIZE = 1024  #клавиатур с id заявки в LRU / request-id keyboards kept in the LRU
+OUTBOX_WORKERS = 4  #задач-отправителей уведомлений / notification sender tasks
+OUTBOX_GLOBAL_RATE = 25  #сообщений в секунду на бота, у Telegram предел ~30 / messages per second per bot, Telegram allows ~30
+OUTBOX_CHAT_INTERVAL = 1.0  #секунд между сообщениями в один чат / seconds between messages to one chat
+OUTBOX_RETRY_BASE = 2  #первая пауза перед повтором, дальше удваивается / first retry delay, doubled after that
+OUTBOX_RETRY_MAX = 300  #максимальная пауза перед повтором / maximum retry delay
+OUTBOX_MAX_ATTEMPTS = 10  #попыток при сетевых ошибках / attempts on network errors
+UPDATE_MODE = "polling"  #"polling" или "webhook" / "polling" or "webhook"
+WEBHOOK_LISTEN = "127.0.0.1"  #TLS завершает обратный прокси перед ботом / TLS is terminated by a reverse proxy in front of the bot
+WEBHOOK_PORT = 8080
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_URL = ""  #публичный https-адрес для setWebhook, пусто — не регистрировать / public https URL for setWebhook, empty means don't register
+WEBHOOK_SECRET_TOKEN = ""  #сверяется с заголовком X-Telegram-Bot-Api-Secret-Token / checked against the X-Telegram-Bot-Api-Secret-Token header
+WEBHOOK_DRAIN_TIMEOUT = 10  #секунд на доработку принятых запросов при остановке / seconds to finish accepted requests on shutdown
+HTTP_MAX_BODY = 1024 * 1024  #байт в теле запроса / bytes in a request body
+HTTP_KEEPALIVE_TIMEOUT = 75  #секунд простоя соединения / seconds an idle connection is kept
+METRICS_LISTEN = "127.0.0.1"  #метрики Prometheus только для локального сборщика / Prometheus metrics for a local scraper only
+METRICS_PORT = 9108  #0 — не поднимать /metrics / 0 disables /metrics
+METRICS_PATH = "/metrics"
+PROFILE_DIR = "profiles"  #куда /profile dump пишет отчет и .prof файлы / where /profile dump writes the report and .prof files
+PROFILE_KEEP_SLOWEST = 20  #сколько самых медленных обновлений хранится с профилем / how many of the slowest updates are kept with a profile
+PROFILE_TOP_FUNCTIONS = 15  #функций в отчете на одно обновление / functions in the report per update
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+DEFAULT_LANGUAGE = 'ru'
 
 #состояния для конечного автомата / states for a fsm 
+#номера состояний хранятся в сессиях: с этого списка порядок не меняется, новые состояния только в конец / state numbers are stored in sessions: from this list on the order is frozen, new states are only appended at the end
 (
     START,
     REGISTRATION_NAME,
@@ -47,119 +113,140 @@ JSON_VERIFICATIONS_FILE = "verifications.json"
     ADMIN_REJECTED_DEPOSITS,
     ADMIN_ADD_BALANCE,
     ADMIN_REDUCE_BALANCE,
+    ADMIN_BULK_SELECT,
+    ADMIN_BULK_LIMIT,
     CHANGE_LANGUAGE,
-) = range(27)  
+) = range(29)  
 
+#состояния панели управления перечислены явно: добавленные в конец не попадут сюда по диапазону / management panel states are listed explicitly: states appended at the end don't land here by range
+ADMIN_STATES = frozenset({
+    ADMIN_MENU,
+    ADMIN_USERS,
+    ADMIN_USER_DETAIL,
+    ADMIN_CHANGE_NAME,
+    ADMIN_CHANGE_PASSPORT,
+    ADMIN_WITHDRAWAL_DETAIL,
+    ADMIN_DEPOSITS,
+    ADMIN_DEPOSIT_DETAIL,
+    ADMIN_VERIFICATIONS,
+    ADMIN_VERIFICATION_DETAIL,
+    ADMIN_ADD_STAFF,
+    ADMIN_APPROVED_REQUESTS,
+    ADMIN_REJECTED_REQUESTS,
+    ADMIN_APPROVED_WITHDRAWALS,
+    ADMIN_REJECTED_WITHDRAWALS,
+    ADMIN_APPROVED_DEPOSITS,
+    ADMIN_REJECTED_DEPOSITS,
+    ADMIN_ADD_BALANCE,
+    ADMIN_REDUCE_BALANCE,
+    ADMIN_BULK_SELECT,
+    ADMIN_BULK_LIMIT,
+})
+
+#компактный пользователь на __slots__ / compact __slots__ user
 class User:
-    def __init__(self, user_id, full_name=None, passport=None, balance=0, on_hold=0, verified=False, language='ru'):
+    __slots__ = ('user_id', 'full_name', 'passport', 'verified', 'language')
+    #поля в хранилище; balance и on_hold вычисляются по книге проводок / storage fields; balance and on_hold are derived from the ledger
+    FIELDS = ('user_id', 'full_name', 'passport', 'balance', 'on_hold', 'verified', 'language')
+    
+    def __init__(self, user_id, full_name=None, passport=None, verified=False, language='ru'):
         self.user_id = user_id
         self.full_name = full_name
         self.passport = passport
-        self.balance = balance
-        self.on_hold = on_hold
         self.verified = verified
         self.language = language
     
+    @property
+    def balance(self):
+        return from_minor(ledger.user_balances(self.user_id)[0])
+    
+    @property
+    def on_hold(self):
+        return from_minor(ledger.user_balances(self.user_id)[1])
+    
+    #при сериализации оба баланса берутся из книги одним обращением, а не через два свойства / serialization reads both balances from the ledger in one lookup instead of two properties
     def to_dict(self):
+        balance, on_hold = ledger.user_balances(self.user_id)
         return {
             'user_id': self.user_id,
             'full_name': self.full_name,
             'passport': self.passport,
-            'balance': self.balance,
-            'on_hold': self.on_hold,
+            'balance': from_minor(balance),
+            'on_hold': from_minor(on_hold),
             'verified': self.verified,
             'language': self.language
         }
     
+    def to_row(self):
+        #кортеж в порядке FIELDS для SQLite / a tuple in FIELDS order for SQLite
+        balance, on_hold = ledger.user_balances(self.user_id)
+        return (
+            self.user_id, self.full_name, self.passport,
+            from_minor(balance), from_minor(on_hold),
+            self.verified, self.language
+        )
+    
     @classmethod
     def from_dict(cls, data):
+        #позиционные аргументы без разбора kwargs / positional arguments, no kwargs parsing
+        get = data.get
         return cls(
-            user_id=data['user_id'],
-            full_name=data['full_name'],
-            passport=data.get('passport'),
-            balance=data.get('balance', 0),
-            on_hold=data.get('on_hold', 0),
-            verified=data.get('verified', False),
-            language=data.get('language', 'ru')
+            data['user_id'],
+            data['full_name'],
+            get('passport'),
+            get('verified', False),
+            get('language', 'ru')
         )
 
-class WithdrawalRequest:
-    def __init__(self, request_id, user_id, amount, details):
-        self.request_id = request_id
-        self.user_id = user_id
-        self.amount = amount
-        self.details = details
-        self.status = "pending"
+#общая основа заявок: компактные записи на __slots__ без __dict__ / common request base: compact __slots__ records without a __dict__
+class Request:
+    __slots__ = ('request_id', 'user_id', 'status')
+    kind = None
+    #порядок полей совпадает с аргументами конструктора, status последний / field order matches the constructor arguments, status goes last
+    FIELDS = ()
     
     def to_dict(self):
-        return {
-            'request_id': self.request_id,
-            'user_id': self.user_id,
-            'amount': self.amount,
-            'details': self.details,
-            'status': self.status
-        }
+        return {field: getattr(self, field) for field in self.FIELDS}
     
     @classmethod
     def from_dict(cls, data):
-        request = cls(
-            request_id=data['request_id'],
-            user_id=data['user_id'],
-            amount=data['amount'],
-            details=data['details']
-        )
+        request = cls(*[data[field] for field in cls.FIELDS[:-1]])
         request.status = data.get('status', 'pending')
         return request
 
-class DepositRequest:
-    def __init__(self, request_id, user_id, amount):
+class WithdrawalRequest(Request):
+    __slots__ = ('amount', 'details')
+    kind = 'withdrawal'
+    FIELDS = ('request_id', 'user_id', 'amount', 'details', 'status')
+    
+    def __init__(self, request_id, user_id, amount, details):
         self.request_id = request_id
         self.user_id = user_id
         self.amount = amount
+        self.details = details
         self.status = "pending"
+
+class DepositRequest(Request):
+    __slots__ = ('amount',)
+    kind = 'deposit'
+    FIELDS = ('request_id', 'user_id', 'amount', 'status')
     
-    def to_dict(self):
-        return {
-            'request_id': self.request_id,
-            'user_id': self.user_id,
-            'amount': self.amount,
-            'status': self.status
-        }
-    
-    @classmethod
-    def from_dict(cls, data):
-        request = cls(
-            request_id=data['request_id'],
-            user_id=data['user_id'],
-            amount=data['amount']
-        )
-        request.status = data.get('status', 'pending')
-        return request
+    def __init__(self, request_id, user_id, amount):
+        self.request_id = request_id
+        self.user_id = user_id
+        self.amount = amount
+        self.status = "pending"
 
-class VerificationRequest:
+class VerificationRequest(Request):
+    __slots__ = ('photo_file_id',)
+    kind = 'verification'
+    FIELDS = ('request_id', 'user_id', 'photo_file_id', 'status')
+    
     def __init__(self, request_id, user_id, photo_file_id):
         self.request_id = request_id
         self.user_id = user_id
         self.photo_file_id = photo_file_id
         self.status = "pending"
-    
-    def to_dict(self):
-        return {
-            'request_id': self.request_id,
-            'user_id': self.user_id,
-            'photo_file_id': self.photo_file_id,
-            'status': self.status
-        }
-    
-    @classmethod
-    def from_dict(cls, data):
-        request = cls(
-            request_id=data['request_id'],
-            user_id=data['user_id'],
-            photo_file_id=data['photo_file_id']
-        )
-        request.status = data.get('status', 'pending')
-        return request
 
 #работа с JSON / working with JSON
 def init_json_files():
@@ -169,484 +256,2287 @@ def init_json_files():
             with open(file_path, 'w', encoding='utf-8') as f:
                 json.dump([], f, ensure_ascii=False, indent=2)
 
-def save_user_to_json(user: User):
-    users = load_users_from_json()
-    
-    #поиск юзера для обновления / searching for a user to update
-    user_found = False
-    for i, u in enumerate(users):
-        if u.user_id == user.user_id:
-            users[i] = user
-            user_found = True
-            break
+#типы заявок: файл JSON, таблица SQLite и класс записи / request kinds: JSON file, SQLite table and record class
+REQUEST_KINDS = {
+    'withdrawal': (JSON_WITHDRAWALS_FILE, 'withdrawals', WithdrawalRequest),
+    'deposit': (JSON_DEPOSITS_FILE, 'deposits', DepositRequest),
+    'verification': (JSON_VERIFICATIONS_FILE, 'verifications', VerificationRequest),
+}
+
+#метрики в формате Prometheus: счетчики и гистограммы в памяти, наблюдение — поиск корзины и два сложения / Prometheus metrics: in-memory counters and histograms, an observation is a bucket lookup and two additions
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total')
     
-    #если не находит, добавляем ноового / if it doesn't find it, add a new one
-    if not user_found:
-        users.append(user)
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
     
-    #сохраняем JSON / save JSON
-    with open(JSON_USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump([u.to_dict() for u in users], f, ensure_ascii=False, indent=2)
-
-def load_users_from_json():
-    try:
-        with open(JSON_USERS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return [User.from_dict(user_data) for user_data in data]
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-def get_user_from_json(user_id):
-    users = load_users_from_json()
-    for user in users:
-        if user.user_id == user_id:
-            return user
-    return None
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
 
-def get_all_users():
-    return load_users_from_json()
-
-def save_withdrawal_request(request: WithdrawalRequest):
-    requests = load_withdrawal_requests_from_json()
-    requests.append(request)
+class Metrics:
+    LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
     
-    with open(JSON_WITHDRAWALS_FILE, 'w', encoding='utf-8') as f:
-        json.dump([r.to_dict() for r in requests], f, ensure_ascii=False, indent=2)
-
-def load_withdrawal_requests_from_json():
-    try:
-        with open(JSON_WITHDRAWALS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return [WithdrawalRequest.from_dict(req_data) for req_data in data]
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-def get_withdrawal_requests(status=None):
-    requests = load_withdrawal_requests_from_json()
-    if status is None:
-        return requests
-    return [r for r in requests if r.status == status]
-
-def delete_withdrawal_request(request_id):
-    requests = load_withdrawal_requests_from_json()
-    original_count = len(requests)
-    
-    #фильтр запросов, остаются только те у которых ID не совпадает / query filter, only those with an ID that does not match are left
-    requests = [r for r in requests if r.request_id != request_id]
-    
-    if len(requests) < original_count:
-        #сохранение обновленного списка / saving an updated list
-        with open(JSON_WITHDRAWALS_FILE, 'w', encoding='utf-8') as f:
-            json.dump([r.to_dict() for r in requests], f, ensure_ascii=False, indent=2)
-        return True
-    return False
-
-def save_deposit_request(request: DepositRequest):
-    requests = load_deposit_requests_from_json()
-    requests.append(request)
+    def __init__(self):
+        #имя -> (тип, описание, корзины) / name -> (type, help, buckets)
+        self.families = {}
+        #имя -> {метки: значение или Histogram}, метки — кортеж пар (ключ, значение) / name -> {labels: value or Histogram}, labels are a tuple of (key, value) pairs
+        self.values = {}
+        #датчики читаются в момент запроса /metrics / gauges are read when /metrics is requested
+        self.gauges = {}
     
-    with open(JSON_DEPOSITS_FILE, 'w', encoding='utf-8') as f:
-        json.dump([r.to_dict() for r in requests], f, ensure_ascii=False, indent=2)
-
-def load_deposit_requests_from_json():
-    try:
-        with open(JSON_DEPOSITS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return [DepositRequest.from_dict(req_data) for req_data in data]
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-def get_deposit_requests(status=None):
-    requests = load_deposit_requests_from_json()
-    if status is None:
-        return requests
-    return [r for r in requests if r.status == status]
-
-def delete_deposit_request(request_id):
-    requests = load_deposit_requests_from_json()
-    original_count = len(requests)
-    
-    requests = [r for r in requests if r.request_id != request_id]
-    
-    if len(requests) < original_count:
-        with open(JSON_DEPOSITS_FILE, 'w', encoding='utf-8') as f:
-            json.dump([r.to_dict() for r in requests], f, ensure_ascii=False, indent=2)
-        return True
-    return False
-
-def save_verification_request(request: VerificationRequest):
-    requests = load_verification_requests_from_json()
-    requests.append(request)
+    def counter(self, name, help_text):
+        self.families[name] = 'counter', help_text, None
+        self.values[name] = {}
     
-    with open(JSON_VERIFICATIONS_FILE, 'w', encoding='utf-8') as f:
-        json.dump([r.to_dict() for r in requests], f, ensure_ascii=False, indent=2)
-
-def load_verification_requests_from_json():
-    try:
-        with open(JSON_VERIFICATIONS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return [VerificationRequest.from_dict(req_data) for req_data in data]
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-def get_verification_requests(status=None):
-    requests = load_verification_requests_from_json()
-    if status is None:
-        return requests
-    return [r for r in requests if r.status == status]
-
-def delete_verification_request(request_id):
-    requests = load_verification_requests_from_json()
-    original_count = len(requests)
-    
-    requests = [r for r in requests if r.request_id != request_id]
-    
-    if len(requests) < original_count:
-        with open(JSON_VERIFICATIONS_FILE, 'w', encoding='utf-8') as f:
-            json.dump([r.to_dict() for r in requests], f, ensure_ascii=False, indent=2)
-        return True
-    return False
-
-def is_staff(user_id):
-    if user_id in ADMIN_IDS:
-        return True
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.families[name] = 'histogram', help_text, buckets
+        self.values[name] = {}
     
-    try:
-        with open(JSON_STAFF_FILE, 'r', encoding='utf-8') as f:
-            staff_data = json.load(f)
-            return any(staff['user_id'] == user_id for staff in staff_data)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return False
-
-def add_staff_to_json(user_id, full_name):
-    try:
-        with open(JSON_STAFF_FILE, 'r', encoding='utf-8') as f:
-            staff_data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        staff_data = []
-    
-    # Проверяем, нет ли уже такого сотрудника
-    if not any(staff['user_id'] == user_id for staff in staff_data):
-        staff_data.append({'user_id': user_id, 'full_name': full_name})
-        
-        with open(JSON_STAFF_FILE, 'w', encoding='utf-8') as f:
-            json.dump(staff_data, f, ensure_ascii=False, indent=2)
-
-
-TEXTS = {
-    'ru': {
-        'start': '👋 *Добро пожаловать в "{BOT_NAME}"*\n\n📋 *Краткая информация о боте:*\nВаш надежный брокерский помощник\n\n⚠️ *Перед использованием бота нужно пройти регистрацию.*',
-        'personal_cabinet': '👤 *Добро пожаловать в личный кабинет*\n\n📝 *ФИО:* {full_name}\n📋 *Паспорт:* {passport}\n\n💰 *Баланс:* {balance} ₽\n⏳ *На выводе:* {on_hold} ₽\n\n🛡️ *Верификация:* {verification_status}\n\n🆔 *ID:* `{user_id}`\n_Нажмите на ID, чтобы скопировать_',
-        'deposit': '💰 *Пополнение баланса*\n\n💳 *Введите сумму для пополнения:*\nПример: `1500`',
-        'withdraw': '💸 *Вывод средств*\n\n💳 *Введите ниже свои реквизиты, а также сумму для вывода*\n💰 *Доступно к выводу:* {balance} ₽\n\n📋 *Пример:*\n`2000 1000 3000 2000, 150`\n\n⚠️ *В случае если вы напишите только реквизиты, заявка на вывод будет отклонена.*\nСпасибо за понимание',
-        'verify': '🛡️ *Верификация аккаунта*\n\n📷 *Для прохождения верификации отправьте основной разворот паспорта*\n\n⏳ После отправки ожидайте одобрение заявки',
-        'registration_name': '📝 *Введите свое ФИО:*',
-        'registration_passport': '📋 *Введите серию и номер паспорта:*\n\n*Пример:* `1234 567890`',
-        'change_language': '🌐 *Смена языка*\n\nВыберите язык интерфейса:',
-        'language_changed': '✅ *Язык успешно изменен на английский!*',
-        'verification_status_changed': '✅ *Статус верификации изменен!*\n\n🛡️ *Новый статус:* {status}',
-        'profile_updated': '✅ *Данные профиля обновлены!*',
-        'balance_management': '💰 *Управление балансом*\n\n📝 *Выберите действие:*',
-        'add_balance': '💳 *Пополнение баланса*\n\n💰 *Текущий баланс пользователя:* {balance} ₽\n\n💵 *Введите сумму для пополнения:*',
-        'reduce_balance': '💸 *Уменьшение баланса*\n\n💰 *Текущий баланс пользователя:* {balance} ₽\n\n💵 *Введите сумму для уменьшения:*',
-        'balance_added': '✅ *Баланс пользователя пополнен!*\n\n💰 *Новый баланс:* {new_balance} ₽\n💵 *Добавлено:* {amount} ₽',
-        'balance_reduced': '✅ *Баланс пользователя уменьшен!*\n\n💰 *Новый баланс:* {new_balance} ₽\n💵 *Уменьшено:* {amount} ₽',
-        'insufficient_balance': '❌ *Недостаточно средств для уменьшения!*\n\n💰 *Текущий баланс:* {balance} ₽\n💵 *Запрошено:* {amount} ₽',
-        'invalid_amount': '❌ *Неверная сумма!*\n\n💡 *Введите положительное число:*'
-    },
-    'en': {
-        'start': '👋 *Welcome to "{BOT_NAME}"*\n\n📋 *About the bot:*\nYour reliable brokerage assistant\n\n⚠️ *You need to register before using the bot.*',
-        'personal_cabinet': '👤 *Welcome to Personal Cabinet*\n\n📝 *Full Name:* {full_name}\n📋 *Passport:* {passport}\n\n💰 *Balance:* {balance} ₽\n⏳ *On Hold:* {on_hold} ₽\n\n🛡️ *Verification:* {verification_status}\n\n🆔 *ID:* `{user_id}`\n_Click on ID to copy_',
-        'deposit': '💰 *Deposit Funds*\n\n💳 *Enter the deposit amount:*\nExample: `1500`',
-        'withdraw': '💸 *Withdraw Funds*\n\n💳 *Enter your details and withdrawal amount below*\n💰 *Available for withdrawal:* {balance} ₽\n\n📋 *Example:*\n`2000 1000 3000 2000, 150`\n\n⚠️ *If you only provide details without amount, the withdrawal request will be rejected.*\nThank you for understanding',
-        'verify': '🛡️ *Account Verification*\n\n📷 *To complete verification, send the main page of your passport*\n\n⏳ Please wait for approval after submission',
-        'registration_name': '📝 *Enter your Full Name:*',
-        'registration_passport': '📋 *Enter passport series and number:*\n\n*Example:* `1234 567890`',
-        'change_language': '🌐 *Language Settings*\n\nChoose interface language:',
-        'language_changed': '✅ *Language successfully changed to English!*',
-        'verification_status_changed': '✅ *Verification status changed!*\n\n🛡️ *New status:* {status}',
-        'profile_updated': '✅ *Profile data updated!*',
-        'balance_management': '💰 *Balance Management*\n\n📝 *Choose action:*',
-        'add_balance': '💳 *Add Balance*\n\n💰 *Current user balance:* {balance} ₽\n\n💵 *Enter amount to add:*',
-        'reduce_balance': '💸 *Reduce Balance*\n\n💰 *Current user balance:* {balance} ₽\n\n💵 *Enter amount to reduce:*',
-        'balance_added': '✅ *User balance increased!*\n\n💰 *New balance:* {new_balance} ₽\n💵 *Added:* {amount} ₽',
-        'balance_reduced': '✅ *User balance decreased!*\n\n💰 *New balance:* {new_balance} ₽\n💵 *Reduced:* {amount} ₽',
-        'insufficient_balance': '❌ *Insufficient funds to reduce!*\n\n💰 *Current balance:* {balance} ₽\n💵 *Requested:* {amount} ₽',
-        'invalid_amount': '❌ *Invalid amount!*\n\n💡 *Enter a positive number:*'
-    }
-}
-
-#клавиатуры / keyboards
-def get_start_keyboard(language='ru'):
-    texts = TEXTS[language]
-    keyboard = [
-        [InlineKeyboardButton("📝 Зарегистрироваться" if language == 'ru' else "📝 Register", callback_data="register")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_back_keyboard(target_state, language='ru'):
-    keyboard = [
-        [InlineKeyboardButton("⬅️ Назад" if language == 'ru' else "⬅️ Back", callback_data=f"back_to_{target_state}")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_personal_cabinet_keyboard(user: User):
-    language = user.language
-    keyboard = [
-        [
-            InlineKeyboardButton("💰 Пополнить" if language == 'ru' else "💰 Deposit", callback_data="deposit"),
-            InlineKeyboardButton("💳 Вывести" if language == 'ru' else "💳 Withdraw", callback_data="withdraw")
-        ],
-        [InlineKeyboardButton("🔄 Обновить" if language == 'ru' else "🔄 Refresh", callback_data="refresh_profile")]
-    ]
+    def gauge(self, name, help_text, read):
+        #read возвращает число или {метки: число} / read returns a number or {labels: number}
+        self.families[name] = 'gauge', help_text, None
+        self.gauges[name] = read
     
-    if not user.verified:
-        keyboard.append([InlineKeyboardButton("🛡️ Пройти верификацию" if language == 'ru' else "🛡️ Verify Account", callback_data="verify")])
+    def inc(self, name, labels=(), amount=1):
+        values = self.values[name]
+        values[labels] = values.get(labels, 0) + amount
     
-    keyboard.append([InlineKeyboardButton("🌐 Сменить язык" if language == 'ru' else "🌐 Change Language", callback_data="change_language")])
+    def observe(self, name, labels, value):
+        values = self.values[name]
+        histogram = values.get(labels)
+        if histogram is None:
+            histogram = values.setdefault(labels, Histogram(self.families[name][2]))
+        histogram.observe(value)
     
-    return InlineKeyboardMarkup(keyboard)
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        pairs = []
+        for key, value in labels:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            pairs.append(f'{key}="{value}"')
+        return "{" + ",".join(pairs) + "}"
+    
+    def render(self):
+        lines = []
+        for name, (kind, help_text, buckets) in list(self.families.items()):
+            if kind == 'gauge':
+                try:
+                    value = self.gauges[name]()
+                except Exception:
+                    logging.exception("Gauge %s failed", name)
+                    continue
+                samples = value.items() if isinstance(value, dict) else [((), value)]
+            else:
+                samples = list(self.values[name].items())
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind != 'histogram':
+                    lines.append(f"{name}{self._format_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), value.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {value.total}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
 
-def get_language_keyboard():
-    keyboard = [
-        [
-            InlineKeyboardButton("🇷🇺 Русский", callback_data="set_language_ru"),
-            InlineKeyboardButton("🇺🇸 English", callback_data="set_language_en")
-        ],
-        [InlineKeyboardButton("⬅️ Назад", callback_data="back_to_personal_cabinet")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+metrics = Metrics()
+metrics.histogram('bot_update_seconds', "Update handling time including the wait for earlier updates of the same chat")
+metrics.histogram('bot_callback_seconds', "Callback handler time by route")
+metrics.counter('bot_callbacks_rejected_total', "Callbacks dropped before a handler ran")
+metrics.histogram('bot_message_seconds', "Text message handler time by FSM state")
+metrics.histogram('bot_api_seconds', "Bot API call time by method")
+metrics.counter('bot_api_errors_total', "Failed Bot API calls by method")
+metrics.histogram('bot_storage_seconds', "Storage call time by backend and operation")
+metrics.counter('bot_storage_bytes_total', "Bytes read and written by data file")
+metrics.histogram('bot_flush_seconds', "Write-behind flush time")
 
-def get_admin_menu_keyboard(is_admin=True, language='ru'):
-    keyboard = [
-        [InlineKeyboardButton("👥 Управление всеми пользователями" if language == 'ru' else "👥 Manage All Users", callback_data="admin_users")],
-        [InlineKeyboardButton("💸 Все заявки на вывод" if language == 'ru' else "💸 All Withdrawal Requests", callback_data="admin_withdrawals")],
-        [InlineKeyboardButton("💰 Все заявки на пополнение" if language == 'ru' else "💰 All Deposit Requests", callback_data="admin_deposits")],
-        [InlineKeyboardButton("🛡️ Заявки на верификацию" if language == 'ru' else "🛡️ Verification Requests", callback_data="admin_verifications")],
-        [InlineKeyboardButton("✅ Все одобренные заявки" if language == 'ru' else "✅ All Approved Requests", callback_data="admin_approved_requests")],
-        [InlineKeyboardButton("❌ Все отклоненные заявки" if language == 'ru' else "❌ All Rejected Requests", callback_data="admin_rejected_requests")],
-    ]
+#профиль обновления, которое сейчас выполняется в этой задаче; None — профилирование выключено / the profile of the update running in this task; None when profiling is off
+current_update_profile = contextvars.ContextVar('current_update_profile', default=None)
+
+#ввод-вывод и вызовы хранилища за одно обновление / storage I/O and calls within one update
+class UpdateProfile:
+    #parse — чтение и разбор JSON, read — чтение как есть, rewrite — файл переписан целиком, append — дозапись / parse is reading and parsing JSON, read is a plain read, rewrite is a full rewrite, append is appending
+    FILE_OPS = ('parse', 'read', 'rewrite', 'append')
     
-    if is_admin:
-        keyboard.append([InlineKeyboardButton("➕ Добавить работника" if language == 'ru' else "➕ Add Employee", callback_data="admin_add_staff")])
+    def __init__(self, update_id=None, label="background"):
+        self.update_id = update_id
+        self.label = label
+        self.seconds = 0.0
+        #файл -> {opens, parse, read, rewrite, append, bytes, seconds} / file -> {opens, parse, read, rewrite, append, bytes, seconds}
+        self.files = {}
+        #функция -> [вызовы, секунды] / function -> [calls, seconds]
+        self.calls = {}
+        self.profiler = cProfile.Profile()
     
-    return InlineKeyboardMarkup(keyboard)
-
-def get_admin_user_management_keyboard(language='ru'):
-    keyboard = [
-        [InlineKeyboardButton("✏️ Сменить ФИО" if language == 'ru' else "✏️ Change Name", callback_data="admin_change_name")],
-        [InlineKeyboardButton("📋 Сменить паспорт" if language == 'ru' else "📋 Change Passport", callback_data="admin_change_passport")],  # ДОБАВЛЕНА НОВАЯ КНОПКА
-        [InlineKeyboardButton("💰 Пополнить баланс" if language == 'ru' else "💰 Add Balance", callback_data="admin_add_balance")],
-        [InlineKeyboardButton("💸 Уменьшить баланс" if language == 'ru' else "💸 Reduce Balance", callback_data="admin_reduce_balance")],
-        [InlineKeyboardButton("🛡️ Изменить статус верификации" if language == 'ru' else "🛡️ Change Verification", callback_data="admin_toggle_verification")],
-        [InlineKeyboardButton("⬅️ Назад" if language == 'ru' else "⬅️ Back", callback_data="admin_back_to_users")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    def file_io(self, name, op, size, seconds):
+        stats = self.files.get(name)
+        if stats is None:
+            stats = self.files[name] = dict.fromkeys(('opens',) + self.FILE_OPS + ('bytes', 'seconds'), 0)
+        stats['opens'] += 1
+        stats[op] += 1
+        stats['bytes'] += size
+        stats['seconds'] += seconds
+    
+    def call(self, name, seconds):
+        stats = self.calls.setdefault(name, [0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
 
-def get_withdrawal_management_keyboard(request_id, language='ru'):
-    keyboard = [
-        [
-            InlineKeyboardButton("✅ Одобрить заявку" if language == 'ru' else "✅ Approve Request", callback_data=f"approve_withdrawal_{request_id}"),
-            InlineKeyboardButton("❌ Отклонить заявку" if language == 'ru' else "❌ Reject Request", callback_data=f"reject_withdrawal_{request_id}")
-        ],
-        [InlineKeyboardButton("📞 Связаться с пользователем" if language == 'ru' else "📞 Contact User", callback_data=f"contact_user_{request_id}")],
-        [InlineKeyboardButton("⬅️ Назад" if language == 'ru' else "⬅️ Back", callback_data="admin_back_to_withdrawals")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
+def count_file_io(file_path, op, size, seconds):
+    name = os.path.basename(file_path)
+    direction = 'read' if op in ('parse', 'read') else 'write'
+    metrics.inc('bot_storage_bytes_total', (('file', name), ('direction', direction)), size)
+    profile = current_update_profile.get()
+    if profile is not None:
+        profile.file_io(name, op, size, seconds)
+    elif update_profiler.enabled:
+        #фоновый сброс идет вне обновлений / the background flush runs outside of updates
+        update_profiler.background.file_io(name, op, size, seconds)
 
-def get_deposit_management_keyboard(request_id, language='ru'):
-    keyboard = [
-        [
-            InlineKeyboardButton("✅ Одобрить заявку" if language == 'ru' else "✅ Approve Request", callback_data=f"approve_deposit_{request_id}"),
-            InlineKeyboardButton("❌ Отклонить заявку" if language == 'ru' else "❌ Reject Request", callback_data=f"reject_deposit_{request_id}")
-        ],
-        [InlineKeyboardButton("📞 Связаться с пользователем" if language == 'ru' else "📞 Contact User", callback_data=f"contact_user_{request_id}")],
-        [InlineKeyboardButton("⬅️ Назад" if language == 'ru' else "⬅️ Back", callback_data="admin_back_to_deposits")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
+#функции доступа к данным, которые считаются в профиле обновления / data access functions counted in the update profile
+def profiled_call(func):
+    name = func.__name__
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = current_update_profile.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.call(name, time.perf_counter() - started)
+    return wrapper
 
-def get_verification_management_keyboard(request_id, language='ru'):
-    keyboard = [
-        [
-            InlineKeyboardButton("✅ Одобрить заявку" if language == 'ru' else "✅ Approve Request", callback_data=f"approve_verification_{request_id}"),
-            InlineKeyboardButton("❌ Отклонить заявку" if language == 'ru' else "❌ Reject Request", callback_data=f"reject_verification_{request_id}")
-        ],
-        [InlineKeyboardButton("📞 Связаться с пользователем" if language == 'ru' else "📞 Contact User", callback_data=f"contact_user_{request_id}")],
-        [InlineKeyboardButton("⬅️ Назад" if language == 'ru' else "⬅️ Back", callback_data="admin_back_to_verifications")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
+#класс хранилища: каждый публичный метод считает вызовы и время / storage class: every public method counts its calls and time
+def measure_storage(backend):
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or not callable(method):
+                continue
+            setattr(cls, name, _measured(method, (('backend', backend), ('op', name))))
+        return cls
+    return decorate
 
-def get_approved_requests_keyboard(language='ru'):
-    keyboard = [
-        [InlineKeyboardButton("💸 На вывод" if language == 'ru' else "💸 Withdrawals", callback_data="admin_approved_withdrawals")],
-        [InlineKeyboardButton("💰 На пополнение" if language == 'ru' else "💰 Deposits", callback_data="admin_approved_deposits")],
-        [InlineKeyboardButton("⬅️ Назад" if language == 'ru' else "⬅️ Back", callback_data="admin_back_to_menu")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
+def _measured(method, labels):
+    #у SQLite нет файлов по таблицам, поэтому в профиль обновления идут вызовы / SQLite has no per-table files, so the update profile gets the calls
+    call_name = "storage." + method.__name__
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started
+            metrics.observe('bot_storage_seconds', labels, seconds)
+            profile = current_update_profile.get()
+            if profile is not None:
+                profile.call(call_name, seconds)
+    return wrapper
 
-def get_rejected_requests_keyboard(language='ru'):
-    keyboard = [
-        [InlineKeyboardButton("💸 На вывод" if language == 'ru' else "💸 Withdrawals", callback_data="admin_rejected_withdrawals")],
-        [InlineKeyboardButton("💰 На пополнение" if language == 'ru' else "💰 Deposits", callback_data="admin_rejected_deposits")],
-        [InlineKeyboardButton("⬅️ Назад" if language == 'ru' else "⬅️ Back", callback_data="admin_back_to_menu")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
+def end_torn_line(file_path):
+    #после сбоя последняя строка могла остаться недописанной, новые записи начинаются с новой строки / after a crash the last line may be torn, new records start on a fresh line
+    try:
+        with open(file_path, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    except OSError:
+        pass
 
-#вспомогательные функции для обновления списков заявок / auxiliary functions for updating application lists
-async def show_admin_withdrawals(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    context.user_data['state'] = ADMIN_WITHDRAWAL_DETAIL
-    requests = get_withdrawal_requests("pending")
+#журнал заявок: снимок JSON + построчный лог изменений / request journal: JSON snapshot + line-delimited change log
+class RequestJournal:
+    def __init__(self, snapshot_file):
+        self.snapshot_file = snapshot_file
+        self.journal_file = os.path.splitext(snapshot_file)[0] + ".journal"
+        #лог, который сейчас сворачивается в снимок / log that is currently being folded into the snapshot
+        self.compacting_file = self.journal_file + ".compacting"
+        self._lock = threading.Lock()
+        self._handle = None
+        self._ids = None
+        #записи, еще не сброшенные на диск / entries not yet flushed to disk
+        self._buffer = []
+        self.pending_ops = 0
     
-    keyboard = []
-    for i, req in enumerate(requests):
-        user = get_user_from_json(req.user_id)
-        if user:
-            keyboard.append([InlineKeyboardButton(f"💸 Заявка {i+1} от {user.full_name}", callback_data=f"admin_withdrawal_{req.request_id}")])
+    def _read_snapshot(self):
+        started = time.perf_counter()
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                size = os.fstat(f.fileno()).st_size
+                records = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+        count_file_io(self.snapshot_file, 'parse', size, time.perf_counter() - started)
+        return records
     
-    if not keyboard:
-        keyboard.append([InlineKeyboardButton("📭 Нет заявок", callback_data="no_actions")])
-        
-    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_back_to_menu")])
+    def _read_entries(self, file_path):
+        started = time.perf_counter()
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                size = os.fstat(f.fileno()).st_size
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        #недописанная строка после сбоя / a torn line after a crash
+                        continue
+        except FileNotFoundError:
+            return
+        count_file_io(file_path, 'parse', size, time.perf_counter() - started)
     
-    await query.edit_message_text(
-        "💸 *Заявки на вывод*\n\n📋 *Ниже представлен список всех заявок на вывод:*",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='Markdown'
-    )
-
-async def show_admin_deposits(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    context.user_data['state'] = ADMIN_DEPOSITS
-    requests = get_deposit_requests("pending")
+    def _replay(self, source, records):
+        #все операции идемпотентны, поэтому повторное применение безопасно / all ops are idempotent, so replaying twice is safe
+        entries = self._read_entries(source) if isinstance(source, str) else source
+        count = 0
+        for entry in entries:
+            count += 1
+            op = entry['op']
+            if op == 'put':
+                records[entry['data']['request_id']] = dict(entry['data'])
+            elif op == 'status':
+                if entry['request_id'] in records:
+                    records[entry['request_id']]['status'] = entry['status']
+            elif op == 'delete':
+                records.pop(entry['request_id'], None)
+        return count
     
-    keyboard = []
-    for i, req in enumerate(requests):
-        user = get_user_from_json(req.user_id)
-        if user:
-            keyboard.append([InlineKeyboardButton(f"💰 Заявка {i+1} от {user.full_name}", callback_data=f"admin_deposit_{req.request_id}")])
+    def _fold(self, include_journal=True):
+        records = {r['request_id']: r for r in self._read_snapshot()}
+        count = self._replay(self.compacting_file, records)
+        if include_journal:
+            count += self._replay(self.journal_file, records)
+            count += self._replay(self._buffer, records)
+        return records, count
     
-    if not keyboard:
-        keyboard.append([InlineKeyboardButton("📭 Нет заявок", callback_data="no_actions")])
-        
-    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_back_to_menu")])
+    def load(self):
+        with self._lock:
+            records, count = self._fold()
+            self._ids = set(records)
+            self.pending_ops = count
+        return list(records.values())
     
-    await query.edit_message_text(
-        "💰 *Заявки на пополнение*\n\n📋 *Ниже представлен список всех заявок на пополнение:*",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='Markdown'
-    )
-
-async def show_admin_verifications(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    context.user_data['state'] = ADMIN_VERIFICATIONS
-    requests = get_verification_requests("pending")
+    def _append(self, entry):
+        #запись копится в буфере до ближайшего сброса / the entry waits in the buffer until the next flush
+        with self._lock:
+            self._buffer.append(entry)
+            self.pending_ops += 1
     
-    keyboard = []
-    for i, req in enumerate(requests):
-        user = get_user_from_json(req.user_id)
-        if user:
-            keyboard.append([InlineKeyboardButton(f"🛡️ Заявка {i+1} от {user.full_name}", callback_data=f"admin_verification_{req.request_id}")])
+    def flush(self):
+        #все накопленные записи уходят одной операцией записи / all buffered entries go out in a single write
+        with self._lock:
+            self._flush_locked()
     
-    if not keyboard:
-        keyboard.append([InlineKeyboardButton("📭 Нет заявок", callback_data="no_actions")])
-        
-    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_back_to_menu")])
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        if self._handle is None:
+            end_torn_line(self.journal_file)
+            self._handle = open(self.journal_file, 'a', encoding='utf-8')
+        started = time.perf_counter()
+        data = "".join(
+            json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n" for entry in self._buffer
+        )
+        self._handle.write(data)
+        self._handle.flush()
+        count_file_io(self.journal_file, 'append', len(data.encode('utf-8')), time.perf_counter() - started)
+        self._buffer = []
     
-    await query.edit_message_text(
-        "🛡️ *Заявки на верификацию*\n\n📋 *Ниже представлен список всех заявок на верификацию:*",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='Markdown'
-    )
-
-async def show_admin_approved_withdrawals(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    context.user_data['state'] = ADMIN_APPROVED_WITHDRAWALS
-    requests = get_withdrawal_requests("approved")
+    def _known_ids(self):
+        if self._ids is None:
+            self.load()
+        return self._ids
     
-    keyboard = []
-    for i, req in enumerate(requests):
-        user = get_user_from_json(req.user_id)
-        if user:
-            keyboard.append([InlineKeyboardButton(f"✅ Заявка {i+1} от {user.full_name}", callback_data=f"admin_approved_withdrawal_{req.request_id}")])
+    def put(self, request_data):
+        self._known_ids().add(request_data['request_id'])
+        self._append({'op': 'put', 'data': request_data})
     
-    if not keyboard:
-        keyboard.append([InlineKeyboardButton("📭 Нет одобренных заявок", callback_data="no_actions")])
+    def set_status(self, request_id, status):
+        if request_id not in self._known_ids():
+            return False
+        self._append({'op': 'status', 'request_id': request_id, 'status': status})
+        return True
+    
+    def delete(self, request_id):
+        ids = self._known_ids()
+        if request_id not in ids:
+            return False
+        ids.discard(request_id)
+        self._append({'op': 'delete', 'request_id': request_id})
+        return True
+    
+    def compact(self):
+        #сворачивает лог в снимок; новые записи в это время идут в свежий лог / folds the log into the snapshot; new writes go to a fresh log meanwhile
+        with self._lock:
+            if not os.path.exists(self.compacting_file):
+                self._flush_locked()
+                if self._handle is not None:
+                    self._handle.close()
+                    self._handle = None
+                if not os.path.exists(self.journal_file):
+                    return
+                os.replace(self.journal_file, self.compacting_file)
+            self.pending_ops = 0
+        
+        records, _ = self._fold(include_journal=False)
+        tmp_file = self.snapshot_file + ".tmp"
+        started = time.perf_counter()
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(list(records.values()), f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        count_file_io(self.snapshot_file, 'rewrite', size, time.perf_counter() - started)
         
-    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_back_to_approved")])
+        with self._lock:
+            os.replace(tmp_file, self.snapshot_file)
+            os.remove(self.compacting_file)
     
-    await query.edit_message_text(
-        "✅ *Одобренные заявки на вывод*\n\n📋 *Ниже представлен список всех одобренных заявок на вывод:*",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='Markdown'
-    )
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
 
-async def show_admin_approved_deposits(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    context.user_data['state'] = ADMIN_APPROVED_DEPOSITS
-    requests = get_deposit_requests("approved")
+#хранилище в JSON файлах / storage in JSON files
+@measure_storage("json")
+class JsonStorage:
+    #JSON нельзя читать частично, поэтому пользователи грузятся целиком / JSON can't be read partially, so users are loaded in full
+    preload_users = True
+    #снимок пишется в отдельном потоке / the snapshot is written in a worker thread
+    flush_in_thread = True
     
-    keyboard = []
-    for i, req in enumerate(requests):
-        user = get_user_from_json(req.user_id)
-        if user:
-            keyboard.append([InlineKeyboardButton(f"✅ Заявка {i+1} от {user.full_name}", callback_data=f"admin_approved_deposit_{req.request_id}")])
+    def __init__(self):
+        self.journals = {kind: RequestJournal(file_path) for kind, (file_path, _, _) in REQUEST_KINDS.items()}
+        self._ledger_lock = threading.Lock()
+        self._ledger_handle = None
+        self._ledger_buffer = []
+        self._ledger_offset = None
     
-    if not keyboard:
-        keyboard.append([InlineKeyboardButton("📭 Нет одобренных заявок", callback_data="no_actions")])
-        
-    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_back_to_approved")])
+    def init(self):
+        init_json_files()
     
-    await query.edit_message_text(
-        "✅ *Одобренные заявки на пополнение*\n\n📋 *Ниже представлен список всех одобренных заявок на пополнение:*",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='Markdown'
-    )
-
-async def show_admin_rejected_withdrawals(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    context.user_data['state'] = ADMIN_REJECTED_WITHDRAWALS
-    requests = get_withdrawal_requests("rejected")
+    def _read(self, file_path):
+        started = time.perf_counter()
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                size = os.fstat(f.fileno()).st_size
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+        count_file_io(file_path, 'parse', size, time.perf_counter() - started)
+        return data
     
-    keyboard = []
-    for i, req in enumerate(requests):
-        user = get_user_from_json(req.user_id)
-        if user:
-            keyboard.append([InlineKeyboardButton(f"❌ Заявка {i+1} от {user.full_name}", callback_data=f"admin_rejected_withdrawal_{req.request_id}")])
+    def _write(self, file_path, data, indent=2):
+        #запись во временный файл и атомарное переименование / write to a temp file and rename atomically
+        tmp_file = file_path + ".tmp"
+        started = time.perf_counter()
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(tmp_file, file_path)
+        count_file_io(file_path, 'rewrite', size, time.perf_counter() - started)
     
-    if not keyboard:
-        keyboard.append([InlineKeyboardButton("📭 Нет отклоненных заявок", callback_data="no_actions")])
-        
-    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_back_to_rejected")])
+    def load_users(self):
+        return self._read(JSON_USERS_FILE)
+    
+    def load_users_by_ids(self, user_ids):
+        wanted = set(user_ids)
+        return [u for u in self._read(JSON_USERS_FILE) if u['user_id'] in wanted]
+    
+    def save_users(self, changed_users, all_users):
+        #файл переписывается целиком / the file is rewritten in full
+        self._write(JSON_USERS_FILE, [u.to_dict() for u in all_users])
+    
+    def load_requests(self, kind, status=None):
+        requests = self.journals[kind].load()
+        if status is None:
+            return requests
+        return [r for r in requests if r.get('status', 'pending') == status]
+    
+    #запись заявки — одна строка в журнале / writing a request is one line in the journal
+    def add_request(self, kind, request_data):
+        self.journals[kind].put(request_data)
+    
+    def update_request_status(self, kind, request_id, status):
+        return self.journals[kind].set_status(request_id, status)
+    
+    def delete_request(self, kind, request_id):
+        return self.journals[kind].delete(request_id)
+    
+    def compact_journals(self, force=False):
+        for journal in self.journals.values():
+            if force or journal.pending_ops >= JOURNAL_COMPACT_THRESHOLD:
+                journal.compact()
+    
+    def flush_log(self):
+        #книга и журналы заявок — источник истины, они пишутся раньше производных строк / the ledger and request journals are the source of truth, they are written before derived rows
+        self._flush_ledger()
+        for journal in self.journals.values():
+            journal.flush()
+    
+    def flush(self):
+        self.flush_log()
+    
+    #книга проводок: только дозапись, снимок балансов хранит смещение в файле / ledger: append-only, the balance snapshot keeps a file offset
+    def append_ledger(self, entry):
+        with self._ledger_lock:
+            self._ledger_buffer.append(entry)
+    
+    def _flushed_ledger_offset(self):
+        if self._ledger_offset is None:
+            try:
+                self._ledger_offset = os.path.getsize(JSON_LEDGER_FILE)
+            except FileNotFoundError:
+                self._ledger_offset = 0
+        return self._ledger_offset
+    
+    def ledger_offset(self):
+        with self._ledger_lock:
+            return self._flushed_ledger_offset()
+    
+    def _flush_ledger(self):
+        with self._ledger_lock:
+            if not self._ledger_buffer:
+                return
+            data = "".join(
+                json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n" for entry in self._ledger_buffer
+            ).encode('utf-8')
+            if self._ledger_handle is None:
+                end_torn_line(JSON_LEDGER_FILE)
+                self._ledger_offset = None
+                self._ledger_handle = open(JSON_LEDGER_FILE, 'ab')
+            offset = self._flushed_ledger_offset()
+            started = time.perf_counter()
+            self._ledger_handle.write(data)
+            self._ledger_handle.flush()
+            count_file_io(JSON_LEDGER_FILE, 'append', len(data), time.perf_counter() - started)
+            self._ledger_offset = offset + len(data)
+            self._ledger_buffer = []
+    
+    def load_ledger_snapshot(self):
+        try:
+            with open(JSON_LEDGER_SNAPSHOT_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+    
+    def load_ledger_tail(self, snapshot):
+        #читаются только записи после снимка / only the entries after the snapshot are read
+        try:
+            with open(JSON_LEDGER_FILE, 'rb') as f:
+                f.seek(snapshot['offset'] if snapshot else 0)
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        #недописанная строка после сбоя / a torn line after a crash
+                        continue
+        except FileNotFoundError:
+            return
+    
+    def save_ledger_snapshot(self, snapshot):
+        self._write(JSON_LEDGER_SNAPSHOT_FILE, snapshot, indent=None)
+    
+    def load_outbox(self):
+        return self._read(JSON_OUTBOX_FILE)
+    
+    def save_outbox(self, changed, removed, pending):
+        #в очереди только недоставленное, файл переписывается целиком / the queue holds only undelivered messages, the file is rewritten in full
+        self._write(JSON_OUTBOX_FILE, pending, indent=None)
+    
+    #сессия — отдельный файл: читается одна при первом обращении, пишутся только измененные / a session is its own file: one is read on first access, only changed ones are written
+    def _session_file(self, user_id):
+        return os.path.join(JSON_SESSIONS_DIR, f"{user_id}.json")
+    
+    def load_session(self, user_id):
+        started = time.perf_counter()
+        try:
+            with open(self._session_file(user_id), 'r', encoding='utf-8') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        count_file_io(JSON_SESSIONS_DIR, 'read', len(data), time.perf_counter() - started)
+        return data
+    
+    def load_sessions(self):
+        try:
+            names = os.listdir(JSON_SESSIONS_DIR)
+        except FileNotFoundError:
+            return {}
+        user_ids = [int(name[:-len(".json")]) for name in names if name.endswith(".json")]
+        return {user_id: self.load_session(user_id) for user_id in user_ids}
+    
+    def save_sessions(self, changed, removed):
+        if changed:
+            os.makedirs(JSON_SESSIONS_DIR, exist_ok=True)
+        #без fsync: потеря последних долей секунды состояния диалога не страшна / no fsync: losing the last fraction of a second of dialog state is harmless
+        for user_id, data in changed.items():
+            session_file = self._session_file(user_id)
+            started = time.perf_counter()
+            with open(session_file + ".tmp", 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(session_file + ".tmp", session_file)
+            count_file_io(JSON_SESSIONS_DIR, 'rewrite', len(data), time.perf_counter() - started)
+        for user_id in removed:
+            try:
+                os.remove(self._session_file(user_id))
+            except FileNotFoundError:
+                pass
+    
+    def max_request_id(self, kind):
+        return max((r['request_id'] for r in self.journals[kind].load()), default=0)
+    
+    def load_sequences(self):
+        return self._read(JSON_SEQUENCES_FILE) or {}
+    
+    def reserve_ids(self, kind, count):
+        sequences = self.load_sequences()
+        start = sequences.get(kind)
+        if start is None:
+            #разовое заполнение по уже выданным id / one-time seeding from the ids already in use
+            start = self.max_request_id(kind) + 1
+        sequences[kind] = start + count
+        self._write(JSON_SEQUENCES_FILE, sequences)
+        return start
+    
+    def staff_version(self):
+        try:
+            return os.stat(JSON_STAFF_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def load_staff(self):
+        return self._read(JSON_STAFF_FILE)
+    
+    def add_staff(self, user_id, full_name):
+        staff_data = self._read(JSON_STAFF_FILE)
+        
+        # Проверяем, нет ли уже такого сотрудника
+        if not any(staff['user_id'] == user_id for staff in staff_data):
+            staff_data.append({'user_id': user_id, 'full_name': full_name})
+            self._write(JSON_STAFF_FILE, staff_data)
+    
+    def close(self):
+        for journal in self.journals.values():
+            journal.close()
+        self._flush_ledger()
+        with self._ledger_lock:
+            if self._ledger_handle is not None:
+                self._ledger_handle.close()
+                self._ledger_handle = None
+
+#хранилище в SQLite (WAL) / storage in SQLite (WAL)
+@measure_storage("sqlite")
+class SqliteStorage:
+    #пользователи подгружаются по запросу / users are loaded on demand
+    preload_users = False
+    #соединение принадлежит потоку цикла событий / the connection belongs to the event loop thread
+    flush_in_thread = False
+    
+    USER_COLUMNS = User.FIELDS
+    
+    def __init__(self, db_file=SQLITE_DB_FILE):
+        self.db_file = db_file
+        self.conn = None
+    
+    def init(self):
+        #sqlite3 кеширует подготовленные выражения по тексту запроса / sqlite3 caches prepared statements by query text
+        self.conn = sqlite3.connect(self.db_file, cached_statements=256)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS users ("
+            " user_id INTEGER PRIMARY KEY, full_name TEXT, passport TEXT,"
+            " balance REAL NOT NULL DEFAULT 0, on_hold REAL NOT NULL DEFAULT 0,"
+            " verified INTEGER NOT NULL DEFAULT 0, language TEXT NOT NULL DEFAULT 'ru');"
+            "CREATE TABLE IF NOT EXISTS staff (user_id INTEGER PRIMARY KEY, full_name TEXT);"
+            "CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, next_id INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS withdrawals ("
+            " request_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, amount REAL NOT NULL,"
+            " details TEXT, status TEXT NOT NULL DEFAULT 'pending');"
+            "CREATE TABLE IF NOT EXISTS deposits ("
+            " request_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, amount REAL NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending');"
+            "CREATE TABLE IF NOT EXISTS verifications ("
+            " request_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, photo_file_id TEXT,"
+            " status TEXT NOT NULL DEFAULT 'pending');"
+            "CREATE TABLE IF NOT EXISTS ledger ("
+            " seq INTEGER PRIMARY KEY, ts REAL NOT NULL, memo TEXT NOT NULL, ref TEXT, postings TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS ledger_snapshots (seq INTEGER PRIMARY KEY, balances TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, text TEXT NOT NULL, parse_mode TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0, not_before REAL NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS sessions (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL);"
+        )
+        for _, table, _ in REQUEST_KINDS.values():
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_id ON {table} (user_id)")
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_status ON {table} (status)")
+        self.conn.commit()
+        
+        #тексты запросов собираются один раз / query texts are built once
+        self._upsert_user_sql = (
+            f"INSERT OR REPLACE INTO users ({', '.join(self.USER_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(self.USER_COLUMNS))})"
+        )
+        self._request_sql = {}
+        for kind, (_, table, request_cls) in REQUEST_KINDS.items():
+            columns = request_cls.FIELDS
+            self._request_sql[kind] = {
+                'all': f"SELECT {', '.join(columns)} FROM {table} ORDER BY request_id",
+                'by_status': f"SELECT {', '.join(columns)} FROM {table} WHERE status = ? ORDER BY request_id",
+                'insert': f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                'status': f"UPDATE {table} SET status = ? WHERE request_id = ?",
+                'delete': f"DELETE FROM {table} WHERE request_id = ?",
+            }
+    
+    def _user_from_row(self, row):
+        data = dict(row)
+        data['verified'] = bool(data['verified'])
+        return data
+    
+    def load_users(self):
+        rows = self.conn.execute(f"SELECT {', '.join(self.USER_COLUMNS)} FROM users ORDER BY user_id")
+        return [self._user_from_row(row) for row in rows]
+    
+    def load_users_page(self, after=None, before=None, limit=ADMIN_USERS_PAGE_SIZE):
+        columns = ', '.join(self.USER_COLUMNS)
+        if before is not None:
+            rows = self.conn.execute(
+                f"SELECT {columns} FROM users WHERE user_id < ? ORDER BY user_id DESC LIMIT ?", (before, limit)
+            ).fetchall()
+            rows.reverse()
+        else:
+            rows = self.conn.execute(
+                f"SELECT {columns} FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                (after if after is not None else -1, limit)
+            ).fetchall()
+        return [self._user_from_row(row) for row in rows]
+    
+    def load_users_by_ids(self, user_ids):
+        user_ids = list(user_ids)
+        columns = ', '.join(self.USER_COLUMNS)
+        users = []
+        #по частям, чтобы не упереться в лимит параметров SQLite / in chunks to stay under SQLite's parameter limit
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT {columns} FROM users WHERE user_id IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            users.extend(self._user_from_row(row) for row in rows)
+        return users
+    
+    def load_user(self, user_id):
+        row = self.conn.execute(f"SELECT {', '.join(self.USER_COLUMNS)} FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return self._user_from_row(row) if row else None
+    
+    #изменения копятся в открытой транзакции и фиксируются в flush / changes pile up in an open transaction and are committed in flush
+    def save_users(self, changed_users, all_users):
+        #пишутся только измененные строки / only the changed rows are written
+        self.conn.executemany(
+            self._upsert_user_sql,
+            [u.to_row() for u in changed_users]
+        )
+    
+    def import_users(self, users_data):
+        #строки как есть, с сохраненными балансами / rows as they are, with the stored balances
+        defaults = {'passport': None, 'balance': 0, 'on_hold': 0, 'verified': False, 'language': 'ru'}
+        self.conn.executemany(
+            self._upsert_user_sql,
+            [tuple(data.get(c, defaults.get(c)) for c in self.USER_COLUMNS) for data in users_data]
+        )
+    
+    def load_requests(self, kind, status=None):
+        sql = self._request_sql[kind]
+        if status is None:
+            rows = self.conn.execute(sql['all'])
+        else:
+            rows = self.conn.execute(sql['by_status'], (status,))
+        return [dict(row) for row in rows]
+    
+    def add_request(self, kind, request_data):
+        columns = REQUEST_KINDS[kind][2].FIELDS
+        self.conn.execute(self._request_sql[kind]['insert'], tuple(request_data.get(c) for c in columns))
+    
+    def update_request_status(self, kind, request_id, status):
+        cursor = self.conn.execute(self._request_sql[kind]['status'], (status, request_id))
+        return cursor.rowcount > 0
+    
+    def delete_request(self, kind, request_id):
+        cursor = self.conn.execute(self._request_sql[kind]['delete'], (request_id,))
+        return cursor.rowcount > 0
+    
+    def reserve_ids(self, kind, count):
+        row = self.conn.execute("SELECT next_id FROM sequences WHERE name = ?", (kind,)).fetchone()
+        if row is None:
+            #разовое заполнение по уже выданным id / one-time seeding from the ids already in use
+            table = REQUEST_KINDS[kind][1]
+            start = (self.conn.execute(f"SELECT MAX(request_id) FROM {table}").fetchone()[0] or 0) + 1
+        else:
+            start = row[0]
+        #граница блока фиксируется тем же сбросом, что и заявки с этими id: после сбоя пропадают обе / the block bound is committed by the same flush as the requests using its ids: after a crash both are gone
+        self.set_sequence(kind, start + count)
+        return start
+    
+    def set_sequence(self, kind, next_id):
+        self.conn.execute("INSERT OR REPLACE INTO sequences (name, next_id) VALUES (?, ?)", (kind, next_id))
+    
+    def staff_version(self):
+        #меняется, когда базу изменило другое соединение / changes when another connection has modified the database
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def load_staff(self):
+        return [dict(row) for row in self.conn.execute("SELECT user_id, full_name FROM staff")]
+    
+    #транзакцией владеет сброс: здесь ничего не фиксируется / the flush owns the transaction: nothing is committed here
+    def add_staff(self, user_id, full_name):
+        self.conn.execute("INSERT OR IGNORE INTO staff (user_id, full_name) VALUES (?, ?)", (user_id, full_name))
+    
+    def append_ledger(self, entry):
+        self.conn.execute(
+            "INSERT INTO ledger (seq, ts, memo, ref, postings) VALUES (?, ?, ?, ?, ?)",
+            (entry['seq'], entry['ts'], entry['memo'], entry['ref'], json.dumps(entry['postings']))
+        )
+    
+    def import_ledger(self, entries):
+        #уже перенесенные проводки пропускаются, повторный migrate безопасен / already copied postings are skipped, running migrate again is safe
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO ledger (seq, ts, memo, ref, postings) VALUES (?, ?, ?, ?, ?)",
+            ((entry['seq'], entry['ts'], entry['memo'], entry['ref'], json.dumps(entry['postings'])) for entry in entries)
+        )
+    
+    def ledger_offset(self):
+        #хвост выбирается по seq / the tail is selected by seq
+        return None
+    
+    def load_ledger_snapshot(self):
+        row = self.conn.execute("SELECT seq, balances FROM ledger_snapshots ORDER BY seq DESC LIMIT 1").fetchone()
+        return {'seq': row['seq'], 'balances': json.loads(row['balances'])} if row else None
+    
+    def load_ledger_tail(self, snapshot):
+        rows = self.conn.execute(
+            "SELECT seq, ts, memo, ref, postings FROM ledger WHERE seq > ? ORDER BY seq",
+            (snapshot['seq'] if snapshot else 0,)
+        )
+        for row in rows:
+            entry = dict(row)
+            entry['postings'] = json.loads(entry['postings'])
+            yield entry
+    
+    def save_ledger_snapshot(self, snapshot):
+        #фиксируется следующим сбросом или при закрытии; до того при загрузке читается прежний снимок и хвост / committed by the next flush or on close; until then a load reads the previous snapshot and the tail
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ledger_snapshots (seq, balances) VALUES (?, ?)",
+            (snapshot['seq'], json.dumps(snapshot['balances']))
+        )
+        self.conn.execute("DELETE FROM ledger_snapshots WHERE seq < ?", (snapshot['seq'],))
+    
+    def load_outbox(self):
+        return [dict(row) for row in self.conn.execute(f"SELECT {', '.join(Outbox.FIELDS)} FROM outbox ORDER BY id")]
+    
+    def save_outbox(self, changed, removed, pending):
+        #в той же транзакции, что и изменения, о которых уведомляем / in the same transaction as the changes being notified about
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO outbox ({', '.join(Outbox.FIELDS)}) VALUES ({', '.join('?' * len(Outbox.FIELDS))})",
+            [tuple(record[field] for field in Outbox.FIELDS) for record in changed]
+        )
+        self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(record_id,) for record_id in removed])
+    
+    def load_session(self, user_id):
+        row = self.conn.execute("SELECT data FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+    
+    def load_sessions(self):
+        return dict(self.conn.execute("SELECT user_id, data FROM sessions"))
+    
+    def save_sessions(self, changed, removed):
+        self.conn.executemany("INSERT OR REPLACE INTO sessions (user_id, data) VALUES (?, ?)", list(changed.items()))
+        self.conn.executemany("DELETE FROM sessions WHERE user_id = ?", [(user_id,) for user_id in removed])
+    
+    def compact_journals(self, force=False):
+        #журнал ведет сам SQLite (WAL) / SQLite keeps its own journal (WAL)
+        pass
+    
+    def flush_log(self):
+        #весь сброс — одна транзакция, порядок внутри нее не важен / the whole flush is one transaction, the order inside it doesn't matter
+        pass
+    
+    def flush(self):
+        self.conn.commit()
+    
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+storage = JsonStorage()
+
+def init_storage():
+    #выбор хранилища по конфигу / choosing the storage backend by config
+    global storage
+    if STORAGE_BACKEND == "sqlite":
+        storage = SqliteStorage()
+    else:
+        storage = JsonStorage()
+    storage.init()
+    ledger.load()
+    if ledger.carry_over(storage.load_users()):
+        storage.flush()
+    user_repository.load()
+    for repository in request_repositories.values():
+        repository.reset()
+    request_id_sequences.clear()
+    roles.reset()
+    outbox.load()
+    session_store.reset()
+
+#суммы в книге хранятся в копейках / ledger amounts are kept in kopecks
+def to_minor(amount):
+    minor = amount * 100
+    if not math.isfinite(minor):
+        raise ValueError(f"Amount is not a finite number: {amount!r}")
+    return int(round(minor))
+
+#сумма из текста: float принимает "nan" и "inf", в книгу они попасть не должны / an amount from text: float accepts "nan" and "inf", they must never reach the ledger
+def parse_amount(text):
+    amount = float(text.strip())
+    to_minor(amount)
+    return amount
+
+def from_minor(minor):
+    return minor // 100 if minor % 100 == 0 else minor / 100
+
+def user_account(user_id, bucket):
+    return f"user:{user_id}:{bucket}"
+
+#внешние счета — вторая сторона проводок по счетам клиентов / external accounts are the other side of client postings
+DEPOSITS_ACCOUNT = "external:deposits"
+WITHDRAWALS_ACCOUNT = "external:withdrawals"
+ADJUSTMENTS_ACCOUNT = "equity:adjustments"
+OPENING_ACCOUNT = "equity:opening"
+
+#книга двойной записи: только дозапись, балансы — свертка проводок / double-entry ledger: append-only, balances are a fold of the postings
+class Ledger:
+    def __init__(self):
+        self.balances = {}
+        #зеркало счетов клиентов: user_id -> [balance, on_hold], чтобы сериализация не собирала имена счетов / a mirror of client accounts: user_id -> [balance, on_hold], so serialization doesn't build account names
+        self.by_user = {}
+        self.seq = 0
+        self.snapshot_seq = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+    
+    def load(self):
+        #снимок балансов + проводки после него, без обхода всей истории / the balance snapshot + postings after it, no full history scan
+        snapshot = storage.load_ledger_snapshot()
+        balances = dict(snapshot['balances']) if snapshot else {}
+        snapshot_seq = seq = snapshot['seq'] if snapshot else 0
+        for entry in storage.load_ledger_tail(snapshot):
+            if entry['seq'] <= seq:
+                continue
+            for account, amount in entry['postings']:
+                balances[account] = balances.get(account, 0) + amount
+            seq = entry['seq']
+        by_user = {}
+        for account in balances:
+            self._mirror(by_user, balances, account)
+        with self._lock:
+            self.balances = balances
+            self.by_user = by_user
+            self.seq = seq
+            self.snapshot_seq = snapshot_seq
+            self._loaded = True
+    
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+    
+    def balance(self, account):
+        self._ensure_loaded()
+        return self.balances.get(account, 0)
+    
+    @staticmethod
+    def _mirror(by_user, balances, account):
+        #имена счетов клиентов строит user_account: user:<id>:<bucket> / client account names come from user_account: user:<id>:<bucket>
+        if not account.startswith("user:"):
+            return
+        _, user_id, bucket = account.split(":")
+        entry = by_user.get(int(user_id))
+        if entry is None:
+            entry = by_user[int(user_id)] = [0, 0]
+        entry[bucket == 'on_hold'] = balances[account]
+    
+    def user_balances(self, user_id):
+        #оба счета пользователя одним обращением / both user accounts in one lookup
+        if not self._loaded:
+            self.load()
+        return self.by_user.get(user_id, NO_BALANCES)
+    
+    def post(self, memo, postings, ref=None):
+        self._ensure_loaded()
+        if sum(amount for _, amount in postings) != 0:
+            raise ValueError(f"Unbalanced ledger entry {memo}: {postings}")
+        with self._lock:
+            self.seq += 1
+            entry = {
+                'seq': self.seq,
+                'ts': round(time.time(), 3),
+                'memo': memo,
+                'ref': ref,
+                'postings': [[account, amount] for account, amount in postings if amount]
+            }
+            for account, amount in postings:
+                self.balances[account] = self.balances.get(account, 0) + amount
+                self._mirror(self.by_user, self.balances, account)
+            storage.append_ledger(entry)
+        return entry
+    
+    def carry_over(self, users):
+        #разовый перенос балансов, записанных до книги; при непустой книге строки пользователей только производные / one-time carry-over of balances stored before the ledger; once the ledger has entries the user rows are derived only
+        self._ensure_loaded()
+        if self.seq:
+            return 0
+        count = 0
+        for user_data in users:
+            balance, on_hold = to_minor(user_data.get('balance', 0)), to_minor(user_data.get('on_hold', 0))
+            if balance or on_hold:
+                self.post('opening', [
+                    (user_account(user_data['user_id'], 'balance'), balance),
+                    (user_account(user_data['user_id'], 'on_hold'), on_hold),
+                    (OPENING_ACCOUNT, -balance - on_hold)
+                ])
+                count += 1
+        return count
+    
+    def capture_snapshot(self, force=False):
+        #снимок собирается под замком, а пишется после flush проводок / the snapshot is taken under the lock and written after the postings are flushed
+        with self._lock:
+            if not self._loaded or self.seq == self.snapshot_seq:
+                return None
+            if not force and self.seq - self.snapshot_seq < LEDGER_SNAPSHOT_EVERY:
+                return None
+            return {'seq': self.seq, 'offset': storage.ledger_offset(), 'balances': dict(self.balances)}
+    
+    def save_snapshot(self, snapshot):
+        storage.save_ledger_snapshot(snapshot)
+        self.snapshot_seq = snapshot['seq']
+
+NO_BALANCES = (0, 0)
+
+ledger = Ledger()
+
+#монотонная последовательность id заявок, выдается блоками / monotonic request id sequence, handed out in blocks
+class IdSequence:
+    def __init__(self, kind, block_size=ID_BLOCK_SIZE):
+        self.kind = kind
+        self.block_size = block_size
+        self._next = 0
+        self._limit = 0
+    
+    def allocate(self):
+        if self._next >= self._limit:
+            #граница блока сохраняется не позже заявок с этими id, поэтому после сбоя id не повторяются / the block bound is persisted no later than the requests using its ids, so no id repeats after a crash
+            self._next = storage.reserve_ids(self.kind, self.block_size)
+            self._limit = self._next + self.block_size
+        request_id = self._next
+        self._next += 1
+        return request_id
+
+request_id_sequences = {}
+
+def next_request_id(kind):
+    sequence = request_id_sequences.get(kind)
+    if sequence is None:
+        sequence = request_id_sequences[kind] = IdSequence(kind)
+    return sequence.allocate()
+
+#блокировки счетов для операций чтение-изменение-запись баланса / account locks for balance read-modify-write operations
+_account_locks = weakref.WeakValueDictionary()
+
+def account_lock(user_id):
+    lock = _account_locks.get(user_id)
+    if lock is None:
+        lock = _account_locks[user_id] = asyncio.Lock()
+    return lock
+
+#отложенная запись: все изменения за интервал уходят одним сбросом / write-behind: all changes within an interval go out in one flush
+_flush_lock = threading.Lock()
+
+def flush_storage(force_snapshot=False):
+    with _flush_lock:
+        started = time.perf_counter()
+        snapshot = ledger.capture_snapshot(force_snapshot)
+        #сначала книга и журналы, потом производные строки пользователей: после сбоя между ними строки устаревшие, но балансы читаются из книги / the ledger and journals first, derived user rows after: after a crash in between the rows are stale, but balances are read from the ledger
+        storage.flush_log()
+        user_repository.flush()
+        outbox.flush()
+        session_store.flush()
+        traffic_recorder.flush()
+        storage.flush()
+        #уведомления уходят только о зафиксированном / notifications go out only about what is committed
+        outbox.release()
+        #снимок пишется только после того, как его проводки на диске / the snapshot is written only once its postings are on disk
+        if snapshot is not None:
+            ledger.save_snapshot(snapshot)
+        metrics.observe('bot_flush_seconds', (), time.perf_counter() - started)
+
+#на петле сбросы ждут друг друга на asyncio.Lock, а не на _flush_lock, который держит поток записи / on the loop flushes wait for each other on an asyncio.Lock, not on _flush_lock held by the writer thread
+_flush_gate = asyncio.Lock()
+
+async def flush_storage_async():
+    if storage.flush_in_thread:
+        await asyncio.to_thread(flush_storage)
+    else:
+        flush_storage()
+
+#все изменения внутри блока уходят одним сбросом, фоновый сброс не разрежет их пополам / all changes inside the block go out in one flush, the background flush can't cut them in half
+@contextlib.asynccontextmanager
+async def storage_transaction():
+    async with _flush_gate:
+        try:
+            yield
+        finally:
+            #примененное до ошибки тоже сбрасывается сразу, а не следующим фоновым сбросом / whatever was applied before an error is flushed right away too, not by the next background flush
+            await flush_storage_async()
+
+async def run_write_behind():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL_MS / 1000)
+        try:
+            async with _flush_gate:
+                await flush_storage_async()
+        except Exception:
+            logging.exception("Storage flush failed")
+
+#фоновая свертка журналов / background journal compaction
+async def run_storage_maintenance():
+    while True:
+        await asyncio.sleep(JOURNAL_COMPACT_INTERVAL)
+        try:
+            await asyncio.to_thread(storage.compact_journals)
+        except Exception:
+            logging.exception("Journal compaction failed")
+
+def migrate_json_to_sqlite():
+    #разовый перенос данных из JSON файлов в SQLite / one-shot migration of the JSON files into SQLite
+    source = JsonStorage()
+    target = SqliteStorage()
+    target.init()
+    
+    users = source.load_users()
+    target.import_users(users)
+    
+    #книга переносится целиком, снимок SQLite построит при первой остановке / the ledger is copied in full, SQLite builds its snapshot on the first stop
+    target.import_ledger(source.load_ledger_tail(None))
+    
+    for kind in REQUEST_KINDS:
+        for request_data in source.load_requests(kind):
+            request_data.setdefault('status', 'pending')
+            target.add_request(kind, request_data)
+    
+    for staff in source.load_staff():
+        target.add_staff(staff['user_id'], staff['full_name'])
+    
+    for kind, next_id in source.load_sequences().items():
+        target.set_sequence(kind, next_id)
+    
+    notifications = source.load_outbox()
+    target.save_outbox(notifications, [], notifications)
+    
+    target.save_sessions(source.load_sessions(), [])
+    
+    target.close()
+    print(f"Перенесено в {SQLITE_DB_FILE}: {len(users)} пользователей / migrated {len(users)} users")
+
+#хранилище пользователей в памяти, индекс по user_id / in-memory user repository indexed by user_id
+class UserRepository:
+    def __init__(self):
+        self._users = {}
+        self._loaded = False
+        self._complete = False
+        #id пользователей, измененных после последнего сброса / ids of users changed since the last flush
+        self._dirty = set()
+        self._lock = threading.Lock()
+        #отсортированные id для постраничного вывода, строятся по запросу / sorted ids for pagination, built on demand
+        self._sorted_ids = None
+    
+    def load(self):
+        self._users = {}
+        self._dirty = set()
+        self._sorted_ids = None
+        self._complete = False
+        if storage.preload_users:
+            #единственный полный разбор users.json / the only full parse of users.json
+            for user_data in storage.load_users():
+                user = self._from_storage(user_data)
+                self._users[user.user_id] = user
+            self._complete = True
+        self._loaded = True
+    
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+    
+    def _from_storage(self, user_data):
+        #балансы в строке — производные, источник истины — книга / the row balances are derived, the ledger is the source of truth
+        return User.from_dict(user_data)
+    
+    def get(self, user_id):
+        self._ensure_loaded()
+        user = self._users.get(user_id)
+        if user is None and not self._complete:
+            user_data = storage.load_user(user_id)
+            if user_data:
+                user = self._from_storage(user_data)
+                with self._lock:
+                    self._users[user_id] = user
+        return user
+    
+    def get_many(self, user_ids):
+        #несколько пользователей за одно чтение: id -> User / several users in one read: id -> User
+        self._ensure_loaded()
+        found = {}
+        missing = []
+        for user_id in user_ids:
+            user = self._users.get(user_id)
+            if user is not None:
+                found[user_id] = user
+            elif not self._complete:
+                missing.append(user_id)
+        if missing:
+            for user_data in storage.load_users_by_ids(missing):
+                user = self._from_storage(user_data)
+                with self._lock:
+                    self._users[user.user_id] = user
+                found[user.user_id] = user
+        return found
+    
+    def all(self):
+        self._ensure_loaded()
+        if self._complete:
+            return list(self._users.values())
+        #несброшенные пользователи должны попасть в выборку / unflushed users must show up in the result
+        self.flush()
+        users = []
+        for user_data in storage.load_users():
+            #уже закешированные объекты не подменяем / already cached objects are kept
+            user = self._users.get(user_data['user_id'])
+            if user is None:
+                user = self._from_storage(user_data)
+                with self._lock:
+                    self._users[user.user_id] = user
+            users.append(user)
+        return users
+    
+    def save(self, user: User):
+        self._ensure_loaded()
+        #обновляем индекс и помечаем запись, на диск она уйдет при сбросе / update the index and mark the record, it reaches disk on flush
+        with self._lock:
+            if self._sorted_ids is not None and user.user_id not in self._users:
+                bisect.insort(self._sorted_ids, user.user_id)
+            self._users[user.user_id] = user
+            self._dirty.add(user.user_id)
+    
+    def page(self, after=None, before=None, limit=ADMIN_USERS_PAGE_SIZE):
+        #страница по курсору: после after или перед before / a page by cursor: after `after` or before `before`
+        self._ensure_loaded()
+        if not self._complete:
+            self.flush()
+            rows = storage.load_users_page(after=after, before=before, limit=limit + 1)
+            more = len(rows) > limit
+            if before is not None:
+                rows = rows[-limit:] if more else rows
+                has_prev, has_next = more, True
+            else:
+                rows = rows[:limit]
+                has_prev, has_next = after is not None, more
+            users = []
+            for user_data in rows:
+                user = self._users.get(user_data['user_id'])
+                if user is None:
+                    user = self._from_storage(user_data)
+                    with self._lock:
+                        self._users[user.user_id] = user
+                users.append(user)
+            return users, has_prev, has_next
+        
+        if self._sorted_ids is None:
+            with self._lock:
+                self._sorted_ids = sorted(self._users)
+        ids = self._sorted_ids
+        if before is not None:
+            end = bisect.bisect_left(ids, before)
+            start = max(0, end - limit)
+        else:
+            start = bisect.bisect_right(ids, after) if after is not None else 0
+            end = start + limit
+        page_ids = ids[start:end]
+        return [self._users[user_id] for user_id in page_ids], start > 0, end < len(ids)
+    
+    def pending_count(self):
+        return len(self._dirty)
+    
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            changed = [self._users[user_id] for user_id in dirty]
+            all_users = list(self._users.values())
+        try:
+            storage.save_users(changed, all_users)
+        except Exception:
+            #вернуть пометки, чтобы повторить при следующем сбросе / restore the marks to retry on the next flush
+            with self._lock:
+                self._dirty |= dirty
+            raise
+
+user_repository = UserRepository()
+
+@profiled_call
+def save_user_to_json(user: User):
+    user_repository.save(user)
+
+@profiled_call
+def load_users_from_json():
+    return user_repository.all()
+
+@profiled_call
+def get_user_from_json(user_id):
+    return user_repository.get(user_id)
+
+@profiled_call
+def get_users_from_json(user_ids):
+    return user_repository.get_many(user_ids)
+
+def get_all_users():
+    return load_users_from_json()
+
+@profiled_call
+def get_users_page(after=None, before=None, limit=ADMIN_USERS_PAGE_SIZE):
+    return user_repository.page(after=after, before=before, limit=limit)
+
+#деньги двигаются только проводками, строка пользователя обновляется как производная / money moves only by postings, the user row is refreshed as derived data
+def credit_balance(user: User, amount, source, memo, ref=None):
+    minor = to_minor(amount)
+    ledger.post(memo, [(user_account(user.user_id, 'balance'), minor), (source, -minor)], ref)
+    save_user_to_json(user)
+
+def debit_balance(user: User, amount, target, memo, ref=None):
+    minor = to_minor(amount)
+    ledger.post(memo, [(user_account(user.user_id, 'balance'), -minor), (target, minor)], ref)
+    save_user_to_json(user)
+
+def hold_withdrawal(user: User, amount, ref=None):
+    minor = to_minor(amount)
+    ledger.post('withdrawal_hold', [(user_account(user.user_id, 'balance'), -minor), (user_account(user.user_id, 'on_hold'), minor)], ref)
+    save_user_to_json(user)
+
+def settle_withdrawal(user: User, amount, ref=None):
+    minor = to_minor(amount)
+    ledger.post('withdrawal_paid', [(user_account(user.user_id, 'on_hold'), -minor), (WITHDRAWALS_ACCOUNT, minor)], ref)
+    save_user_to_json(user)
+
+def release_withdrawal(user: User, amount, ref=None):
+    minor = to_minor(amount)
+    ledger.post('withdrawal_released', [(user_account(user.user_id, 'on_hold'), -minor), (user_account(user.user_id, 'balance'), minor)], ref)
+    save_user_to_json(user)
+
+def reconcile_balances():
+    #сверка без обхода истории: сумма всех счетов равна нулю, строки пользователей совпадают с книгой / reconciliation without a history scan: all accounts sum to zero, user rows match the ledger
+    flush_storage()
+    mismatched = []
+    for user_data in storage.load_users():
+        user_id = user_data['user_id']
+        stored = (to_minor(user_data.get('balance', 0)), to_minor(user_data.get('on_hold', 0)))
+        if stored != (ledger.balance(user_account(user_id, 'balance')), ledger.balance(user_account(user_id, 'on_hold'))):
+            mismatched.append(user_id)
+    flush_storage()
+    total = sum(ledger.balances.values())
+    return total, mismatched
+
+#кеш заявок с индексом по статусу / request cache with a status index
+class RequestRepository:
+    def __init__(self, kind, request_cls):
+        self.kind = kind
+        self.request_cls = request_cls
+        self._requests = None
+        #статус -> упорядоченное множество id заявок / status -> ordered set of request ids
+        self._by_status = {}
+    
+    def reset(self):
+        self._requests = None
+        self._by_status = {}
+    
+    def _ensure_loaded(self):
+        if self._requests is None:
+            self._requests = {}
+            self._by_status = {}
+            for req_data in storage.load_requests(self.kind):
+                self._index(self.request_cls.from_dict(req_data))
+    
+    def _index(self, request):
+        self._requests[request.request_id] = request
+        self._by_status.setdefault(request.status, {})[request.request_id] = None
+    
+    def get(self, request_id):
+        self._ensure_loaded()
+        return self._requests.get(request_id)
+    
+    def list(self, status=None):
+        self._ensure_loaded()
+        if status is None:
+            return list(self._requests.values())
+        #обход только заявок с нужным статусом / walks only the requests with the given status
+        return [self._requests[request_id] for request_id in self._by_status.get(status, ())]
+    
+    def add(self, request):
+        self._ensure_loaded()
+        storage.add_request(self.kind, request.to_dict())
+        self._index(request)
+    
+    def set_status(self, request_id, status):
+        request = self.get(request_id)
+        if request is None:
+            return False
+        storage.update_request_status(self.kind, request_id, status)
+        self._by_status.get(request.status, {}).pop(request_id, None)
+        request.status = status
+        self._by_status.setdefault(status, {})[request_id] = None
+        return True
+    
+    def delete(self, request_id):
+        request = self.get(request_id)
+        if request is None:
+            return False
+        storage.delete_request(self.kind, request_id)
+        self._by_status.get(request.status, {}).pop(request_id, None)
+        del self._requests[request_id]
+        return True
+
+#один репозиторий на каждый тип заявок, код общий / one repository per request kind, shared code
+request_repositories = {kind: RequestRepository(kind, request_cls) for kind, (_, _, request_cls) in REQUEST_KINDS.items()}
+
+@profiled_call
+def save_request(request: Request):
+    request_repositories[request.kind].add(request)
+
+@profiled_call
+def get_requests(kind, status=None):
+    return request_repositories[kind].list(status)
+
+@profiled_call
+def get_request(kind, request_id):
+    return request_repositories[kind].get(request_id)
+
+@profiled_call
+def update_request_status(kind, request_id, status):
+    return request_repositories[kind].set_status(request_id, status)
+
+@profiled_call
+def delete_request(kind, request_id):
+    return request_repositories[kind].delete(request_id)
+
+#решения по заявкам, общие для одиночной и пакетной обработки; возвращают текст уведомления клиенту / request decisions shared by single and bulk processing; they return the client notification text
+def approve_withdrawal(request: WithdrawalRequest):
+    user = get_user_from_json(request.user_id)
+    if user:
+        settle_withdrawal(user, request.amount, ref=f"withdrawal:{request.request_id}")
+    update_request_status('withdrawal', request.request_id, "approved")
+    return f"✅ *Ваша заявка на вывод {request.amount} ₽ одобрена!*"
+
+def reject_withdrawal(request: WithdrawalRequest):
+    user = get_user_from_json(request.user_id)
+    if user:
+        #возврат денег на баланс / refund of money to the balance
+        release_withdrawal(user, request.amount, ref=f"withdrawal:{request.request_id}")
+    update_request_status('withdrawal', request.request_id, "rejected")
+    return f"❌ *Ваша заявка на вывод {request.amount} ₽ отклонена.*\n\n💰 *Средства возвращены на баланс.*"
+
+def approve_deposit(request: DepositRequest):
+    user = get_user_from_json(request.user_id)
+    if user:
+        credit_balance(user, request.amount, DEPOSITS_ACCOUNT, 'deposit', ref=f"deposit:{request.request_id}")
+    update_request_status('deposit', request.request_id, "approved")
+    return f"✅ *Ваша заявка на пополнение {request.amount} ₽ одобрена!*\n\n💰 *Баланс пополнен.*"
+
+def reject_deposit(request: DepositRequest):
+    update_request_status('deposit', request.request_id, "rejected")
+    return f"❌ *Ваша заявка на пополнение {request.amount} ₽ отклонена.*"
+
+def approve_verification(request: VerificationRequest):
+    user = get_user_from_json(request.user_id)
+    if user:
+        user.verified = True
+        save_user_to_json(user)
+    delete_request('verification', request.request_id)
+    return "✅ *Ваша верификация одобрена!*\n\n🛡️ *Теперь вы верифицированный пользователь.*"
+
+def reject_verification(request: VerificationRequest):
+    delete_request('verification', request.request_id)
+    return "❌ *Ваша заявка на верификацию отклонена.*\n\n🛡️ *Вы можете подать заявку повторно.*"
+
+REQUEST_DECISIONS = {
+    ('withdrawal', 'approve'): approve_withdrawal,
+    ('withdrawal', 'reject'): reject_withdrawal,
+    ('deposit', 'approve'): approve_deposit,
+    ('deposit', 'reject'): reject_deposit,
+    ('verification', 'approve'): approve_verification,
+    ('verification', 'reject'): reject_verification,
+}
+
+#пакетное решение: все изменения и уведомления одной транзакцией хранилища / bulk decision: all changes and notifications in one storage transaction
+#заявку мог уже обработать другой сотрудник или ее удалили; проверяется под account_lock / another staff member may have processed the request already, or it was deleted; checked under account_lock
+def still_pending(request):
+    return request.status == "pending" and get_request(request.kind, request.request_id) is request
+
+#одиночное решение: изменения и уведомление уходят одним сбросом, фоновый сброс не разрежет их / a single decision: the changes and the notification go out in one flush the background flush can't split
+async def decide_request(request, decision):
+    async with account_lock(request.user_id):
+        if not still_pending(request):
+            return False
+        async with storage_transaction():
+            notify(request.user_id, REQUEST_DECISIONS[request.kind, decision](request))
+    return True
+
+async def decide_requests(kind, request_ids, decision):
+    decide = REQUEST_DECISIONS[kind, decision]
+    requests = [request for request in (get_request(kind, request_id) for request_id in request_ids) if request is not None]
+    async with contextlib.AsyncExitStack() as stack:
+        #блокировки берутся по возрастанию id, чтобы две пачки не ждали друг друга по кругу / locks are taken in ascending id order so two batches never wait on each other in a cycle
+        for user_id in sorted({request.user_id for request in requests}):
+            await stack.enter_async_context(account_lock(user_id))
+        failed = 0
+        async with storage_transaction():
+            notifications = []
+            for request in requests:
+                if not still_pending(request):
+                    continue
+                #одна битая заявка не срывает пачку: она остается в ожидании, остальные решаются и получают уведомления / one broken request doesn't abort the batch: it stays pending, the rest are decided and notified
+                try:
+                    text = decide(request)
+                except Exception:
+                    logging.exception("Bulk %s of %s request %s failed", decision, kind, request.request_id)
+                    failed += 1
+                    continue
+                notifications.append((request.user_id, text))
+            #уведомления попадают в тот же сброс и уходят только после его фиксации / notifications land in the same flush and go out only after its commit
+            notify_many(notifications)
+    return len(notifications), failed
+
+#таблица ролей в памяти: админы из конфига и сотрудники / in-memory role table: admins from the config and staff
+class RoleTable:
+    def __init__(self):
+        self.admins = set(ADMIN_IDS)
+        self.staff = set()
+        self._loaded = False
+        self._version = None
+        self._checked_at = None
+    
+    def reset(self):
+        self.staff = set()
+        self._loaded = False
+        self._version = None
+        self._checked_at = None
+    
+    def _refresh(self):
+        #версия хранилища проверяется не чаще раза в STAFF_RELOAD_INTERVAL / the storage version is checked at most once per STAFF_RELOAD_INTERVAL
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < STAFF_RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        version = storage.staff_version()
+        if not self._loaded or version != self._version:
+            self._loaded = True
+            self._version = version
+            self.staff = {staff['user_id'] for staff in storage.load_staff()}
+    
+    def is_admin(self, user_id):
+        return user_id in self.admins
+    
+    def is_staff(self, user_id):
+        if user_id in self.admins:
+            return True
+        self._refresh()
+        return user_id in self.staff
+    
+    def add_staff(self, user_id, full_name):
+        storage.add_staff(user_id, full_name)
+        self.staff.add(user_id)
+        #собственная запись не должна вызывать перечитывание / our own write must not trigger a reload
+        self._version = storage.staff_version()
+
+roles = RoleTable()
+
+def is_admin(user_id):
+    return roles.is_admin(user_id)
+
+def is_staff(user_id):
+    return roles.is_staff(user_id)
+
+def add_staff_to_json(user_id, full_name):
+    roles.add_staff(user_id, full_name)
+
+#равномерный лимит: не больше rate вызовов в секунду / a smooth limit: at most `rate` calls per second
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self._next = 0
+    
+    async def acquire(self):
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+#исходящие уведомления: очередь с лимитами Telegram, повторами и сохранением недоставленного / outgoing notifications: a queue with Telegram rate limits, retries and persistence of undelivered messages
+class Outbox:
+    FIELDS = ('id', 'chat_id', 'text', 'parse_mode', 'attempts', 'not_before')
+    
+    def __init__(self):
+        self._pending = {}
+        #изменения с последнего сброса / changes since the last flush
+        self._changed = set()
+        self._removed = set()
+        #новые уведомления ждут сброса, а записанные - фиксации хранилища / new notifications wait for the flush, written ones for the storage commit
+        self._fresh = []
+        self._flushed = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._limiter = None
+        self._chat_ready_at = {}
+    
+    def load(self):
+        records = storage.load_outbox()
+        with self._lock:
+            self._pending = {record['id']: record for record in records}
+            self._changed = set()
+            self._removed = set()
+            self._fresh = []
+            self._flushed = []
+            self._next_id = max(self._pending, default=0) + 1
+    
+    def pending_count(self):
+        return len(self._pending)
+    
+    def queued_count(self):
+        return self._queue.qsize() if self._queue is not None else 0
+    
+    def send(self, chat_id, text, parse_mode='Markdown'):
+        self.send_many([(chat_id, text)], parse_mode)
+    
+    def send_many(self, messages, parse_mode='Markdown'):
+        #сразу возвращает управление; отправка начнется после сброса, чтобы не уведомить о несохраненном / returns right away; sending starts after the flush so nothing unsaved is announced
+        with self._lock:
+            for chat_id, text in messages:
+                record = {
+                    'id': self._next_id,
+                    'chat_id': chat_id,
+                    'text': text,
+                    'parse_mode': parse_mode,
+                    'attempts': 0,
+                    'not_before': 0
+                }
+                self._next_id += 1
+                self._pending[record['id']] = record
+                self._changed.add(record['id'])
+                self._fresh.append(record)
+    
+    def flush(self):
+        with self._lock:
+            if not self._changed and not self._removed:
+                return
+            changed_ids, removed_ids, fresh = self._changed, self._removed, self._fresh
+            self._changed, self._removed, self._fresh = set(), set(), []
+            changed = [self._pending[record_id] for record_id in changed_ids if record_id in self._pending]
+            pending = list(self._pending.values())
+        try:
+            storage.save_outbox(changed, removed_ids, pending)
+        except Exception:
+            with self._lock:
+                self._changed |= changed_ids
+                self._removed |= removed_ids
+                self._fresh[:0] = fresh
+            raise
+        with self._lock:
+            self._flushed.extend(fresh)
+    
+    def release(self):
+        #вызывается после фиксации хранилища, возможно из потока сброса / called after the storage commit, possibly from the flush thread
+        with self._lock:
+            if self._queue is None or not self._flushed:
+                return
+            records, self._flushed = self._flushed, []
+        self._loop.call_soon_threadsafe(self._enqueue, records)
+    
+    def _enqueue(self, records):
+        for record in records:
+            self._queue.put_nowait(record)
+    
+    def start(self, bot):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._limiter = RateLimiter(OUTBOX_GLOBAL_RATE)
+        #недоставленное с прошлого запуска уходит первым; еще не сохраненное уйдет после сброса / undelivered messages from the previous run go first; unsaved ones go after the flush
+        with self._lock:
+            fresh = {record['id'] for record in self._fresh}
+            self._flushed = []
+        for record_id in sorted(self._pending):
+            if record_id not in fresh:
+                self._queue.put_nowait(self._pending[record_id])
+        return [asyncio.create_task(self._worker(bot)) for _ in range(OUTBOX_WORKERS)]
+    
+    async def _worker(self, bot):
+        while True:
+            record = await self._queue.get()
+            try:
+                await self._deliver(bot, record)
+            except Exception:
+                logging.exception("Outbox worker failed on notification %s", record['id'])
+    
+    def _requeue(self, record, delay):
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, record)
+    
+    def _retry_later(self, record, delay):
+        record['not_before'] = time.time() + delay
+        with self._lock:
+            self._changed.add(record['id'])
+        self._requeue(record, delay)
+    
+    def _done(self, record):
+        with self._lock:
+            self._pending.pop(record['id'], None)
+            self._changed.discard(record['id'])
+            self._removed.add(record['id'])
+    
+    async def _deliver(self, bot, record):
+        wait = record['not_before'] - time.time()
+        if wait > 0:
+            self._requeue(record, wait)
+            return
+        
+        #не чаще одного сообщения в OUTBOX_CHAT_INTERVAL на чат / at most one message per OUTBOX_CHAT_INTERVAL per chat
+        chat_id = record['chat_id']
+        now = time.monotonic()
+        ready_at = self._chat_ready_at.get(chat_id, 0)
+        if ready_at > now:
+            self._requeue(record, ready_at - now)
+            return
+        self._chat_ready_at[chat_id] = now + OUTBOX_CHAT_INTERVAL
+        if len(self._chat_ready_at) > 10000:
+            self._chat_ready_at = {chat: at for chat, at in self._chat_ready_at.items() if at > now}
+        
+        await self._limiter.acquire()
+        try:
+            await bot.send_message(chat_id=chat_id, text=record['text'], parse_mode=record['parse_mode'])
+        except RetryAfter as error:
+            #Telegram сам говорит, сколько ждать / Telegram tells how long to wait
+            self._retry_later(record, error.retry_after)
+            return
+        except (Forbidden, BadRequest) as error:
+            #бот заблокирован или сообщение некорректно, повтор не поможет / the bot is blocked or the message is invalid, retrying won't help
+            logging.warning("Notification %s to %s dropped: %s", record['id'], chat_id, error)
+        except Exception as error:
+            record['attempts'] += 1
+            if record['attempts'] < OUTBOX_MAX_ATTEMPTS:
+                delay = min(OUTBOX_RETRY_BASE * 2 ** (record['attempts'] - 1), OUTBOX_RETRY_MAX)
+                logging.warning("Notification %s to %s failed (%s), retry in %ss", record['id'], chat_id, error, delay)
+                self._retry_later(record, delay)
+                return
+            logging.error("Notification %s to %s dropped after %s attempts: %s", record['id'], chat_id, record['attempts'], error)
+        self._done(record)
+
+outbox = Outbox()
+
+def notify(chat_id, text, parse_mode='Markdown'):
+    outbox.send(chat_id, text, parse_mode)
+
+def notify_many(messages, parse_mode='Markdown'):
+    outbox.send_many(messages, parse_mode)
+
+#сессии (состояние FSM и кеши из context.user_data) переживают перезапуск / sessions (FSM state and caches from context.user_data) survive a restart
+class SessionStore:
+    EMPTY = "{}"
+    
+    def __init__(self):
+        #user_id -> последний сохраненный вид сессии, заодно отметка "уже загружена" / user_id -> the last persisted form of the session, also marks it as loaded
+        self._saved = {}
+        self._changed = {}
+        self._removed = set()
+        self._lock = threading.Lock()
+    
+    def reset(self):
+        with self._lock:
+            self._saved = {}
+            self._changed = {}
+            self._removed = set()
+    
+    @staticmethod
+    def encode(user_data):
+        #кешированные объекты хранятся ссылками и перечитываются при загрузке / cached objects are stored as references and re-read on load
+        session = {}
+        for key, value in user_data.items():
+            if isinstance(value, User):
+                session[key] = {'user': value.user_id}
+            elif isinstance(value, Request):
+                session[key] = {'request': [value.kind, value.request_id]}
+            elif isinstance(value, (set, frozenset)):
+                session[key] = {'set': sorted(value)}
+            else:
+                session[key] = {'value': value}
+        return json.dumps(session, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    
+    @staticmethod
+    def decode(data):
+        user_data = {}
+        for key, item in json.loads(data).items():
+            if 'user' in item:
+                value = get_user_from_json(item['user'])
+            elif 'request' in item:
+                value = get_request(*item['request'])
+            elif 'set' in item:
+                value = set(item['set'])
+            else:
+                value = item['value']
+            #пользователь или заявка могли исчезнуть / the user or the request may be gone
+            if value is not None:
+                user_data[key] = value
+        return user_data
+    
+    def restore(self, user_id, user_data):
+        #из хранилища читается одна сессия и только при первом обновлении пользователя / a single session is read from storage, only on the user's first update
+        if user_id in self._saved:
+            return
+        data = storage.load_session(user_id)
+        self._saved[user_id] = data or self.EMPTY
+        if data:
+            try:
+                user_data.update(self.decode(data))
+            except (ValueError, TypeError, KeyError):
+                logging.warning("Session of user %s is unreadable, starting over", user_id)
+    
+    def track(self, user_id, user_data):
+        try:
+            data = self.encode(user_data)
+        except TypeError:
+            logging.warning("Session of user %s has values that can't be saved", user_id)
+            return
+        #сравнение строк дешевле записи, в хранилище идут только изменившиеся / comparing strings is cheaper than writing, only changed sessions reach storage
+        if data == self._saved.get(user_id):
+            return
+        with self._lock:
+            self._saved[user_id] = data
+            if data == self.EMPTY:
+                self._changed.pop(user_id, None)
+                self._removed.add(user_id)
+            else:
+                self._changed[user_id] = data
+                self._removed.discard(user_id)
+    
+    def flush(self):
+        with self._lock:
+            if not self._changed and not self._removed:
+                return
+            changed, removed = self._changed, self._removed
+            self._changed, self._removed = {}, set()
+        try:
+            storage.save_sessions(changed, removed)
+        except Exception:
+            with self._lock:
+                #более новые изменения не затираются / newer changes are not overwritten
+                for user_id, data in changed.items():
+                    if user_id not in self._changed and user_id not in self._removed:
+                        self._changed[user_id] = data
+                for user_id in removed:
+                    if user_id not in self._changed:
+                        self._removed.add(user_id)
+            raise
+    
+    def pending_count(self):
+        return len(self._changed) + len(self._removed)
+
+session_store = SessionStore()
+
+#запись трафика без персональных данных: псевдонимы вместо id, форма текста вместо текста / traffic recording without personal data: pseudonyms instead of ids, the text shape instead of the text
+class TrafficRecorder:
+    #параметры маршрутов, в которых лежат id пользователей / route parameters that carry user ids
+    USER_ID_PARAMS = frozenset(('user_id_to_manage', 'after', 'before'))
+    
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self._lock = threading.Lock()
+        self._handle = None
+        self._buffer = []
+        self._started = None
+        #псевдонимы живут в памяти одного запуска и в журнал не попадают / pseudonyms live in memory for one run and never reach the log
+        self._pseudonyms = {}
+        self._introduced = set()
+        self._params = {}
+    
+    @property
+    def enabled(self):
+        return bool(self.log_file)
+    
+    @staticmethod
+    def text_shape(text):
+        #буквы -> x, цифры -> 5: длина и формат сохраняются, содержимое нет / letters -> x, digits -> 5: length and format survive, the content doesn't
+        return "".join("5" if ch.isdigit() else "x" if ch.isalpha() else ch for ch in text)
+    
+    def _pseudonym(self, user_id):
+        pseudonym = self._pseudonyms.get(user_id)
+        if pseudonym is None:
+            pseudonym = self._pseudonyms[user_id] = len(self._pseudonyms) + 1
+        return pseudonym
+    
+    def _role(self, user_id):
+        if is_admin(user_id):
+            return 'a'
+        if is_staff(user_id):
+            return 's'
+        return 'u' if get_user_from_json(user_id) else 'n'
+    
+    def _callback(self, data, entry):
+        resolved = callback_router.resolve(data)
+        if resolved is None:
+            #неизвестные data не пишутся: в них может быть что угодно / unknown data isn't written: it may hold anything
+            entry['d'] = None
+            return
+        route, args = resolved
+        names = self._params.get(route.pattern)
+        if names is None:
+            names = self._params[route.pattern] = re.findall(r"\{(\w+)", route.pattern)
+        entry['d'] = route.pattern
+        if args:
+            entry['a'] = [
+                self._pseudonym(arg) if name in self.USER_ID_PARAMS else arg
+                for name, arg in zip(names, args)
+            ]
+    
+    def record(self, update, context):
+        user = update.effective_user
+        now = time.monotonic()
+        with self._lock:
+            if self._started is None:
+                #каждый запуск начинается с заголовка, время и псевдонимы отсчитываются от него / every run starts with a header, time and pseudonyms count from it
+                self._started = now
+                self._buffer.append({'run': int(time.time())})
+            pseudonym = self._pseudonym(user.id)
+            entry = {'t': int((now - self._started) * 1000), 'u': pseudonym}
+            if pseudonym not in self._introduced:
+                self._introduced.add(pseudonym)
+                entry['r'] = self._role(user.id)
+            #состояние до обработки, переходы видны по соседним записям пользователя / the state before handling, transitions show up in the user's neighbouring records
+            entry['s'] = context.user_data.get('state', START)
+            message = update.message
+            if update.callback_query is not None:
+                entry['k'] = 'cb'
+                self._callback(update.callback_query.data or "", entry)
+            elif message is not None and message.photo:
+                entry['k'] = 'photo'
+            elif message is not None and message.text is not None and message.text.startswith("/"):
+                entry['k'] = 'cmd'
+                entry['x'] = message.text.split()[0]
+            elif message is not None and message.text is not None:
+                entry['k'] = 'text'
+                entry['x'] = self.text_shape(message.text)
+            else:
+                entry['k'] = 'other'
+            self._buffer.append(entry)
+    
+    def flush(self):
+        with self._lock:
+            if not self._buffer:
+                return
+            entries, self._buffer = self._buffer, []
+            if self._handle is None:
+                end_torn_line(self.log_file)
+                self._handle = open(self.log_file, 'a', encoding='utf-8')
+            self._handle.write("".join(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n" for entry in entries))
+            self._handle.flush()
+    
+    def close(self):
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+traffic_recorder = TrafficRecorder(TRAFFIC_LOG_FILE)
+
+#сессия подгружается до обработчиков (группа -1) и отмечается после них (группа 1) / the session is loaded before the handlers (group -1) and marked after them (group 1)
+async def load_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user:
+        session_store.restore(update.effective_user.id, context.user_data)
+        #запись идет после загрузки сессии, чтобы видеть состояние автомата / recording goes after the session load to see the FSM state
+        if traffic_recorder.enabled:
+            traffic_recorder.record(update, context)
+
+async def save_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user:
+        session_store.track(update.effective_user.id, context.user_data)
+
+
+#каталог переводов: locales/<язык>.json, шаблоны разбираются один раз при запуске / translation catalog: locales/<language>.json, templates are parsed once at startup
+class Template:
+    __slots__ = ('text', 'parts', 'fields')
+    
+    CONVERSIONS = {'r': repr, 's': str, 'a': ascii}
+    
+    def __init__(self, text):
+        self.text = text
+        self.parts = tuple(string.Formatter().parse(text))
+        self.fields = frozenset(field for _, field, _, _ in self.parts if field is not None)
+        for _, field, _, conversion in self.parts:
+            if field is not None and (not field.isidentifier() or conversion not in (None, *self.CONVERSIONS)):
+                raise ValueError(f"Unsupported placeholder {{{field}}} in {text!r}")
+    
+    def render(self, values):
+        if not self.fields:
+            return self.text
+        out = []
+        for literal, field, spec, conversion in self.parts:
+            out.append(literal)
+            if field is not None:
+                value = values[field]
+                if conversion:
+                    value = self.CONVERSIONS[conversion](value)
+                out.append(format(value, spec))
+        return ''.join(out)
+
+class Catalog:
+    def __init__(self, directory=LOCALES_DIR, default_language=DEFAULT_LANGUAGE):
+        self.directory = directory
+        self.default_language = default_language
+        self.languages = ()
+        self._templates = {}
+    
+    def load(self):
+        #новый язык — новый файл в каталоге, без изменений в коде / a new language is a new file in the directory, no code changes
+        catalogs = {}
+        for file_name in sorted(os.listdir(self.directory)):
+            language, extension = os.path.splitext(file_name)
+            if extension == ".json":
+                with open(os.path.join(self.directory, file_name), 'r', encoding='utf-8') as f:
+                    catalogs[language] = {key: Template(text) for key, text in json.load(f).items()}
+        if self.default_language not in catalogs:
+            raise ValueError(f"No catalog for the default language {self.default_language} in {self.directory}")
+        
+        #все языки обязаны иметь те же ключи и подстановки, что и основной / every language must have the same keys and placeholders as the default one
+        reference = catalogs[self.default_language]
+        for language, templates in catalogs.items():
+            missing = reference.keys() - templates.keys()
+            extra = templates.keys() - reference.keys()
+            if missing or extra:
+                raise ValueError(f"Catalog {language}: missing keys {sorted(missing)}, unknown keys {sorted(extra)}")
+            for key, template in templates.items():
+                if template.fields != reference[key].fields:
+                    raise ValueError(f"Catalog {language}: placeholders of {key} differ from {self.default_language}")
+        
+        #плоская таблица: одна выборка по (язык, ключ) / a flat table: one lookup by (language, key)
+        self._templates = {
+            (language, key): template
+            for language, templates in catalogs.items()
+            for key, template in templates.items()
+        }
+        self.languages = (self.default_language, *sorted(catalogs.keys() - {self.default_language}))
+    
+    def render(self, language, key, values):
+        return self._templates[language, key].render(values)
+
+i18n = Catalog()
+i18n.load()
+
+def tr(language, key, **values):
+    return i18n.render(language, key, values)
+
+#клавиатуры / keyboards
+#разметка в python-telegram-bot неизменяема, поэтому один объект можно отдавать всем / markup in python-telegram-bot is immutable, so one object can be shared by everyone
+KEYBOARD_LANGUAGES = i18n.languages
+
+def prebuilt_keyboard(*variants):
+    #все варианты меню строятся один раз при запуске / every menu variant is built once at startup
+    def wrap(builder):
+        table = {args: builder(*args) for args in variants}
+        signature = inspect.signature(builder)
+        arity = len(signature.parameters)
+        
+        @functools.wraps(builder)
+        def get(*args, **kwargs):
+            if kwargs or len(args) != arity:
+                #именованные и недостающие аргументы приводятся к полному позиционному ключу / keyword and missing arguments are turned into the full positional key
+                try:
+                    bound = signature.bind(*args, **kwargs)
+                except TypeError as error:
+                    raise TypeError(f"{builder.__name__}: {error}") from None
+                bound.apply_defaults()
+                args = bound.args
+            keyboard = table.get(args)
+            return keyboard if keyboard is not None else builder(*args)
+        return get
+    return wrap
+
+#клавиатуры с id заявки — в ограниченном LRU / keyboards with a request id go into a bounded LRU
+keyboard_lru = functools.lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+
+@prebuilt_keyboard(*[(language,) for language in KEYBOARD_LANGUAGES])
+def get_start_keyboard(language='ru'):
+    keyboard = [
+        [InlineKeyboardButton(tr(language, 'btn_register'), callback_data="register")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+@prebuilt_keyboard(*[
+    (target_state, language)
+    for target_state in ("start", "personal_cabinet", "admin_user_detail", "admin_menu")
+    for language in KEYBOARD_LANGUAGES
+])
+def get_back_keyboard(target_state, language='ru'):
+    keyboard = [
+        [InlineKeyboardButton(tr(language, 'btn_back'), callback_data=f"back_to_{target_state}")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def get_personal_cabinet_keyboard(user: User):
+    return _personal_cabinet_keyboard(user.language, user.verified)
+
+@prebuilt_keyboard(*[(language, verified) for language in KEYBOARD_LANGUAGES for verified in (False, True)])
+def _personal_cabinet_keyboard(language, verified):
+    keyboard = [
+        [
+            InlineKeyboardButton(tr(language, 'btn_deposit'), callback_data="deposit"),
+            InlineKeyboardButton(tr(language, 'btn_withdraw'), callback_data="withdraw")
+        ],
+        [InlineKeyboardButton(tr(language, 'btn_refresh'), callback_data="refresh_profile")]
+    ]
+    
+    if not verified:
+        keyboard.append([InlineKeyboardButton(tr(language, 'btn_verify'), callback_data="verify")])
+    
+    keyboard.append([InlineKeyboardButton(tr(language, 'btn_change_language'), callback_data="change_language")])
+    
+    return InlineKeyboardMarkup(keyboard)
+
+@prebuilt_keyboard(())
+def get_language_keyboard():
+    #кнопка на каждый язык из каталога / a button for every language in the catalog
+    keyboard = [
+        [
+            InlineKeyboardButton(tr(language, 'language_name'), callback_data=f"set_language_{language}")
+            for language in i18n.languages
+        ],
+        [InlineKeyboardButton(tr(DEFAULT_LANGUAGE, 'btn_back'), callback_data="back_to_personal_cabinet")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+@prebuilt_keyboard(*[(admin, language) for admin in (True, False) for language in KEYBOARD_LANGUAGES])
+def get_admin_menu_keyboard(is_admin=True, language='ru'):
+    keyboard = [
+        [InlineKeyboardButton(tr(language, 'btn_admin_users'), callback_data="admin_users")],
+        [InlineKeyboardButton(tr(language, 'btn_admin_withdrawals'), callback_data="admin_withdrawals")],
+        [InlineKeyboardButton(tr(language, 'btn_admin_deposits'), callback_data="admin_deposits")],
+        [InlineKeyboardButton(tr(language, 'btn_admin_verifications'), callback_data="admin_verifications")],
+        [InlineKeyboardButton(tr(language, 'btn_admin_approved'), callback_data="admin_approved_requests")],
+        [InlineKeyboardButton(tr(language, 'btn_admin_rejected'), callback_data="admin_rejected_requests")],
+    ]
+    
+    if is_admin:
+        keyboard.append([InlineKeyboardButton(tr(language, 'btn_add_staff'), callback_data="admin_add_staff")])
+    
+    return InlineKeyboardMarkup(keyboard)
+
+@prebuilt_keyboard(*[(language,) for language in KEYBOARD_LANGUAGES])
+def get_admin_user_management_keyboard(language='ru'):
+    keyboard = [
+        [InlineKeyboardButton(tr(language, 'btn_change_name'), callback_data="admin_change_name")],
+        [InlineKeyboardButton(tr(language, 'btn_change_passport'), callback_data="admin_change_passport")],  # ДОБАВЛЕНА НОВАЯ КНОПКА
+        [InlineKeyboardButton(tr(language, 'btn_add_balance'), callback_data="admin_add_balance")],
+        [InlineKeyboardButton(tr(language, 'btn_reduce_balance'), callback_data="admin_reduce_balance")],
+        [InlineKeyboardButton(tr(language, 'btn_toggle_verification'), callback_data="admin_toggle_verification")],
+        [InlineKeyboardButton(tr(language, 'btn_back'), callback_data="admin_back_to_users")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+@keyboard_lru
+def get_withdrawal_management_keyboard(request_id, language='ru'):
+    keyboard = [
+        [
+            InlineKeyboardButton(tr(language, 'btn_approve_request'), callback_data=f"approve_withdrawal_{request_id}"),
+            InlineKeyboardButton(tr(language, 'btn_reject_request'), callback_data=f"reject_withdrawal_{request_id}")
+        ],
+        [InlineKeyboardButton(tr(language, 'btn_contact_user'), callback_data=f"contact_user_{request_id}")],
+        [InlineKeyboardButton(tr(language, 'btn_back'), callback_data="admin_back_to_withdrawals")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+@keyboard_lru
+def get_deposit_management_keyboard(request_id, language='ru'):
+    keyboard = [
+        [
+            InlineKeyboardButton(tr(language, 'btn_approve_request'), callback_data=f"approve_deposit_{request_id}"),
+            InlineKeyboardButton(tr(language, 'btn_reject_request'), callback_data=f"reject_deposit_{request_id}")
+        ],
+        [InlineKeyboardButton(tr(language, 'btn_contact_user'), callback_data=f"contact_user_{request_id}")],
+        [InlineKeyboardButton(tr(language, 'btn_back'), callback_data="admin_back_to_deposits")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+@keyboard_lru
+def get_verification_management_keyboard(request_id, language='ru'):
+    keyboard = [
+        [
+            InlineKeyboardButton(tr(language, 'btn_approve_request'), callback_data=f"approve_verification_{request_id}"),
+            InlineKeyboardButton(tr(language, 'btn_reject_request'), callback_data=f"reject_verification_{request_id}")
+        ],
+        [InlineKeyboardButton(tr(language, 'btn_contact_user'), callback_data=f"contact_user_{request_id}")],
+        [InlineKeyboardButton(tr(language, 'btn_back'), callback_data="admin_back_to_verifications")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+@prebuilt_keyboard(*[(language,) for language in KEYBOARD_LANGUAGES])
+def get_approved_requests_keyboard(language='ru'):
+    keyboard = [
+        [InlineKeyboardButton(tr(language, 'btn_withdrawals'), callback_data="admin_approved_withdrawals")],
+        [InlineKeyboardButton(tr(language, 'btn_deposits'), callback_data="admin_approved_deposits")],
+        [InlineKeyboardButton(tr(language, 'btn_back'), callback_data="admin_back_to_menu")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+@prebuilt_keyboard(*[(language,) for language in KEYBOARD_LANGUAGES])
+def get_rejected_requests_keyboard(language='ru'):
+    keyboard = [
+        [InlineKeyboardButton(tr(language, 'btn_withdrawals'), callback_data="admin_rejected_withdrawals")],
+        [InlineKeyboardButton(tr(language, 'btn_deposits'), callback_data="admin_rejected_deposits")],
+        [InlineKeyboardButton(tr(language, 'btn_back'), callback_data="admin_back_to_menu")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+#список пользователей постранично, курсор хранится в callback_data / paginated user list, the cursor lives in callback_data
+async def show_admin_users(update: Update, context: ContextTypes.DEFAULT_TYPE, after=None, before=None):
+    query = update.callback_query
+    context.user_data['state'] = ADMIN_USERS
+    users, has_prev, has_next = get_users_page(after=after, before=before, limit=ADMIN_USERS_PAGE_SIZE)
+    
+    keyboard = []
+    for user in users:
+        keyboard.append([InlineKeyboardButton(f"👤 {user.full_name}", callback_data=f"admin_user_{user.user_id}")])
+    
+    navigation = []
+    if users and has_prev:
+        navigation.append(InlineKeyboardButton("◀️ Пред.", callback_data=f"admin_users_prev_{users[0].user_id}"))
+    if users and has_next:
+        navigation.append(InlineKeyboardButton("След. ▶️", callback_data=f"admin_users_next_{users[-1].user_id}"))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_back_to_menu")])
     
     await query.edit_message_text(
-        "❌ *Отклоненные заявки на вывод*\n\n📋 *Ниже представлен список всех отклоненных заявок на вывод:*",
+        "👥 *Управление пользователями*\n\n📋 *Выберите пользователя из списка или введите id пользователя:*",
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
     )
 
-async def show_admin_rejected_deposits(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    context.user_data['state'] = ADMIN_REJECTED_DEPOSITS
-    requests = get_deposit_requests("rejected")
+#вспомогательные функции для обновления списков заявок / auxiliary functions for updating application lists
+#общий экран списка заявок: все имена для экрана одним обращением к хранилищу / shared request list screen: all names for the screen in one storage round trip
+async def show_request_list(update: Update, kind, status, icon, callback_prefix, title, empty_text, back_data, bulk_rows=()):
+    requests = get_requests(kind, status)
+    users = get_users_from_json({req.user_id for req in requests})
     
     keyboard = []
     for i, req in enumerate(requests):
-        user = get_user_from_json(req.user_id)
+        user = users.get(req.user_id)
         if user:
-            keyboard.append([InlineKeyboardButton(f"❌ Заявка {i+1} от {user.full_name}", callback_data=f"admin_rejected_deposit_{req.request_id}")])
+            keyboard.append([InlineKeyboardButton(f"{icon} Заявка {i+1} от {user.full_name}", callback_data=f"{callback_prefix}{req.request_id}")])
     
-    if not keyboard:
-        keyboard.append([InlineKeyboardButton("📭 Нет отклоненных заявок", callback_data="no_actions")])
-        
-    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_back_to_rejected")])
+    if keyboard:
+        keyboard.extend(bulk_rows)
+    else:
+        keyboard.append([InlineKeyboardButton(empty_text, callback_data="no_actions")])
+    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data=back_data)])
     
-    await query.edit_message_text(
-        "❌ *Отклоненные заявки на пополнение*\n\n📋 *Ниже представлен список всех отклоненных заявок на пополнение:*",
+    await update.callback_query.edit_message_text(
+        title,
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
     )
 
+async def show_admin_withdrawals(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data['state'] = ADMIN_WITHDRAWAL_DETAIL
+    await show_request_list(
+        update, 'withdrawal', "pending", "💸", "admin_withdrawal_",
+        "💸 *Заявки на вывод*\n\n📋 *Ниже представлен список всех заявок на вывод:*",
+        "📭 Нет заявок", "admin_back_to_menu",
+        [[
+            InlineKeyboardButton("☑️ Выбрать несколько", callback_data="bulk_select_withdrawal"),
+            InlineKeyboardButton("⚡ Одобрить до суммы", callback_data="bulk_limit_withdrawal")
+        ]]
+    )
+
+async def show_admin_deposits(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data['state'] = ADMIN_DEPOSITS
+    await show_request_list(
+        update, 'deposit', "pending", "💰", "admin_deposit_",
+        "💰 *Заявки на пополнение*\n\n📋 *Ниже представлен список всех заявок на пополнение:*",
+        "📭 Нет заявок", "admin_back_to_menu",
+        [[
+            InlineKeyboardButton("☑️ Выбрать несколько", callback_data="bulk_select_deposit"),
+            InlineKeyboardButton("⚡ Одобрить до суммы", callback_data="bulk_limit_deposit")
+        ]]
+    )
+
+async def show_admin_verifications(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data['state'] = ADMIN_VERIFICATIONS
+    await show_request_list(
+        update, 'verification', "pending", "🛡️", "admin_verification_",
+        "🛡️ *Заявки на верификацию*\n\n📋 *Ниже представлен список всех заявок на верификацию:*",
+        "📭 Нет заявок", "admin_back_to_menu",
+        [[InlineKeyboardButton("☑️ Выбрать несколько", callback_data="bulk_select_verification")]]
+    )
+
+async def show_admin_approved_withdrawals(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data['state'] = ADMIN_APPROVED_WITHDRAWALS
+    await show_request_list(
+        update, 'withdrawal', "approved", "✅", "admin_approved_withdrawal_",
+        "✅ *Одобренные заявки на вывод*\n\n📋 *Ниже представлен список всех одобренных заявок на вывод:*",
+        "📭 Нет одобренных заявок", "admin_back_to_approved"
+    )
+
+async def show_admin_approved_deposits(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data['state'] = ADMIN_APPROVED_DEPOSITS
+    await show_request_list(
+        update, 'deposit', "approved", "✅", "admin_approved_deposit_",
+        "✅ *Одобренные заявки на пополнение*\n\n📋 *Ниже представлен список всех одобренных заявок на пополнение:*",
+        "📭 Нет одобренных заявок", "admin_back_to_approved"
+    )
+
+async def show_admin_rejected_withdrawals(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data['state'] = ADMIN_REJECTED_WITHDRAWALS
+    await show_request_list(
+        update, 'withdrawal', "rejected", "❌", "admin_rejected_withdrawal_",
+        "❌ *Отклоненные заявки на вывод*\n\n📋 *Ниже представлен список всех отклоненных заявок на вывод:*",
+        "📭 Нет отклоненных заявок", "admin_back_to_rejected"
+    )
+
+async def show_admin_rejected_deposits(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data['state'] = ADMIN_REJECTED_DEPOSITS
+    await show_request_list(
+        update, 'deposit', "rejected", "❌", "admin_rejected_deposit_",
+        "❌ *Отклоненные заявки на пополнение*\n\n📋 *Ниже представлен список всех отклоненных заявок на пополнение:*",
+        "📭 Нет отклоненных заявок", "admin_back_to_rejected"
+    )
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -656,8 +2546,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data['state'] = ADMIN_MENU
         user = get_user_from_json(user_id)
         language = user.language if user else 'ru'
-        message = "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:" if language == 'ru' else "👨‍💼 *Welcome to Management Menu*\n\nChoose the action you want to perform:"
-        await update.message.reply_text(message, reply_markup=get_admin_menu_keyboard(user_id in ADMIN_IDS, language), parse_mode='Markdown')
+        message = tr(language, 'admin_menu')
+        await update.message.reply_text(message, reply_markup=get_admin_menu_keyboard(is_admin(user_id), language), parse_mode='Markdown')
     else:
         user = get_user_from_json(user_id)
         if user and user.full_name and user.passport:
@@ -669,8 +2559,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             #новый юзер / new user
             context.user_data['state'] = START
             language = user.language if user else 'ru'
-            texts = TEXTS[language]
-            message = texts['start'].format(BOT_NAME=BOT_NAME)
+            message = tr(language, 'start', BOT_NAME=BOT_NAME)
             await update.message.reply_text(message, reply_markup=get_start_keyboard(language), parse_mode='Markdown')
 
 async def show_personal_cabinet(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -688,14 +2577,12 @@ async def show_personal_cabinet(update: Update, context: ContextTypes.DEFAULT_TY
         context.user_data['user'] = user
     
     language = user.language
-    texts = TEXTS[language]
-    verification_status = '✅ Verified' if user.verified else '❌ Not Verified'
-    if language == 'ru':
-        verification_status = '✅ Верифицирован' if user.verified else '❌ Не верифицирован'
+    verification_status = tr(language, 'status_verified' if user.verified else 'status_not_verified')
     
-    message = texts['personal_cabinet'].format(
+    message = tr(
+        language, 'personal_cabinet',
         full_name=user.full_name,
-        passport=user.passport or 'Не указан',
+        passport=user.passport or tr(language, 'passport_not_set'),
         balance=user.balance,
         on_hold=user.on_hold,
         verification_status=verification_status,
@@ -716,159 +2603,320 @@ async def show_personal_cabinet(update: Update, context: ContextTypes.DEFAULT_TY
         )
 
 #callback запросы / callback requets 
-async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
+#маршрут callback: шаблон вида "approve_deposit_{request_id:int}" / a callback route: a pattern like "approve_deposit_{request_id:int}"
+class CallbackRoute:
+    __slots__ = ('pattern', 'prefix', 'converters', 'handler', 'access')
     
-    data = query.data
-    user_id = query.from_user.id
-    user = get_user_from_json(user_id)
-    language = user.language if user else 'ru'
+    CONVERTERS = {'int': int, 'str': str}
     
-    if data == "register":
-        context.user_data['state'] = REGISTRATION_NAME
-        texts = TEXTS[language]
-        await query.edit_message_text(
-            texts['registration_name'],
-            reply_markup=get_back_keyboard("start", language),
-            parse_mode='Markdown'
+    def __init__(self, pattern, handler, access=None):
+        self.pattern = pattern
+        self.handler = handler
+        #None — всем, 'staff' — сотрудникам, 'admin' — только админам / None is everyone, 'staff' is staff members, 'admin' is admins only
+        self.access = access
+        self.prefix = pattern.partition("{")[0]
+        if "{" in pattern and not self.prefix.endswith("_"):
+            raise ValueError(f"Route prefix must end with '_': {pattern}")
+        self.converters = tuple(
+            self.CONVERTERS[kind or 'str'] for _, kind in re.findall(r"\{(\w+)(?::(\w+))?\}", pattern)
         )
     
-    elif data == "back_to_start":
-        context.user_data['state'] = START
-        texts = TEXTS[language]
-        message = texts['start'].format(BOT_NAME=BOT_NAME)
-        await query.edit_message_text(message, reply_markup=get_start_keyboard(language), parse_mode='Markdown')
-    
-    elif data == "back_to_personal_cabinet":
-        context.user_data['state'] = PERSONAL_CABINET
-        await show_personal_cabinet(update, context)
+    def decode(self, parts):
+        #аргументы идут через "_" после префикса / arguments follow the prefix separated by "_"
+        if len(parts) != len(self.converters):
+            raise ValueError(parts)
+        return [convert(part) for convert, part in zip(self.converters, parts)]
+
+#таблица маршрутов: точные совпадения в dict, параметризованные в префиксном дереве по частям между "_" / route table: exact matches in a dict, parameterized routes in a prefix trie over the "_"-separated parts
+class CallbackRouter:
+    def __init__(self):
+        self.routes = []
+        self._exact = {}
+        self._trie = {}
     
-    elif data == "back_to_admin_user_detail":
-        context.user_data['state'] = ADMIN_USER_DETAIL
-        managed_user = context.user_data.get('managed_user')
-        if managed_user:
-            verification_status = '✅ Верифицирован' if managed_user.verified else '❌ Не верифицирован'
-            
-            message = (
-                f"👤 *Личный кабинет пользователя:*\n\n"
-                f"📝 *ФИО:* {managed_user.full_name}\n"
-                f"📋 *Паспорт:* {managed_user.passport or 'Не указан'}\n"
-                f"💰 *Баланс:* {managed_user.balance} ₽\n"
-                f"⏳ *На выводе:* {managed_user.on_hold} ₽\n"
-                f"🛡️ *Верификация:* {verification_status}\n"
-                f"🆔 *ID:* {managed_user.user_id}"
-            )
-            
-            await query.edit_message_text(
-                message, 
-                reply_markup=get_admin_user_management_keyboard(),
-                parse_mode='Markdown'
-            )
+    def route(self, pattern, access=None):
+        def register(handler):
+            route = CallbackRoute(pattern, handler, access)
+            if route.converters:
+                node = self._trie
+                for part in route.prefix[:-1].split("_"):
+                    node = node.setdefault(part, {})
+                node[None] = route
+            else:
+                self._exact[pattern] = route
+            self.routes.append(route)
+            return handler
+        return register
     
-    elif data == "deposit":
-        context.user_data['state'] = DEPOSIT
-        texts = TEXTS[language]
-        message = texts['deposit']
-        await query.edit_message_text(
-            message, 
-            reply_markup=get_back_keyboard("personal_cabinet", language),
-            parse_mode='Markdown'
+    def resolve(self, data):
+        #стоимость зависит от длины data, а не от числа маршрутов / the cost depends on the length of data, not on the number of routes
+        route = self._exact.get(data)
+        if route is not None:
+            return route, ()
+        parts = data.split("_")
+        node = self._trie
+        match = None
+        for position, part in enumerate(parts):
+            node = node.get(part)
+            if node is None:
+                break
+            if None in node:
+                match = position + 1, node[None]
+        if match is None:
+            return None
+        #самый длинный префикс: admin_users_next_ раньше admin_users_ / the longest prefix wins: admin_users_next_ before admin_users_
+        length, route = match
+        try:
+            return route, route.decode(parts[length:])
+        except ValueError:
+            return None
+
+callback_router = CallbackRouter()
+
+@callback_router.route("register")
+async def callback_register(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = REGISTRATION_NAME
+    await query.edit_message_text(
+        tr(language, 'registration_name'),
+        reply_markup=get_back_keyboard("start", language),
+        parse_mode='Markdown'
+    )
+
+@callback_router.route("back_to_start")
+async def callback_back_to_start(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = START
+    message = tr(language, 'start', BOT_NAME=BOT_NAME)
+    await query.edit_message_text(message, reply_markup=get_start_keyboard(language), parse_mode='Markdown')
+
+@callback_router.route("back_to_personal_cabinet")
+async def callback_back_to_personal_cabinet(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    context.user_data['state'] = PERSONAL_CABINET
+    await show_personal_cabinet(update, context)
+
+@callback_router.route("back_to_admin_user_detail", access='staff')
+@callback_router.route("admin_back_to_user_detail", access='staff')
+async def callback_back_to_admin_user_detail(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = ADMIN_USER_DETAIL
+    managed_user = context.user_data.get('managed_user')
+    if managed_user:
+        verification_status = '✅ Верифицирован' if managed_user.verified else '❌ Не верифицирован'
+        
+        message = (
+            f"👤 *Личный кабинет пользователя:*\n\n"
+            f"📝 *ФИО:* {managed_user.full_name}\n"
+            f"📋 *Паспорт:* {managed_user.passport or 'Не указан'}\n"
+            f"💰 *Баланс:* {managed_user.balance} ₽\n"
+            f"⏳ *На выводе:* {managed_user.on_hold} ₽\n"
+            f"🛡️ *Верификация:* {verification_status}\n"
+            f"🆔 *ID:* {managed_user.user_id}"
         )
-    
-    elif data == "withdraw":
-        user_obj = context.user_data.get('user', get_user_from_json(user_id))
-        context.user_data['state'] = WITHDRAWAL
-        texts = TEXTS[language]
-        message = texts['withdraw'].format(balance=user_obj.balance)
+        
         await query.edit_message_text(
             message, 
-            reply_markup=get_back_keyboard("personal_cabinet", language),
+            reply_markup=get_admin_user_management_keyboard(),
             parse_mode='Markdown'
         )
+
+@callback_router.route("deposit")
+async def callback_deposit(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = DEPOSIT
+    message = tr(language, 'deposit')
+    await query.edit_message_text(
+        message, 
+        reply_markup=get_back_keyboard("personal_cabinet", language),
+        parse_mode='Markdown'
+    )
+
+@callback_router.route("withdraw")
+async def callback_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    user_id = query.from_user.id
+    user_obj = context.user_data.get('user', get_user_from_json(user_id))
+    context.user_data['state'] = WITHDRAWAL
+    message = tr(language, 'withdraw', balance=user_obj.balance)
+    await query.edit_message_text(
+        message, 
+        reply_markup=get_back_keyboard("personal_cabinet", language),
+        parse_mode='Markdown'
+    )
+
+@callback_router.route("verify")
+async def callback_verify(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = VERIFICATION
+    message = tr(language, 'verify')
+    await query.edit_message_text(
+        message, 
+        reply_markup=get_back_keyboard("personal_cabinet", language),
+        parse_mode='Markdown'
+    )
+
+@callback_router.route("change_language")
+async def callback_change_language(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = CHANGE_LANGUAGE
+    await query.edit_message_text(
+        tr(language, 'change_language'),
+        reply_markup=get_language_keyboard(),
+        parse_mode='Markdown'
+    )
+
+@callback_router.route("refresh_profile")
+async def callback_refresh_profile(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    user_id = query.from_user.id
+    #обновление профиля / update profile
+    user = get_user_from_json(user_id)
+    if user:
+        context.user_data['user'] = user
+        
+        #сообщение об успешном обновлении / message about succeful update
+        await query.answer(tr(user.language, 'profile_updated'), show_alert=False)
+        
+        #обновление данных в личном кабинете / updating data in your profile
+        await show_personal_cabinet(update, context)
+
+@callback_router.route("set_language_{new_language:str}")
+async def callback_set_language(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, new_language):
+    query = update.callback_query
+    user_id = query.from_user.id
+    #только языки, для которых есть каталог / only languages that have a catalog
+    if new_language not in i18n.languages:
+        return
+    user = get_user_from_json(user_id)
+    if user:
+        user.language = new_language
+        save_user_to_json(user)
+        context.user_data['user'] = user
     
-    elif data == "verify":
-        context.user_data['state'] = VERIFICATION
-        texts = TEXTS[language]
-        message = texts['verify']
-        await query.edit_message_text(
-            message, 
-            reply_markup=get_back_keyboard("personal_cabinet", language),
-            parse_mode='Markdown'
-        )
+    await query.edit_message_text(
+        tr(new_language, 'language_changed'),
+        parse_mode='Markdown'
+    )
+    context.user_data['state'] = PERSONAL_CABINET
+    await show_personal_cabinet(update, context)
+
+@callback_router.route("no_actions")
+async def callback_no_actions(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    await query.answer("Нет доступных действий", show_alert=True)
+
+#админ обработчики / admin handlers
+@callback_router.route("admin_users", access='staff')
+@callback_router.route("admin_back_to_users", access='staff')
+async def callback_admin_users(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    await show_admin_users(update, context)
+
+@callback_router.route("admin_users_next_{after:int}", access='staff')
+async def callback_admin_users_next(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, after):
+    await show_admin_users(update, context, after=after)
+
+@callback_router.route("admin_users_prev_{before:int}", access='staff')
+async def callback_admin_users_prev(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, before):
+    await show_admin_users(update, context, before=before)
+
+@callback_router.route("admin_user_{user_id_to_manage:int}", access='staff')
+async def callback_admin_user(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, user_id_to_manage):
+    query = update.callback_query
+    user_to_manage = get_user_from_json(user_id_to_manage)
+    context.user_data['managed_user'] = user_to_manage
+    context.user_data['state'] = ADMIN_USER_DETAIL
     
-    elif data == "change_language":
-        context.user_data['state'] = CHANGE_LANGUAGE
-        texts = TEXTS[language]
-        await query.edit_message_text(
-            texts['change_language'],
-            reply_markup=get_language_keyboard(),
-            parse_mode='Markdown'
-        )
+    verification_status = '✅ Верифицирован' if user_to_manage.verified else '❌ Не верифицирован'
     
-    elif data == "refresh_profile":
-        #обновление профиля / update profile
-        user = get_user_from_json(user_id)
-        if user:
-            context.user_data['user'] = user
-            texts = TEXTS[user.language]
-            
-            #сообщение об успешном обновлении / message about succeful update
-            await query.answer(texts['profile_updated'], show_alert=False)
-            
-            #обновление данных в личном кабинете / updating data in your profile
-            await show_personal_cabinet(update, context)
+    message = (
+        f"👤 *Личный кабинет пользователя:*\n\n"
+        f"📝 *ФИО:* {user_to_manage.full_name}\n"
+        f"📋 *Паспорт:* {user_to_manage.passport or 'Не указан'}\n"
+        f"💰 *Баланс:* {user_to_manage.balance} ₽\n"
+        f"⏳ *На выводе:* {user_to_manage.on_hold} ₽\n"
+        f"🛡️ *Верификация:* {verification_status}\n"
+        f"🆔 *ID:* {user_to_manage.user_id}"
+    )
     
-    elif data.startswith("set_language_"):
-        new_language = data.split("_")[2]  #ru или en / ru or en language
-        user = get_user_from_json(user_id)
-        if user:
-            user.language = new_language
-            save_user_to_json(user)
-            context.user_data['user'] = user
-        
-        texts = TEXTS[new_language]
+    await query.edit_message_text(
+        message, 
+        reply_markup=get_admin_user_management_keyboard(),
+        parse_mode='Markdown'
+    )
+
+@callback_router.route("admin_change_name", access='staff')
+async def callback_admin_change_name(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = ADMIN_CHANGE_NAME
+    await query.edit_message_text(
+        "✏️ *Смена ФИО пользователя*\n\n📝 *Напишите ниже новое ФИО для пользователя:*",
+        reply_markup=get_back_keyboard("admin_user_detail"),
+        parse_mode='Markdown'
+    )
+
+@callback_router.route("admin_change_passport", access='staff')
+async def callback_admin_change_passport(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = ADMIN_CHANGE_PASSPORT
+    await query.edit_message_text(
+        "📋 *Смена паспортных данных пользователя*\n\n📝 *Напишите ниже новые паспортные данные для пользователя:*\n\n*Пример:* `1234 567890`",
+        reply_markup=get_back_keyboard("admin_user_detail"),
+        parse_mode='Markdown'
+    )
+
+@callback_router.route("admin_add_balance", access='staff')
+async def callback_admin_add_balance(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = ADMIN_ADD_BALANCE
+    managed_user = context.user_data.get('managed_user')
+    if managed_user:
         await query.edit_message_text(
-            texts['language_changed'],
+            tr(language, 'add_balance', balance=managed_user.balance),
+            reply_markup=get_back_keyboard("admin_user_detail", language),
             parse_mode='Markdown'
         )
-        context.user_data['state'] = PERSONAL_CABINET
-        await show_personal_cabinet(update, context)
-    
-    elif data == "no_actions":
-        await query.answer("Нет доступных действий", show_alert=True)
-    
-    #админ обработчики / admin handlers
-    elif data == "admin_users":
-        context.user_data['state'] = ADMIN_USERS
-        users = get_all_users()
-        keyboard = []
-        for user in users:
-            keyboard.append([InlineKeyboardButton(f"👤 {user.full_name}", callback_data=f"admin_user_{user.user_id}")])
-        keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_back_to_menu")])
-        
+
+@callback_router.route("admin_reduce_balance", access='staff')
+async def callback_admin_reduce_balance(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = ADMIN_REDUCE_BALANCE
+    managed_user = context.user_data.get('managed_user')
+    if managed_user:
         await query.edit_message_text(
-            "👥 *Управление пользователями*\n\n📋 *Выберите пользователя из списка или введите id пользователя:*",
-            reply_markup=InlineKeyboardMarkup(keyboard),
+            tr(language, 'reduce_balance', balance=managed_user.balance),
+            reply_markup=get_back_keyboard("admin_user_detail", language),
             parse_mode='Markdown'
         )
-    
-    elif data.startswith("admin_user_"):
-        user_id_to_manage = int(data.split("_")[2])
-        user_to_manage = get_user_from_json(user_id_to_manage)
-        context.user_data['managed_user'] = user_to_manage
-        context.user_data['state'] = ADMIN_USER_DETAIL
+
+@callback_router.route("admin_toggle_verification", access='staff')
+async def callback_admin_toggle_verification(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    managed_user = context.user_data.get('managed_user')
+    if managed_user:
+        #смена статуса верификации на противоположный / changing the verification status to the opposite
+        managed_user.verified = not managed_user.verified
+        save_user_to_json(managed_user)
         
-        verification_status = '✅ Верифицирован' if user_to_manage.verified else '❌ Не верифицирован'
+        #определение нового статуса для сообщения / defining a new status for a message
+        new_status = '✅ Верифицирован' if managed_user.verified else '❌ Не верифицирован'
+        
+        #уведомление юзеру о смене статуса / notification to the user about the status change
+        user_language = managed_user.language
+        notification_text = tr(
+            user_language, 'verification_status_notice',
+            status=tr(user_language, 'status_verified' if managed_user.verified else 'status_not_verified')
+        )
+        notify(managed_user.user_id, notification_text)
         
+        #показ обновленных данных пользователя / showing updated user data
         message = (
             f"👤 *Личный кабинет пользователя:*\n\n"
-            f"📝 *ФИО:* {user_to_manage.full_name}\n"
-            f"📋 *Паспорт:* {user_to_manage.passport or 'Не указан'}\n"
-            f"💰 *Баланс:* {user_to_manage.balance} ₽\n"
-            f"⏳ *На выводе:* {user_to_manage.on_hold} ₽\n"
-            f"🛡️ *Верификация:* {verification_status}\n"
-            f"🆔 *ID:* {user_to_manage.user_id}"
+            f"📝 *ФИО:* {managed_user.full_name}\n"
+            f"📋 *Паспорт:* {managed_user.passport or 'Не указан'}\n"
+            f"💰 *Баланс:* {managed_user.balance} ₽\n"
+            f"⏳ *На выводе:* {managed_user.on_hold} ₽\n"
+            f"🛡️ *Верификация:* {new_status}\n"
+            f"🆔 *ID:* {managed_user.user_id}"
         )
         
         await query.edit_message_text(
@@ -876,654 +2924,702 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_admin_user_management_keyboard(),
             parse_mode='Markdown'
         )
+
+@callback_router.route("admin_withdrawals", access='staff')
+@callback_router.route("admin_back_to_withdrawals", access='staff')
+async def callback_admin_withdrawals(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    await show_admin_withdrawals(update, context)
+
+@callback_router.route("admin_withdrawal_{request_id:int}", access='staff')
+async def callback_admin_withdrawal(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, request_id):
+    query = update.callback_query
+    request = get_request('withdrawal', request_id)
     
-    elif data == "admin_change_name":
-        context.user_data['state'] = ADMIN_CHANGE_NAME
-        await query.edit_message_text(
-            "✏️ *Смена ФИО пользователя*\n\n📝 *Напишите ниже новое ФИО для пользователя:*",
-            reply_markup=get_back_keyboard("admin_user_detail"),
-            parse_mode='Markdown'
-        )
-    
-    elif data == "admin_change_passport":  
-        context.user_data['state'] = ADMIN_CHANGE_PASSPORT
-        await query.edit_message_text(
-            "📋 *Смена паспортных данных пользователя*\n\n📝 *Напишите ниже новые паспортные данные для пользователя:*\n\n*Пример:* `1234 567890`",
-            reply_markup=get_back_keyboard("admin_user_detail"),
-            parse_mode='Markdown'
+    if request:
+        user = get_user_from_json(request.user_id)
+        context.user_data['current_withdrawal_request'] = request
+        context.user_data['state'] = ADMIN_WITHDRAWAL_DETAIL
+        
+        message = (
+            f"💸 *Заявка на вывод*\n\n"
+            f"👤 *От:* {user.full_name if user else 'Неизвестный пользователь'}\n"
+            f"💰 *Сумма вывода:* {request.amount} ₽\n"
+            f"📋 *Реквизиты:* {request.details}"
         )
-    
-    elif data == "admin_add_balance":
-        context.user_data['state'] = ADMIN_ADD_BALANCE
-        managed_user = context.user_data.get('managed_user')
-        if managed_user:
-            texts = TEXTS[language]
-            await query.edit_message_text(
-                texts['add_balance'].format(balance=managed_user.balance),
-                reply_markup=get_back_keyboard("admin_user_detail", language),
-                parse_mode='Markdown'
-            )
-    
-    elif data == "admin_reduce_balance":
-        context.user_data['state'] = ADMIN_REDUCE_BALANCE
-        managed_user = context.user_data.get('managed_user')
-        if managed_user:
-            texts = TEXTS[language]
-            await query.edit_message_text(
-                texts['reduce_balance'].format(balance=managed_user.balance),
-                reply_markup=get_back_keyboard("admin_user_detail", language),
-                parse_mode='Markdown'
-            )
-    
-    elif data == "admin_toggle_verification":
-        managed_user = context.user_data.get('managed_user')
-        if managed_user:
-            #смена статуса верификации на противоположный / changing the verification status to the opposite
-            managed_user.verified = not managed_user.verified
-            save_user_to_json(managed_user)
-            
-            #определение нового статуса для сообщения / defining a new status for a message
-            new_status = '✅ Верифицирован' if managed_user.verified else '❌ Не верифицирован'
-            
-            #уведомление юзеру о смене статуса / notification to the user about the status change
-            try:
-                user_language = managed_user.language
-                if user_language == 'ru':
-                    notification_text = f"🛡️ *Ваш статус верификации изменен!*\n\n*Новый статус:* {new_status}"
-                else:
-                    notification_text = f"🛡️ *Your verification status has been changed!*\n\n*New status:* {'✅ Verified' if managed_user.verified else '❌ Not Verified'}"
-                
-                await context.bot.send_message(
-                    chat_id=managed_user.user_id,
-                    text=notification_text,
-                    parse_mode='Markdown'
-                )
-            except:
-                pass
-            
-            #показ обновленных данных пользователя / showing updated user data
-            message = (
-                f"👤 *Личный кабинет пользователя:*\n\n"
-                f"📝 *ФИО:* {managed_user.full_name}\n"
-                f"📋 *Паспорт:* {managed_user.passport or 'Не указан'}\n"
-                f"💰 *Баланс:* {managed_user.balance} ₽\n"
-                f"⏳ *На выводе:* {managed_user.on_hold} ₽\n"
-                f"🛡️ *Верификация:* {new_status}\n"
-                f"🆔 *ID:* {managed_user.user_id}"
-            )
-            
-            await query.edit_message_text(
-                message, 
-                reply_markup=get_admin_user_management_keyboard(),
-                parse_mode='Markdown'
-            )
-    
-    elif data == "admin_back_to_users":
-        context.user_data['state'] = ADMIN_USERS
-        users = get_all_users()
-        keyboard = []
-        for user in users:
-            keyboard.append([InlineKeyboardButton(f"👤 {user.full_name}", callback_data=f"admin_user_{user.user_id}")])
-        keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_back_to_menu")])
         
         await query.edit_message_text(
-            "👥 *Управление пользователями*\n\n📋 *Выберите пользователя из списка или введите id пользователя:*",
-            reply_markup=InlineKeyboardMarkup(keyboard),
+            message, 
+            reply_markup=get_withdrawal_management_keyboard(request_id),
             parse_mode='Markdown'
         )
+
+@callback_router.route("approve_withdrawal_{request_id:int}", access='staff')
+async def callback_approve_withdrawal(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, request_id):
+    query = update.callback_query
+    user_id = query.from_user.id
+    request = context.user_data.get('current_withdrawal_request')
     
-    elif data == "admin_back_to_user_detail":
-        context.user_data['state'] = ADMIN_USER_DETAIL
-        managed_user = context.user_data.get('managed_user')
-        if managed_user:
-            verification_status = '✅ Верифицирован' if managed_user.verified else '❌ Не верифицирован'
-            
-            message = (
-                f"👤 *Личный кабинет пользователя:*\n\n"
-                f"📝 *ФИО:* {managed_user.full_name}\n"
-                f"📋 *Паспорт:* {managed_user.passport or 'Не указан'}\n"
-                f"💰 *Баланс:* {managed_user.balance} ₽\n"
-                f"⏳ *На выводе:* {managed_user.on_hold} ₽\n"
-                f"🛡️ *Верификация:* {verification_status}\n"
-                f"🆔 *ID:* {managed_user.user_id}"
-            )
-            
-            await query.edit_message_text(
-                message, 
-                reply_markup=get_admin_user_management_keyboard(),
-                parse_mode='Markdown'
-            )
-    
-    elif data == "admin_withdrawals":
-        await show_admin_withdrawals(update, context)
-    
-    elif data.startswith("admin_withdrawal_"):
-        request_id = int(data.split("_")[2])
-        requests = get_withdrawal_requests()
-        request = next((r for r in requests if r.request_id == request_id), None)
+    if request and request.request_id == request_id:
+        #заявку мог уже обработать другой сотрудник / another staff member may have processed the request already
+        if not await decide_request(request, 'approve'):
+            return
         
-        if request:
-            user = get_user_from_json(request.user_id)
-            context.user_data['current_withdrawal_request'] = request
-            context.user_data['state'] = ADMIN_WITHDRAWAL_DETAIL
-            
-            message = (
-                f"💸 *Заявка на вывод*\n\n"
-                f"👤 *От:* {user.full_name if user else 'Неизвестный пользователь'}\n"
-                f"💰 *Сумма вывода:* {request.amount} ₽\n"
-                f"📋 *Реквизиты:* {request.details}"
-            )
-            
-            await query.edit_message_text(
-                message, 
-                reply_markup=get_withdrawal_management_keyboard(request_id),
-                parse_mode='Markdown'
-            )
+        #удаление заявки из context.user_data / removing an application from context.user_data
+        if 'current_withdrawal_request' in context.user_data:
+            del context.user_data['current_withdrawal_request']
+        
+
+        #возврат в меню управления / return to the control menu
+        context.user_data['state'] = ADMIN_MENU
+        await query.message.reply_text(
+            "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
+            reply_markup=get_admin_menu_keyboard(is_admin(user_id)),
+            parse_mode='Markdown'
+        )
+
+@callback_router.route("reject_withdrawal_{request_id:int}", access='staff')
+async def callback_reject_withdrawal(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, request_id):
+    query = update.callback_query
+    user_id = query.from_user.id
+    request = context.user_data.get('current_withdrawal_request')
     
-    elif data.startswith("approve_withdrawal_"):
-        request_id = int(data.split("_")[2])
-        request = context.user_data.get('current_withdrawal_request')
+    if request and request.request_id == request_id:
+        if not await decide_request(request, 'reject'):
+            return
+        
+        #удаление заявки из context.user_data / removing an application from context.user_data
+        if 'current_withdrawal_request' in context.user_data:
+            del context.user_data['current_withdrawal_request']
         
-        if request and request.request_id == request_id:
-            user = get_user_from_json(request.user_id)
-            if user:
 
-                user.on_hold -= request.amount
-                save_user_to_json(user)
-            
+        context.user_data['state'] = ADMIN_MENU
+        await query.message.reply_text(
+            "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
+            reply_markup=get_admin_menu_keyboard(is_admin(user_id)),
+            parse_mode='Markdown'
+        )
 
-            requests = get_withdrawal_requests()
-            for req in requests:
-                if req.request_id == request_id:
-                    req.status = "approved"
-                    break
-            
+@callback_router.route("admin_deposits", access='staff')
+@callback_router.route("admin_back_to_deposits", access='staff')
+async def callback_admin_deposits(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    await show_admin_deposits(update, context)
 
-            with open(JSON_WITHDRAWALS_FILE, 'w', encoding='utf-8') as f:
-                json.dump([r.to_dict() for r in requests], f, ensure_ascii=False, indent=2)
-            
-            #удаление заявки из context.user_data / removing an application from context.user_data
-            if 'current_withdrawal_request' in context.user_data:
-                del context.user_data['current_withdrawal_request']
-            
+@callback_router.route("admin_deposit_{request_id:int}", access='staff')
+async def callback_admin_deposit(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, request_id):
+    query = update.callback_query
+    request = get_request('deposit', request_id)
+    
+    if request:
+        user = get_user_from_json(request.user_id)
+        context.user_data['current_deposit_request'] = request
+        context.user_data['state'] = ADMIN_DEPOSIT_DETAIL
+        
+        message = (
+            f"💰 *Заявка на пополнение*\n\n"
+            f"👤 *От:* {user.full_name if user else 'Неизвестный пользователь'}\n"
+            f"💳 *Сумма пополнения:* {request.amount} ₽"
+        )
+        
+        await query.edit_message_text(
+            message, 
+            reply_markup=get_deposit_management_keyboard(request_id),
+            parse_mode='Markdown'
+        )
 
-            try:
-                await context.bot.send_message(
-                    chat_id=request.user_id,
-                    text=f"✅ *Ваша заявка на вывод {request.amount} ₽ одобрена!*",
-                    parse_mode='Markdown'
-                )
-            except:
-                pass
-            
-            #возврат в меню управления / return to the control menu
-            context.user_data['state'] = ADMIN_MENU
-            await query.message.reply_text(
-                "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
-                reply_markup=get_admin_menu_keyboard(user_id in ADMIN_IDS),
-                parse_mode='Markdown'
-            )
+@callback_router.route("approve_deposit_{request_id:int}", access='staff')
+async def callback_approve_deposit(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, request_id):
+    query = update.callback_query
+    user_id = query.from_user.id
+    request = context.user_data.get('current_deposit_request')
     
-    elif data.startswith("reject_withdrawal_"):
-        request_id = int(data.split("_")[2])
-        request = context.user_data.get('current_withdrawal_request')
+    if request and request.request_id == request_id:
+        if not await decide_request(request, 'approve'):
+            return
         
-        if request and request.request_id == request_id:
-            user = get_user_from_json(request.user_id)
-            if user:
-                user.on_hold -= request.amount
-                user.balance += request.amount  #возврат денег на баланс / refund of money to the balance
-                save_user_to_json(user)
-            
 
-            requests = get_withdrawal_requests()
-            for req in requests:
-                if req.request_id == request_id:
-                    req.status = "rejected"
-                    break
-            
+        if 'current_deposit_request' in context.user_data:
+            del context.user_data['current_deposit_request']
+        
 
-            with open(JSON_WITHDRAWALS_FILE, 'w', encoding='utf-8') as f:
-                json.dump([r.to_dict() for r in requests], f, ensure_ascii=False, indent=2)
-            
-            #удаление заявки из context.user_data / removing an application from context.user_data
-            if 'current_withdrawal_request' in context.user_data:
-                del context.user_data['current_withdrawal_request']
-            
-            #уведомление юзеру / notification to the user
-            try:
-                await context.bot.send_message(
-                    chat_id=request.user_id,
-                    text=f"❌ *Ваша заявка на вывод {request.amount} ₽ отклонена.*\n\n💰 *Средства возвращены на баланс.*",
-                    parse_mode='Markdown'
-                )
-            except:
-                pass
-            
+        context.user_data['state'] = ADMIN_MENU
+        await query.message.reply_text(
+            "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
+            reply_markup=get_admin_menu_keyboard(is_admin(user_id)),
+            parse_mode='Markdown'
+        )
 
-            context.user_data['state'] = ADMIN_MENU
-            await query.message.reply_text(
-                "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
-                reply_markup=get_admin_menu_keyboard(user_id in ADMIN_IDS),
-                parse_mode='Markdown'
-            )
-    
-    elif data == "admin_deposits":
-        await show_admin_deposits(update, context)
+@callback_router.route("reject_deposit_{request_id:int}", access='staff')
+async def callback_reject_deposit(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, request_id):
+    query = update.callback_query
+    user_id = query.from_user.id
+    request = context.user_data.get('current_deposit_request')
     
-    elif data.startswith("admin_deposit_"):
-        request_id = int(data.split("_")[2])
-        requests = get_deposit_requests()
-        request = next((r for r in requests if r.request_id == request_id), None)
+    if request and request.request_id == request_id:
+        #устаревший экран не должен отклонить уже зачисленное пополнение / a stale screen must not reject a deposit that was already credited
+        if not await decide_request(request, 'reject'):
+            return
         
-        if request:
-            user = get_user_from_json(request.user_id)
-            context.user_data['current_deposit_request'] = request
-            context.user_data['state'] = ADMIN_DEPOSIT_DETAIL
-            
-            message = (
-                f"💰 *Заявка на пополнение*\n\n"
-                f"👤 *От:* {user.full_name if user else 'Неизвестный пользователь'}\n"
-                f"💳 *Сумма пополнения:* {request.amount} ₽"
-            )
-            
-            await query.edit_message_text(
-                message, 
-                reply_markup=get_deposit_management_keyboard(request_id),
-                parse_mode='Markdown'
-            )
-    
-    elif data.startswith("approve_deposit_"):
-        request_id = int(data.split("_")[2])
-        request = context.user_data.get('current_deposit_request')
+
+        if 'current_deposit_request' in context.user_data:
+            del context.user_data['current_deposit_request']
         
-        if request and request.request_id == request_id:
-            user = get_user_from_json(request.user_id)
-            if user:
-                user.balance += request.amount
-                save_user_to_json(user)
-            
 
-            requests = get_deposit_requests()
-            for req in requests:
-                if req.request_id == request_id:
-                    req.status = "approved"
-                    break
-            
+        context.user_data['state'] = ADMIN_MENU
+        await query.message.reply_text(
+            "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
+            reply_markup=get_admin_menu_keyboard(is_admin(user_id)),
+            parse_mode='Markdown'
+        )
 
-            with open(JSON_DEPOSITS_FILE, 'w', encoding='utf-8') as f:
-                json.dump([r.to_dict() for r in requests], f, ensure_ascii=False, indent=2)
-            
+@callback_router.route("admin_verifications", access='staff')
+@callback_router.route("admin_back_to_verifications", access='staff')
+async def callback_admin_verifications(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    await show_admin_verifications(update, context)
 
-            if 'current_deposit_request' in context.user_data:
-                del context.user_data['current_deposit_request']
-            
+@callback_router.route("admin_verification_{request_id:int}", access='staff')
+async def callback_admin_verification(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, request_id):
+    query = update.callback_query
+    request = get_request('verification', request_id)
+    
+    if request:
+        user = get_user_from_json(request.user_id)
+        context.user_data['current_verification_request'] = request
+        context.user_data['state'] = ADMIN_VERIFICATION_DETAIL
+        
+        message = (
+            f"🛡️ *Заявка на верификацию*\n\n"
+            f"👤 *От:* {user.full_name if user else 'Неизвестный пользователь'}\n"
+            f"📷 *Фото паспорта:*"
+        )
+        
+        #удаление исходного сообщение и отправка нового с фото / deleting the original message and sending a new one with a photo
+        await query.delete_message()
+        
+        #отправка фото с текстом и клавиатурой / sending photos with text and keyboard
+        await context.bot.send_photo(
+            chat_id=query.message.chat_id,
+            photo=request.photo_file_id,
+            caption=message,
+            reply_markup=get_verification_management_keyboard(request_id),
+            parse_mode='Markdown'
+        )
 
-            try:
-                await context.bot.send_message(
-                    chat_id=request.user_id,
-                    text=f"✅ *Ваша заявка на пополнение {request.amount} ₽ одобрена!*\n\n💰 *Баланс пополнен.*",
-                    parse_mode='Markdown'
-                )
-            except:
-                pass
-            
+@callback_router.route("approve_verification_{request_id:int}", access='staff')
+async def callback_approve_verification(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, request_id):
+    query = update.callback_query
+    user_id = query.from_user.id
+    request = context.user_data.get('current_verification_request')
+    
+    if request and request.request_id == request_id:
+        #решенная верификация удаляется, второй сотрудник ее уже не найдет / a decided verification is deleted, a second staff member won't find it
+        if not await decide_request(request, 'approve'):
+            return
+        
 
-            context.user_data['state'] = ADMIN_MENU
-            await query.message.reply_text(
-                "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
-                reply_markup=get_admin_menu_keyboard(user_id in ADMIN_IDS),
-                parse_mode='Markdown'
-            )
+        if 'current_verification_request' in context.user_data:
+            del context.user_data['current_verification_request']
+        
+
+        context.user_data['state'] = ADMIN_MENU
+        await context.bot.send_message(
+            chat_id=query.message.chat_id,
+            text="👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
+            reply_markup=get_admin_menu_keyboard(is_admin(user_id)),
+            parse_mode='Markdown'
+        )
+
+@callback_router.route("reject_verification_{request_id:int}", access='staff')
+async def callback_reject_verification(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, request_id):
+    query = update.callback_query
+    user_id = query.from_user.id
+    request = context.user_data.get('current_verification_request')
     
-    elif data.startswith("reject_deposit_"):
-        request_id = int(data.split("_")[2])
-        request = context.user_data.get('current_deposit_request')
+    if request and request.request_id == request_id:
+        if not await decide_request(request, 'reject'):
+            return
         
-        if request and request.request_id == request_id:
 
-            requests = get_deposit_requests()
-            for req in requests:
-                if req.request_id == request_id:
-                    req.status = "rejected"
-                    break
-            
+        if 'current_verification_request' in context.user_data:
+            del context.user_data['current_verification_request']
+        
 
-            with open(JSON_DEPOSITS_FILE, 'w', encoding='utf-8') as f:
-                json.dump([r.to_dict() for r in requests], f, ensure_ascii=False, indent=2)
-            
+        context.user_data['state'] = ADMIN_MENU
+        await context.bot.send_message(
+            chat_id=query.message.chat_id,
+            text="👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
+            reply_markup=get_admin_menu_keyboard(is_admin(user_id)),
+            parse_mode='Markdown'
+        )
 
-            if 'current_deposit_request' in context.user_data:
-                del context.user_data['current_deposit_request']
-            
+#пакетная обработка: сотрудник отмечает заявки и решает по всем сразу / bulk processing: staff mark requests and decide on all of them at once
+BULK_TITLES = {
+    'withdrawal': "💸 *Пакетная обработка заявок на вывод*",
+    'deposit': "💰 *Пакетная обработка заявок на пополнение*",
+    'verification': "🛡️ *Пакетная обработка заявок на верификацию*",
+}
 
-            try:
-                await context.bot.send_message(
-                    chat_id=request.user_id,
-                    text=f"❌ *Ваша заявка на пополнение {request.amount} ₽ отклонена.*",
-                    parse_mode='Markdown'
-                )
-            except:
-                pass
-            
+def get_bulk_back_keyboard(kind):
+    return InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data=f"admin_back_to_{kind}s")]])
 
-            context.user_data['state'] = ADMIN_MENU
-            await query.message.reply_text(
-                "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
-                reply_markup=get_admin_menu_keyboard(user_id in ADMIN_IDS),
-                parse_mode='Markdown'
-            )
+def bulk_selection(context, kind):
+    #отметки относятся к одному типу заявок / the marks belong to one request kind
+    if context.user_data.get('bulk_kind') != kind:
+        return None
+    return context.user_data.setdefault('bulk_selected', set())
+
+async def show_bulk_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    kind = context.user_data['bulk_kind']
+    selected = context.user_data['bulk_selected']
+    context.user_data['state'] = ADMIN_BULK_SELECT
+    requests = get_requests(kind, "pending")
+    #отметки могли устареть, пока другой сотрудник разбирал очередь / marks may be stale if another staff member worked the queue
+    selected.intersection_update(req.request_id for req in requests)
+    shown = requests[:BULK_PAGE_SIZE]
+    users = get_users_from_json({req.user_id for req in shown})
     
-    elif data == "admin_verifications":
-        await show_admin_verifications(update, context)
+    keyboard = []
+    for req in shown:
+        user = users.get(req.user_id)
+        mark = "☑️" if req.request_id in selected else "⬜"
+        amount = f" — {req.amount} ₽" if kind != 'verification' else ""
+        keyboard.append([InlineKeyboardButton(
+            f"{mark} {user.full_name if user else req.user_id}{amount}",
+            callback_data=f"bulk_toggle_{kind}_{req.request_id}"
+        )])
     
-    elif data.startswith("admin_verification_"):
-        request_id = int(data.split("_")[2])
-        requests = get_verification_requests()
-        request = next((r for r in requests if r.request_id == request_id), None)
-        
-        if request:
-            user = get_user_from_json(request.user_id)
-            context.user_data['current_verification_request'] = request
-            context.user_data['state'] = ADMIN_VERIFICATION_DETAIL
-            
-            message = (
-                f"🛡️ *Заявка на верификацию*\n\n"
-                f"👤 *От:* {user.full_name if user else 'Неизвестный пользователь'}\n"
-                f"📷 *Фото паспорта:*"
-            )
-            
-            #удаление исходного сообщение и отправка нового с фото / deleting the original message and sending a new one with a photo
-            await query.delete_message()
-            
-            #отправка фото с текстом и клавиатурой / sending photos with text and keyboard
-            await context.bot.send_photo(
-                chat_id=query.message.chat_id,
-                photo=request.photo_file_id,
-                caption=message,
-                reply_markup=get_verification_management_keyboard(request_id),
-                parse_mode='Markdown'
-            )
+    if requests:
+        all_selected = len(selected) == len(requests)
+        keyboard.append([InlineKeyboardButton("⬜ Снять все" if all_selected else "☑️ Выбрать все", callback_data=f"bulk_all_{kind}")])
+    else:
+        keyboard.append([InlineKeyboardButton("📭 Нет заявок", callback_data="no_actions")])
+    if selected:
+        keyboard.append([
+            InlineKeyboardButton(f"✅ Одобрить ({len(selected)})", callback_data=f"bulk_approve_{kind}"),
+            InlineKeyboardButton(f"❌ Отклонить ({len(selected)})", callback_data=f"bulk_reject_{kind}")
+        ])
+    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data=f"admin_back_to_{kind}s")])
     
-    elif data.startswith("approve_verification_"):
-        request_id = int(data.split("_")[2])
-        request = context.user_data.get('current_verification_request')
-        
-        if request and request.request_id == request_id:
-            user = get_user_from_json(request.user_id)
-            if user:
-                user.verified = True
-                save_user_to_json(user)
-            
+    message = f"{BULK_TITLES[kind]}\n\n📋 *Выбрано:* {len(selected)} из {len(requests)}"
+    if kind != 'verification' and selected:
+        message += f"\n💰 *На сумму:* {sum(req.amount for req in requests if req.request_id in selected)} ₽"
+    if len(shown) < len(requests):
+        message += f"\n\n📄 *Показаны первые {len(shown)}*"
+    
+    if update.callback_query:
+        await update.callback_query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+    else:
+        await update.message.reply_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
 
-            delete_verification_request(request_id)
-            
+@callback_router.route("bulk_select_{kind:str}", access='staff')
+async def callback_bulk_select(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, kind):
+    if kind not in REQUEST_KINDS:
+        return
+    context.user_data['bulk_kind'] = kind
+    context.user_data['bulk_selected'] = set()
+    await show_bulk_selection(update, context)
 
-            if 'current_verification_request' in context.user_data:
-                del context.user_data['current_verification_request']
-            
+@callback_router.route("bulk_toggle_{kind:str}_{request_id:int}", access='staff')
+async def callback_bulk_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, kind, request_id):
+    selected = bulk_selection(context, kind)
+    if selected is None:
+        return
+    selected ^= {request_id}
+    await show_bulk_selection(update, context)
 
-            try:
-                await context.bot.send_message(
-                    chat_id=request.user_id,
-                    text="✅ *Ваша верификация одобрена!*\n\n🛡️ *Теперь вы верифицированный пользователь.*",
-                    parse_mode='Markdown'
-                )
-            except:
-                pass
-            
+@callback_router.route("bulk_all_{kind:str}", access='staff')
+async def callback_bulk_all(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, kind):
+    selected = bulk_selection(context, kind)
+    if selected is None:
+        return
+    pending_ids = {req.request_id for req in get_requests(kind, "pending")}
+    if selected >= pending_ids:
+        selected.clear()
+    else:
+        selected |= pending_ids
+    await show_bulk_selection(update, context)
 
-            context.user_data['state'] = ADMIN_MENU
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
-                reply_markup=get_admin_menu_keyboard(user_id in ADMIN_IDS),
-                parse_mode='Markdown'
-            )
+async def bulk_decide(update: Update, context: ContextTypes.DEFAULT_TYPE, kind, decision):
+    selected = bulk_selection(context, kind)
+    if not selected:
+        return
+    requested = len(selected)
+    processed, failed = await decide_requests(kind, sorted(selected), decision)
+    selected.clear()
     
-    elif data.startswith("reject_verification_"):
-        request_id = int(data.split("_")[2])
-        request = context.user_data.get('current_verification_request')
-        
-        if request and request.request_id == request_id:
+    message = f"✅ *Одобрено заявок:* {processed}" if decision == 'approve' else f"❌ *Отклонено заявок:* {processed}"
+    if processed + failed < requested:
+        message += f"\n\n⚠️ *Уже обработаны другим сотрудником:* {requested - processed - failed}"
+    if failed:
+        message += f"\n\n⚠️ *Не удалось обработать, остались в ожидании:* {failed}"
+    await update.callback_query.edit_message_text(message, reply_markup=get_bulk_back_keyboard(kind), parse_mode='Markdown')
 
-            delete_verification_request(request_id)
-            
+@callback_router.route("bulk_approve_{kind:str}", access='staff')
+async def callback_bulk_approve(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, kind):
+    await bulk_decide(update, context, kind, 'approve')
 
-            if 'current_verification_request' in context.user_data:
-                del context.user_data['current_verification_request']
-            
+@callback_router.route("bulk_reject_{kind:str}", access='staff')
+async def callback_bulk_reject(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, kind):
+    await bulk_decide(update, context, kind, 'reject')
 
-            try:
-                await context.bot.send_message(
-                    chat_id=request.user_id,
-                    text="❌ *Ваша заявка на верификацию отклонена.*\n\n🛡️ *Вы можете подать заявку повторно.*",
-                    parse_mode='Markdown'
-                )
-            except:
-                pass
-            
+@callback_router.route("bulk_limit_{kind:str}", access='staff')
+async def callback_bulk_limit(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language, kind):
+    #у верификаций нет суммы / verifications have no amount
+    if kind not in ('withdrawal', 'deposit'):
+        return
+    context.user_data['bulk_kind'] = kind
+    context.user_data['bulk_selected'] = set()
+    context.user_data['state'] = ADMIN_BULK_LIMIT
+    await update.callback_query.edit_message_text(
+        f"{BULK_TITLES[kind]}\n\n📝 *Введите сумму:* будут отмечены все ожидающие заявки верифицированных пользователей до этой суммы включительно",
+        reply_markup=get_bulk_back_keyboard(kind),
+        parse_mode='Markdown'
+    )
 
-            context.user_data['state'] = ADMIN_MENU
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
-                reply_markup=get_admin_menu_keyboard(user_id in ADMIN_IDS),
-                parse_mode='Markdown'
-            )
-    
-    elif data == "admin_add_staff":
-        context.user_data['state'] = ADMIN_ADD_STAFF
-        await query.edit_message_text(
-            "➕ *Добавление работника*\n\n📝 *Введите следующие данные работника:*\nФИО, id телеграмм (через запятую)\n\n*Пример:*\n`Иванов Иван Иванович, 123456789`",
-            reply_markup=get_back_keyboard("admin_menu"),
-            parse_mode='Markdown'
-        )
+@callback_router.route("admin_add_staff", access='admin')
+async def callback_admin_add_staff(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = ADMIN_ADD_STAFF
+    await query.edit_message_text(
+        "➕ *Добавление работника*\n\n📝 *Введите следующие данные работника:*\nФИО, id телеграмм (через запятую)\n\n*Пример:*\n`Иванов Иван Иванович, 123456789`",
+        reply_markup=get_back_keyboard("admin_menu"),
+        parse_mode='Markdown'
+    )
+
+#обработчики для одобренных и отклоненных заявок / handlers for approved and rejected applications
+@callback_router.route("admin_approved_requests", access='staff')
+@callback_router.route("admin_back_to_approved", access='staff')
+async def callback_admin_approved_requests(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = ADMIN_APPROVED_REQUESTS
+    await query.edit_message_text(
+        "✅ *Одобренные заявки*\n\n📋 *Выберите тип заявок для просмотра:*",
+        reply_markup=get_approved_requests_keyboard(language),
+        parse_mode='Markdown'
+    )
+
+@callback_router.route("admin_rejected_requests", access='staff')
+@callback_router.route("admin_back_to_rejected", access='staff')
+async def callback_admin_rejected_requests(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    context.user_data['state'] = ADMIN_REJECTED_REQUESTS
+    await query.edit_message_text(
+        "❌ *Отклоненные заявки*\n\n📋 *Выберите тип заявок для просмотра:*",
+        reply_markup=get_rejected_requests_keyboard(language),
+        parse_mode='Markdown'
+    )
+
+@callback_router.route("admin_approved_withdrawals", access='staff')
+async def callback_admin_approved_withdrawals(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    await show_admin_approved_withdrawals(update, context)
+
+@callback_router.route("admin_approved_deposits", access='staff')
+async def callback_admin_approved_deposits(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    await show_admin_approved_deposits(update, context)
+
+@callback_router.route("admin_rejected_withdrawals", access='staff')
+async def callback_admin_rejected_withdrawals(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    await show_admin_rejected_withdrawals(update, context)
+
+@callback_router.route("admin_rejected_deposits", access='staff')
+async def callback_admin_rejected_deposits(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    await show_admin_rejected_deposits(update, context)
+
+@callback_router.route("admin_back_to_menu", access='staff')
+async def callback_admin_back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, user, language):
+    query = update.callback_query
+    user_id = query.from_user.id
+    #чистка всех временных данных о заявках / cleaning of all temporary application data
+    for key in ['current_withdrawal_request', 'current_deposit_request', 'current_verification_request', 'managed_user']:
+        if key in context.user_data:
+            del context.user_data[key]
     
-    #обработчики для одобренных и отклоненных заявок / handlers for approved and rejected applications
-    elif data == "admin_approved_requests":
-        context.user_data['state'] = ADMIN_APPROVED_REQUESTS
-        await query.edit_message_text(
-            "✅ *Одобренные заявки*\n\n📋 *Выберите тип заявок для просмотра:*",
-            reply_markup=get_approved_requests_keyboard(language),
-            parse_mode='Markdown'
-        )
+    context.user_data['state'] = ADMIN_MENU
+    await query.edit_message_text(
+        "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
+        reply_markup=get_admin_menu_keyboard(is_admin(user_id)),
+        parse_mode='Markdown'
+    )
+
+async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
     
-    elif data == "admin_rejected_requests":
-        context.user_data['state'] = ADMIN_REJECTED_REQUESTS
-        await query.edit_message_text(
-            "❌ *Отклоненные заявки*\n\n📋 *Выберите тип заявок для просмотра:*",
-            reply_markup=get_rejected_requests_keyboard(language),
-            parse_mode='Markdown'
-        )
+    data = query.data
+    user_id = query.from_user.id
     
-    elif data == "admin_approved_withdrawals":
-        await show_admin_approved_withdrawals(update, context)
+    resolved = callback_router.resolve(data)
+    if resolved is None:
+        logging.debug("Unknown callback %s from user %s", data, user_id)
+        metrics.inc('bot_callbacks_rejected_total', (('reason', 'unknown'),))
+        return
+    route, args = resolved
     
-    elif data == "admin_approved_deposits":
-        await show_admin_approved_deposits(update, context)
+    #проверка прав до любых обращений к хранилищу / permission check before any storage access
+    if route.access == 'staff' and not is_staff(user_id):
+        logging.warning("User %s is not staff, callback %s ignored", user_id, data)
+        metrics.inc('bot_callbacks_rejected_total', (('reason', 'access'),))
+        return
+    if route.access == 'admin' and not is_admin(user_id):
+        logging.warning("User %s is not admin, callback %s ignored", user_id, data)
+        metrics.inc('bot_callbacks_rejected_total', (('reason', 'access'),))
+        return
     
-    elif data == "admin_rejected_withdrawals":
-        await show_admin_rejected_withdrawals(update, context)
+    #метка — шаблон маршрута, а не data, чтобы число рядов не росло с id / the label is the route pattern, not data, so the series count doesn't grow with ids
+    label_update_profile(route.pattern)
+    started = time.perf_counter()
+    try:
+        user = get_user_from_json(user_id)
+        language = user.language if user else 'ru'
+        await route.handler(update, context, user, language, *args)
+    finally:
+        metrics.observe('bot_callback_seconds', (('route', route.pattern),), time.perf_counter() - started)
+
+
+#обработчики текстовых сообщений по состоянию; needs — какие данные загрузить до вызова / text message handlers by state; needs is what data to load before the call
+class MessageStateTable:
+    NEEDS = frozenset(('user', 'managed_user'))
     
-    elif data == "admin_rejected_deposits":
-        await show_admin_rejected_deposits(update, context)
+    def __init__(self):
+        self.handlers = {}
     
-    elif data == "admin_back_to_approved":
-        context.user_data['state'] = ADMIN_APPROVED_REQUESTS
-        await query.edit_message_text(
-            "✅ *Одобренные заявки*\n\n📋 *Выберите тип заявок для просмотра:*",
-            reply_markup=get_approved_requests_keyboard(language),
-            parse_mode='Markdown'
-        )
+    def state(self, state, needs=()):
+        unknown = set(needs) - self.NEEDS
+        if unknown:
+            raise ValueError(f"Unknown needs for state {state}: {unknown}")
+        def register(handler):
+            #обработчики названы message_<состояние>, отсюда метка для метрик / handlers are named message_<state>, which gives the metrics label
+            labels = (('state', handler.__name__.removeprefix("message_").upper()),)
+            self.handlers[state] = handler, 'user' in needs, 'managed_user' in needs, labels
+            return handler
+        return register
     
-    elif data == "admin_back_to_rejected":
-        context.user_data['state'] = ADMIN_REJECTED_REQUESTS
-        await query.edit_message_text(
-            "❌ *Отклоненные заявки*\n\n📋 *Выберите тип заявок для просмотра:*",
-            reply_markup=get_rejected_requests_keyboard(language),
-            parse_mode='Markdown'
-        )
+    def get(self, state):
+        return self.handlers.get(state)
+
+message_states = MessageStateTable()
+
+@message_states.state(REGISTRATION_NAME)
+async def message_registration_name(update: Update, context: ContextTypes.DEFAULT_TYPE, text, user, language, managed_user):
+    #сохранение ФИО и запрос паспорта / saving your full name and requesting your passport
+    full_name = text
+    context.user_data['registration_full_name'] = full_name
+    context.user_data['state'] = REGISTRATION_PASSPORT
     
-    elif data == "admin_back_to_menu":
-        #чистка всех временных данных о заявках / cleaning of all temporary application data
-        for key in ['current_withdrawal_request', 'current_deposit_request', 'current_verification_request', 'managed_user']:
-            if key in context.user_data:
-                del context.user_data[key]
-        
-        context.user_data['state'] = ADMIN_MENU
-        await query.edit_message_text(
-            "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
-            reply_markup=get_admin_menu_keyboard(user_id in ADMIN_IDS),
-            parse_mode='Markdown'
-        )
+    await update.message.reply_text(
+        tr(language, 'registration_passport'),
+        reply_markup=get_back_keyboard("start", language),
+        parse_mode='Markdown'
+    )
+
+@message_states.state(REGISTRATION_PASSPORT)
+async def message_registration_passport(update: Update, context: ContextTypes.DEFAULT_TYPE, text, user, language, managed_user):
+    #завершение регистрации с паспортом / completing registration with a passport
+    user_id = update.effective_user.id
+    passport = text
+    full_name = context.user_data.get('registration_full_name')
     
-    elif data == "admin_back_to_withdrawals":
-        await show_admin_withdrawals(update, context)
+    user = User(user_id, full_name, passport, language=language)
+    save_user_to_json(user)
+    context.user_data['user'] = user
+    context.user_data['state'] = PERSONAL_CABINET
     
-    elif data == "admin_back_to_deposits":
-        await show_admin_deposits(update, context)
+    #чистка временных данных регистрации / cleaning temporary registration data
+    if 'registration_full_name' in context.user_data:
+        del context.user_data['registration_full_name']
     
-    elif data == "admin_back_to_verifications":
-        await show_admin_verifications(update, context)
+    success_text = tr(language, 'registration_completed')
+    await update.message.reply_text(success_text, parse_mode='Markdown')
+    await show_personal_cabinet(update, context)
+
+@message_states.state(DEPOSIT, needs=('user',))
+async def message_deposit(update: Update, context: ContextTypes.DEFAULT_TYPE, text, user, language, managed_user):
+    #обработка пополнения / deposit processing
+    user_id = update.effective_user.id
+    try:
+        amount = parse_amount(text)
+        
+        if amount <= 0:
+            error_text = tr(language, 'amount_must_be_positive')
+            await update.message.reply_text(error_text, parse_mode='Markdown')
+            return
+        
+        #заявка на пополнение / request for replenishment
+        request_id = next_request_id('deposit')
+        request = DepositRequest(request_id, user_id, amount)
+        save_request(request)
+        
+        success_text = tr(language, 'request_sent')
+        await update.message.reply_text(success_text, parse_mode='Markdown')
+        context.user_data['state'] = PERSONAL_CABINET
+        await show_personal_cabinet(update, context)
+        
+    except ValueError:
+        error_text = tr(language, 'invalid_amount_format')
+        await update.message.reply_text(error_text, parse_mode='Markdown')
 
+@message_states.state(WITHDRAWAL, needs=('user',))
+async def message_withdrawal(update: Update, context: ContextTypes.DEFAULT_TYPE, text, user, language, managed_user):
+    #обработка вывода / output processing
+    user_id = update.effective_user.id
+    try:
+        parts = text.split(',')
+        if len(parts) < 2:
+            error_text = tr(language, 'withdraw_details_required')
+            await update.message.reply_text(error_text, parse_mode='Markdown')
+            return
+        
+        details = parts[0].strip()
+        amount = parse_amount(parts[1])
+        
+        if amount <= 0:
+            error_text = tr(language, 'amount_must_be_positive')
+            await update.message.reply_text(error_text, parse_mode='Markdown')
+            return
+        
+        async with account_lock(user_id):
+            #баланс перечитывается под блокировкой счета / the balance is re-read under the account lock
+            user_obj = get_user_from_json(user_id)
+            sufficient = amount <= user_obj.balance
+            if sufficient:
+                #удержание и заявка уходят одним сбросом, фоновый сброс не запишет одно без другого / the hold and the request go out in one flush, the background flush can't write one without the other
+                async with storage_transaction():
+                    request_id = next_request_id('withdrawal')
+                    hold_withdrawal(user_obj, amount, ref=f"withdrawal:{request_id}")
+                    
+                    request = WithdrawalRequest(request_id, user_id, amount, details)
+                    save_request(request)
+        
+        if not sufficient:
+            error_text = tr(language, 'insufficient_funds')
+            await update.message.reply_text(error_text, parse_mode='Markdown')
+            return
+        
+        context.user_data['user'] = user_obj
+        success_text = tr(language, 'request_sent')
+        await update.message.reply_text(success_text, parse_mode='Markdown')
+        context.user_data['state'] = PERSONAL_CABINET
+        await show_personal_cabinet(update, context)
+        
+    except ValueError:
+        error_text = tr(language, 'invalid_withdraw_format')
+        await update.message.reply_text(error_text, parse_mode='Markdown')
 
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    state = context.user_data.get('state', START)
+@message_states.state(VERIFICATION, needs=('user',))
+async def message_verification(update: Update, context: ContextTypes.DEFAULT_TYPE, text, user, language, managed_user):
+    #верификация / verefication 
     user_id = update.effective_user.id
-    user = get_user_from_json(user_id)
-    language = user.language if user else 'ru'
-    text = update.message.text if update.message.text else ""
-    
-    if state == REGISTRATION_NAME:
-        #сохранение ФИО и запрос паспорта / saving your full name and requesting your passport
-        full_name = text
-        context.user_data['registration_full_name'] = full_name
-        context.user_data['state'] = REGISTRATION_PASSPORT
+    if update.message.photo:
+        #отправка фото паспорта / sending a passport photo
+        photo_file_id = update.message.photo[-1].file_id
+        
+        request_id = next_request_id('verification')
+        request = VerificationRequest(request_id, user_id, photo_file_id)
+        save_request(request)
+        
+        success_text = tr(language, 'verification_sent')
+        await update.message.reply_text(success_text, parse_mode='Markdown')
+        context.user_data['state'] = PERSONAL_CABINET
+        await show_personal_cabinet(update, context)
+    else:
+        error_text = tr(language, 'send_passport_photo')
+        await update.message.reply_text(error_text, parse_mode='Markdown')
+
+@message_states.state(ADMIN_CHANGE_NAME, needs=('managed_user',))
+async def message_admin_change_name(update: Update, context: ContextTypes.DEFAULT_TYPE, text, user, language, managed_user):
+    #смена ФИО юзера админом / changing the user's full name by the admin
+    if managed_user:
+        new_full_name = text
+        managed_user.full_name = new_full_name
+        save_user_to_json(managed_user)
+        
+        await update.message.reply_text(f"✅ *ФИО пользователя изменено на:* {new_full_name}", parse_mode='Markdown')
+        context.user_data['state'] = ADMIN_USER_DETAIL
+        
+        verification_status = '✅ Верифицирован' if managed_user.verified else '❌ Не верифицирован'
+        
+        message = (
+            f"👤 *Личный кабинет пользователя:*\n\n"
+            f"📝 *ФИО:* {managed_user.full_name}\n"
+            f"📋 *Паспорт:* {managed_user.passport or 'Не указан'}\n"
+            f"💰 *Баланс:* {managed_user.balance} ₽\n"
+            f"⏳ *На выводе:* {managed_user.on_hold} ₽\n"
+            f"🛡️ *Верификация:* {verification_status}\n"
+            f"🆔 *ID:* {managed_user.user_id}"
+        )
         
-        texts = TEXTS[language]
         await update.message.reply_text(
-            texts['registration_passport'],
-            reply_markup=get_back_keyboard("start", language),
+            message, 
+            reply_markup=get_admin_user_management_keyboard(),
             parse_mode='Markdown'
         )
-    
-    elif state == REGISTRATION_PASSPORT:
-        #завершение регистрации с паспортом / completing registration with a passport
-        passport = text
-        full_name = context.user_data.get('registration_full_name')
+
+@message_states.state(ADMIN_CHANGE_PASSPORT, needs=('managed_user',))
+async def message_admin_change_passport(update: Update, context: ContextTypes.DEFAULT_TYPE, text, user, language, managed_user):
+    #cмена номера паспорта юзера админом / changing the user's passport number by the admin
+    if managed_user:
+        new_passport = text
+        managed_user.passport = new_passport
+        save_user_to_json(managed_user)
         
-        user = User(user_id, full_name, passport, language=language)
-        save_user_to_json(user)
-        context.user_data['user'] = user
-        context.user_data['state'] = PERSONAL_CABINET
+        await update.message.reply_text(f"✅ *Паспортные данные пользователя изменены на:* {new_passport}", parse_mode='Markdown')
+        context.user_data['state'] = ADMIN_USER_DETAIL
         
-        #чистка временных данных регистрации / cleaning temporary registration data
-        if 'registration_full_name' in context.user_data:
-            del context.user_data['registration_full_name']
+        verification_status = '✅ Верифицирован' if managed_user.verified else '❌ Не верифицирован'
         
-        success_text = "✅ *Регистрация завершена!*" if language == 'ru' else "✅ *Registration completed!*"
-        await update.message.reply_text(success_text, parse_mode='Markdown')
-        await show_personal_cabinet(update, context)
-    
-    elif state == DEPOSIT:
-        #обработка пополнения / deposit processing
-        try:
-            amount = float(text.strip())
-            
-            if amount <= 0:
-                error_text = "❌ *Сумма должна быть положительной*" if language == 'ru' else "❌ *Amount must be positive*"
-                await update.message.reply_text(error_text, parse_mode='Markdown')
-                return
-            
-            #заявка на пополнение / request for replenishment
-            requests = get_deposit_requests()
-            request_id = len(requests) + 1
-            request = DepositRequest(request_id, user_id, amount)
-            save_deposit_request(request)
-            
-            success_text = "✅ *Заявка успешно отправлена!*" if language == 'ru' else "✅ *Request successfully sent!*"
-            await update.message.reply_text(success_text, parse_mode='Markdown')
-            context.user_data['state'] = PERSONAL_CABINET
-            await show_personal_cabinet(update, context)
-            
-        except ValueError:
-            error_text = "❌ *Неверный формат суммы.*\n\n💡 *Введите число, например:* `1500`" if language == 'ru' else "❌ *Invalid amount format.*\n\n💡 *Enter a number, for example:* `1500`"
-            await update.message.reply_text(error_text, parse_mode='Markdown')
-    
-    elif state == WITHDRAWAL:
-        #обработка вывода / output processing
+        message = (
+            f"👤 *Личный кабинет пользователя:*\n\n"
+            f"📝 *ФИО:* {managed_user.full_name}\n"
+            f"📋 *Паспорт:* {managed_user.passport or 'Не указан'}\n"
+            f"💰 *Баланс:* {managed_user.balance} ₽\n"
+            f"⏳ *На выводе:* {managed_user.on_hold} ₽\n"
+            f"🛡️ *Верификация:* {verification_status}\n"
+            f"🆔 *ID:* {managed_user.user_id}"
+        )
+        
+        await update.message.reply_text(
+            message, 
+            reply_markup=get_admin_user_management_keyboard(),
+            parse_mode='Markdown'
+        )
+
+@message_states.state(ADMIN_ADD_BALANCE, needs=('user', 'managed_user'))
+async def message_admin_add_balance(update: Update, context: ContextTypes.DEFAULT_TYPE, text, user, language, managed_user):
+    #пополнение баланса админом / adding funds to the account by the admin
+    user_id = update.effective_user.id
+    if managed_user:
         try:
-            parts = text.split(',')
-            if len(parts) < 2:
-                error_text = "❌ *Пожалуйста, укажите реквизиты и сумму через запятую*" if language == 'ru' else "❌ *Please provide details and amount separated by comma*"
-                await update.message.reply_text(error_text, parse_mode='Markdown')
-                return
-            
-            details = parts[0].strip()
-            amount = float(parts[1].strip())
-            
-            user_obj = context.user_data.get('user', get_user_from_json(user_id))
+            amount = parse_amount(text)
             
             if amount <= 0:
-                error_text = "❌ *Сумма должна быть положительной*" if language == 'ru' else "❌ *Amount must be positive*"
+                error_text = tr(language, 'invalid_amount')
                 await update.message.reply_text(error_text, parse_mode='Markdown')
                 return
             
-            if amount > user_obj.balance:
-                error_text = "❌ *Недостаточно средств на балансе*" if language == 'ru' else "❌ *Insufficient balance*"
-                await update.message.reply_text(error_text, parse_mode='Markdown')
-                return
+            async with account_lock(managed_user.user_id):
+                #кешированный объект мог устареть, перечитываем / the cached object may be stale, re-read it
+                managed_user = get_user_from_json(managed_user.user_id)
+                async with storage_transaction():
+                    credit_balance(managed_user, amount, ADJUSTMENTS_ACCOUNT, 'adjustment', ref=f"staff:{user_id}")
+            context.user_data['managed_user'] = managed_user
             
 
-            user_obj.balance -= amount
-            user_obj.on_hold += amount
-            save_user_to_json(user_obj)
-            
-            requests = get_withdrawal_requests()
-            request_id = len(requests) + 1
-            request = WithdrawalRequest(request_id, user_id, amount, details)
-            save_withdrawal_request(request)
-            
-            success_text = "✅ *Заявка успешно отправлена!*" if language == 'ru' else "✅ *Request successfully sent!*"
-            await update.message.reply_text(success_text, parse_mode='Markdown')
-            context.user_data['state'] = PERSONAL_CABINET
-            await show_personal_cabinet(update, context)
-            
-        except ValueError:
-            error_text = "❌ *Неверный формат.*\n\n💡 *Пожалуйста, используйте формат:* `реквизиты, сумма`" if language == 'ru' else "❌ *Invalid format.*\n\n💡 *Please use format:* `details, amount`"
-            await update.message.reply_text(error_text, parse_mode='Markdown')
-    
-    elif state == VERIFICATION:
-        #верификация / verefication 
-        if update.message.photo:
-            #отправка фото паспорта / sending a passport photo
-            photo_file_id = update.message.photo[-1].file_id
-            user_obj = context.user_data.get('user', get_user_from_json(user_id))
+            user_language = managed_user.language
+            notification_text = tr(
+                user_language, 'balance_added',
+                new_balance=managed_user.balance,
+                amount=amount
+            )
+            notify(managed_user.user_id, notification_text)
             
 
-            requests = get_verification_requests()
-            request_id = len(requests) + 1
-            request = VerificationRequest(request_id, user_id, photo_file_id)
-            save_verification_request(request)
-            
-            success_text = "✅ *Заявка на верификацию отправлена!*\n\n⏳ *Ожидайте одобрения.*" if language == 'ru' else "✅ *Verification request sent!*\n\n⏳ *Please wait for approval.*"
+            success_text = tr(
+                language, 'balance_added',
+                new_balance=managed_user.balance,
+                amount=amount
+            )
             await update.message.reply_text(success_text, parse_mode='Markdown')
-            context.user_data['state'] = PERSONAL_CABINET
-            await show_personal_cabinet(update, context)
-        else:
-            error_text = "❌ *Пожалуйста, отправьте фото паспорта*" if language == 'ru' else "❌ *Please send passport photo*"
-            await update.message.reply_text(error_text, parse_mode='Markdown')
-    
-    elif state == ADMIN_CHANGE_NAME:
-        #смена ФИО юзера админом / changing the user's full name by the admin
-        managed_user = context.user_data.get('managed_user')
-        if managed_user:
-            new_full_name = text
-            managed_user.full_name = new_full_name
-            save_user_to_json(managed_user)
             
-            await update.message.reply_text(f"✅ *ФИО пользователя изменено на:* {new_full_name}", parse_mode='Markdown')
+
             context.user_data['state'] = ADMIN_USER_DETAIL
             
             verification_status = '✅ Верифицирован' if managed_user.verified else '❌ Не верифицирован'
@@ -1543,16 +3639,59 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=get_admin_user_management_keyboard(),
                 parse_mode='Markdown'
             )
-    
-    elif state == ADMIN_CHANGE_PASSPORT: 
-        #cмена номера паспорта юзера админом / changing the user's passport number by the admin
-        managed_user = context.user_data.get('managed_user')
-        if managed_user:
-            new_passport = text
-            managed_user.passport = new_passport
-            save_user_to_json(managed_user)
             
-            await update.message.reply_text(f"✅ *Паспортные данные пользователя изменены на:* {new_passport}", parse_mode='Markdown')
+        except ValueError:
+            error_text = tr(language, 'invalid_amount')
+            await update.message.reply_text(error_text, parse_mode='Markdown')
+
+@message_states.state(ADMIN_REDUCE_BALANCE, needs=('user', 'managed_user'))
+async def message_admin_reduce_balance(update: Update, context: ContextTypes.DEFAULT_TYPE, text, user, language, managed_user):
+    #уменьшение баланса админом / reducing the balance by the admin
+    user_id = update.effective_user.id
+    if managed_user:
+        try:
+            amount = parse_amount(text)
+            
+            if amount <= 0:
+                error_text = tr(language, 'invalid_amount')
+                await update.message.reply_text(error_text, parse_mode='Markdown')
+                return
+            
+            async with account_lock(managed_user.user_id):
+                managed_user = get_user_from_json(managed_user.user_id)
+                sufficient = amount <= managed_user.balance
+                if sufficient:
+                    async with storage_transaction():
+                        debit_balance(managed_user, amount, ADJUSTMENTS_ACCOUNT, 'adjustment', ref=f"staff:{user_id}")
+            context.user_data['managed_user'] = managed_user
+            
+            if not sufficient:
+                error_text = tr(
+                    language, 'insufficient_balance',
+                    balance=managed_user.balance,
+                    amount=amount
+                )
+                await update.message.reply_text(error_text, parse_mode='Markdown')
+                return
+            
+
+            user_language = managed_user.language
+            notification_text = tr(
+                user_language, 'balance_reduced',
+                new_balance=managed_user.balance,
+                amount=amount
+            )
+            notify(managed_user.user_id, notification_text)
+            
+
+            success_text = tr(
+                language, 'balance_reduced',
+                new_balance=managed_user.balance,
+                amount=amount
+            )
+            await update.message.reply_text(success_text, parse_mode='Markdown')
+            
+
             context.user_data['state'] = ADMIN_USER_DETAIL
             
             verification_status = '✅ Верифицирован' if managed_user.verified else '❌ Не верифицирован'
@@ -1572,182 +3711,593 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=get_admin_user_management_keyboard(),
                 parse_mode='Markdown'
             )
+            
+        except ValueError:
+            error_text = tr(language, 'invalid_amount')
+            await update.message.reply_text(error_text, parse_mode='Markdown')
+
+@message_states.state(ADMIN_BULK_LIMIT)
+async def message_admin_bulk_limit(update: Update, context: ContextTypes.DEFAULT_TYPE, text, user, language, managed_user):
+    #отметка заявок верифицированных пользователей до суммы / marking verified users' requests up to the amount
+    kind = context.user_data.get('bulk_kind')
+    if kind not in ('withdrawal', 'deposit'):
+        context.user_data['state'] = ADMIN_MENU
+        return
+    try:
+        limit = parse_amount(text)
+    except ValueError:
+        limit = 0
+    if limit <= 0:
+        await update.message.reply_text(tr(language, 'invalid_amount'), parse_mode='Markdown')
+        return
     
-    elif state == ADMIN_ADD_BALANCE:
-        #пополнение баланса админом / adding funds to the account by the admin
-        managed_user = context.user_data.get('managed_user')
-        if managed_user:
-            try:
-                amount = float(text.strip())
-                
-                if amount <= 0:
-                    error_text = TEXTS[language]['invalid_amount']
-                    await update.message.reply_text(error_text, parse_mode='Markdown')
-                    return
-                
+    requests = get_requests(kind, "pending")
+    users = get_users_from_json({req.user_id for req in requests if req.amount <= limit})
+    context.user_data['bulk_selected'] = {
+        req.request_id for req in requests
+        if req.amount <= limit and req.user_id in users and users[req.user_id].verified
+    }
+    await show_bulk_selection(update, context)
 
-                old_balance = managed_user.balance
-                managed_user.balance += amount
-                save_user_to_json(managed_user)
-                
+@message_states.state(ADMIN_ADD_STAFF)
+async def message_admin_add_staff(update: Update, context: ContextTypes.DEFAULT_TYPE, text, user, language, managed_user):
+    #добавление работника / adding an employee
+    user_id = update.effective_user.id
+    try:
+        parts = text.split(',')
+        if len(parts) < 2:
+            await update.message.reply_text("❌ *Пожалуйста, укажите ФИО и ID через запятую*", parse_mode='Markdown')
+            return
+        
+        full_name = parts[0].strip()
+        staff_id = int(parts[1].strip())
+        
+        add_staff_to_json(staff_id, full_name)
+        await update.message.reply_text(f"✅ *Работник {full_name} (ID: {staff_id}) успешно добавлен!*", parse_mode='Markdown')
+        context.user_data['state'] = ADMIN_MENU
+        
+        await update.message.reply_text(
+            "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
+            reply_markup=get_admin_menu_keyboard(is_admin(user_id)),
+            parse_mode='Markdown'
+        )
+        
+    except ValueError:
+        await update.message.reply_text("❌ *Неверный формат.*\n\n💡 *Пожалуйста, используйте формат:* `ФИО, ID`", parse_mode='Markdown')
 
-                try:
-                    user_language = managed_user.language
-                    notification_text = TEXTS[user_language]['balance_added'].format(
-                        new_balance=managed_user.balance,
-                        amount=amount
-                    )
-                    
-                    await context.bot.send_message(
-                        chat_id=managed_user.user_id,
-                        text=notification_text,
-                        parse_mode='Markdown'
-                    )
-                except:
-                    pass
-                
-
-                success_text = TEXTS[language]['balance_added'].format(
-                    new_balance=managed_user.balance,
-                    amount=amount
-                )
-                await update.message.reply_text(success_text, parse_mode='Markdown')
-                
-
-                context.user_data['state'] = ADMIN_USER_DETAIL
-                
-                verification_status = '✅ Верифицирован' if managed_user.verified else '❌ Не верифицирован'
-                
-                message = (
-                    f"👤 *Личный кабинет пользователя:*\n\n"
-                    f"📝 *ФИО:* {managed_user.full_name}\n"
-                    f"📋 *Паспорт:* {managed_user.passport or 'Не указан'}\n"
-                    f"💰 *Баланс:* {managed_user.balance} ₽\n"
-                    f"⏳ *На выводе:* {managed_user.on_hold} ₽\n"
-                    f"🛡️ *Верификация:* {verification_status}\n"
-                    f"🆔 *ID:* {managed_user.user_id}"
-                )
-                
-                await update.message.reply_text(
-                    message, 
-                    reply_markup=get_admin_user_management_keyboard(),
-                    parse_mode='Markdown'
-                )
-                
-            except ValueError:
-                error_text = TEXTS[language]['invalid_amount']
-                await update.message.reply_text(error_text, parse_mode='Markdown')
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    state = context.user_data.get('state', START)
+    user_id = update.effective_user.id
     
-    elif state == ADMIN_REDUCE_BALANCE:
-        #уменьшение баланса админом / reducing the balance by the admin
-        managed_user = context.user_data.get('managed_user')
-        if managed_user:
-            try:
-                amount = float(text.strip())
-                
-                if amount <= 0:
-                    error_text = TEXTS[language]['invalid_amount']
-                    await update.message.reply_text(error_text, parse_mode='Markdown')
-                    return
-                
-                if amount > managed_user.balance:
-                    error_text = TEXTS[language]['insufficient_balance'].format(
-                        balance=managed_user.balance,
-                        amount=amount
-                    )
-                    await update.message.reply_text(error_text, parse_mode='Markdown')
-                    return
-                
+    #сотрудника могли удалить, пока он был в панели / the staff member may have been removed while in the panel
+    if state in ADMIN_STATES and not is_staff(user_id):
+        context.user_data['state'] = START
+        return
+    if state == ADMIN_ADD_STAFF and not is_admin(user_id):
+        return
+    
+    entry = message_states.get(state)
+    if entry is None:
+        return
+    handler, needs_user, needs_managed_user, labels = entry
+    label_update_profile(f"message {labels[0][1]}")
+    started = time.perf_counter()
+    
+    #хранилище читается только для состояний, которым нужен пользователь / storage is read only for states that need the user
+    if needs_user:
+        user = get_user_from_json(user_id)
+        language = user.language if user else 'ru'
+    else:
+        user = None
+        cached_user = context.user_data.get('user')
+        language = cached_user.language if cached_user else 'ru'
+    managed_user = context.user_data.get('managed_user') if needs_managed_user else None
+    text = update.message.text if update.message.text else ""
+    
+    try:
+        await handler(update, context, text, user, language, managed_user)
+    finally:
+        metrics.observe('bot_message_seconds', labels, time.perf_counter() - started)
+
+#параллельная обработка обновлений с сохранением порядка внутри одного чата / concurrent update processing that keeps order within a chat
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates, max_waiting_updates=MAX_WAITING_UPDATES):
+        #семафор базового класса берется до очереди чата и ограничивает только принятые обновления / the base class semaphore is taken before the chat queue and only bounds accepted updates
+        super().__init__(max_concurrent_updates + max_waiting_updates)
+        self._running = asyncio.Semaphore(max_concurrent_updates)
+        self._chat_locks = {}
+        self._chat_waiters = {}
+        self.in_progress = 0
+    
+    def busy_chats(self):
+        return len(self._chat_waiters)
+    
+    async def do_process_update(self, update, coroutine):
+        kind = 'callback' if update.callback_query else 'message' if update.message else 'other'
+        started = time.perf_counter()
+        self.in_progress += 1
+        if update_profiler.enabled:
+            coroutine = update_profiler.run(update, coroutine)
+        try:
+            await self._process_in_chat_order(update, coroutine)
+        finally:
+            self.in_progress -= 1
+            metrics.observe('bot_update_seconds', (('kind', kind),), time.perf_counter() - started)
+    
+    async def _process_in_chat_order(self, update, coroutine):
+        chat = getattr(update, 'effective_chat', None)
+        if chat is None:
+            async with self._running:
+                await coroutine
+            return
+        
+        #asyncio.Lock пропускает ожидающих по очереди, поэтому порядок сохраняется / asyncio.Lock wakes waiters in FIFO order, so order is kept
+        chat_id = chat.id
+        lock = self._chat_locks.get(chat_id)
+        if lock is None:
+            lock = self._chat_locks[chat_id] = asyncio.Lock()
+        self._chat_waiters[chat_id] = self._chat_waiters.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                #слот берется, когда подошла очередь чата: ожидающие в одном чате не занимают слоты других / the slot is taken once it is the chat's turn: updates waiting in one chat don't hold slots of the others
+                async with self._running:
+                    await coroutine
+        finally:
+            self._chat_waiters[chat_id] -= 1
+            if not self._chat_waiters[chat_id]:
+                del self._chat_waiters[chat_id]
+                del self._chat_locks[chat_id]
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
 
-                old_balance = managed_user.balance
-                managed_user.balance -= amount
-                save_user_to_json(managed_user)
-                
+#минимальный HTTP/1.1 сервер на asyncio для вебхука и служебных адресов / minimal asyncio HTTP/1.1 server for the webhook and service endpoints
+class HttpRequest:
+    __slots__ = ('method', 'path', 'query', 'headers', 'body')
+    
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        #имена заголовков в нижнем регистре / header names are lowercase
+        self.headers = headers
+        self.body = body
 
+class HttpServer:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        #(метод, путь) -> async обработчик, возвращает (статус, content-type, тело) / (method, path) -> async handler returning (status, content-type, body)
+        self.routes = {}
+        self.draining = False
+        self._server = None
+        #соединение -> обрабатывается ли сейчас запрос / connection -> whether a request is being handled right now
+        self._connections = {}
+        self._busy = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+    
+    def route(self, method, path, handler):
+        self.routes[method, path] = handler
+    
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        #порт 0 — выбирает система / port 0 lets the OS pick
+        self.port = self._server.sockets[0].getsockname()[1]
+        logging.info("HTTP server listening on %s:%s", self.host, self.port)
+    
+    async def stop(self, timeout):
+        #новые соединения не принимаются, простаивающие закрываются, начатые запросы дорабатываются / no new connections, idle ones are closed, requests in progress are finished
+        self.draining = True
+        self._server.close()
+        for writer, busy in list(self._connections.items()):
+            if not busy:
+                writer.close()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning("HTTP drain timed out with %s requests in progress", self._busy)
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+    
+    async def _serve(self, reader, writer):
+        self._connections[writer] = False
+        try:
+            while not self.draining:
                 try:
-                    user_language = managed_user.language
-                    notification_text = TEXTS[user_language]['balance_reduced'].format(
-                        new_balance=managed_user.balance,
-                        amount=amount
-                    )
-                    
-                    await context.bot.send_message(
-                        chat_id=managed_user.user_id,
-                        text=notification_text,
-                        parse_mode='Markdown'
-                    )
-                except:
-                    pass
-                
-
-                success_text = TEXTS[language]['balance_reduced'].format(
-                    new_balance=managed_user.balance,
-                    amount=amount
-                )
-                await update.message.reply_text(success_text, parse_mode='Markdown')
-                
-
-                context.user_data['state'] = ADMIN_USER_DETAIL
-                
-                verification_status = '✅ Верифицирован' if managed_user.verified else '❌ Не верифицирован'
-                
-                message = (
-                    f"👤 *Личный кабинет пользователя:*\n\n"
-                    f"📝 *ФИО:* {managed_user.full_name}\n"
-                    f"📋 *Паспорт:* {managed_user.passport or 'Не указан'}\n"
-                    f"💰 *Баланс:* {managed_user.balance} ₽\n"
-                    f"⏳ *На выводе:* {managed_user.on_hold} ₽\n"
-                    f"🛡️ *Верификация:* {verification_status}\n"
-                    f"🆔 *ID:* {managed_user.user_id}"
-                )
-                
-                await update.message.reply_text(
-                    message, 
-                    reply_markup=get_admin_user_management_keyboard(),
-                    parse_mode='Markdown'
-                )
-                
-            except ValueError:
-                error_text = TEXTS[language]['invalid_amount']
-                await update.message.reply_text(error_text, parse_mode='Markdown')
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HTTP_KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                    return
+                self._connections[writer] = True
+                self._busy += 1
+                self._idle.clear()
+                try:
+                    keep_alive = await self._handle(head, reader, writer)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                finally:
+                    self._connections[writer] = False
+                    self._busy -= 1
+                    if not self._busy:
+                        self._idle.set()
+                if not keep_alive:
+                    return
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
     
-    elif state == ADMIN_ADD_STAFF:
-        #добавление работника / adding an employee
+    async def _handle(self, head, reader, writer):
         try:
-            parts = text.split(',')
-            if len(parts) < 2:
-                await update.message.reply_text("❌ *Пожалуйста, укажите ФИО и ID через запятую*", parse_mode='Markdown')
-                return
-            
-            full_name = parts[0].strip()
-            staff_id = int(parts[1].strip())
-            
-            add_staff_to_json(staff_id, full_name)
-            await update.message.reply_text(f"✅ *Работник {full_name} (ID: {staff_id}) успешно добавлен!*", parse_mode='Markdown')
-            context.user_data['state'] = ADMIN_MENU
-            
-            await update.message.reply_text(
-                "👨‍💼 *Добро пожаловать в меню управления*\n\nВыберите действие которое хотите выполнить:",
-                reply_markup=get_admin_menu_keyboard(user_id in ADMIN_IDS),
-                parse_mode='Markdown'
-            )
-            
+            lines = head.decode('latin-1').split("\r\n")
+            method, target, version = lines[0].split(" ")
+            headers = {}
+            for line in lines[1:]:
+                if line:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            #отрицательная длина - такой же мусор, как и нечисловая / a negative length is as malformed as a non-numeric one
+            if length < 0:
+                raise ValueError(length)
         except ValueError:
-            await update.message.reply_text("❌ *Неверный формат.*\n\n💡 *Пожалуйста, используйте формат:* `ФИО, ID`", parse_mode='Markdown')
+            await self._respond(writer, 400, 'text/plain', b"", False)
+            return False
+        #Telegram всегда присылает Content-Length / Telegram always sends Content-Length
+        if 'transfer-encoding' in headers:
+            await self._respond(writer, 411, 'text/plain', b"", False)
+            return False
+        if length > HTTP_MAX_BODY:
+            await self._respond(writer, 413, 'text/plain', b"", False)
+            return False
+        body = await reader.readexactly(length)
+        
+        path, _, query = target.partition("?")
+        handler = self.routes.get((method, path))
+        if handler is None:
+            known_path = any(route_path == path for _, route_path in self.routes)
+            status, content_type, payload = (405 if known_path else 404), 'text/plain', b""
+        else:
+            try:
+                status, content_type, payload = await handler(HttpRequest(method, path, query, headers, body))
+            except Exception:
+                logging.exception("HTTP handler failed for %s %s", method, path)
+                status, content_type, payload = 500, 'text/plain', b""
+        
+        keep_alive = version == "HTTP/1.1" and headers.get('connection', '').lower() != 'close' and not self.draining
+        await self._respond(writer, status, content_type, payload, keep_alive)
+        return keep_alive
+    
+    async def _respond(self, writer, status, content_type, body, keep_alive):
+        head = (
+            f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
 
-def main():
+#вебхук: проверка секрета, разбор и постановка в очередь приложения, ответ не ждет обработки / webhook: secret check, parsing and queueing into the application, the answer doesn't wait for processing
+async def receive_webhook(application: Application, request: HttpRequest):
+    if WEBHOOK_SECRET_TOKEN:
+        token = request.headers.get('x-telegram-bot-api-secret-token', '')
+        if not hmac.compare_digest(token.encode('latin-1'), WEBHOOK_SECRET_TOKEN.encode('latin-1')):
+            return 403, 'text/plain', b""
+    try:
+        update = Update.de_json(json.loads(request.body), application.bot)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        update = None
+    if update is None:
+        return 400, 'text/plain', b""
+    await application.update_queue.put(update)
+    return 200, 'text/plain', b""
+
+#cProfile включается только на шагах своей задачи, поэтому параллельные обновления не попадают в чужой профиль / cProfile is enabled only while its own task steps, so concurrent updates don't leak into each other's profiles
+class ProfiledCoroutine:
+    def __init__(self, coroutine, profiler):
+        self.coroutine = coroutine
+        self.profiler = profiler
+    
+    def __await__(self):
+        value, error = None, None
+        while True:
+            self.profiler.enable()
+            try:
+                if error is not None:
+                    future = self.coroutine.throw(error)
+                else:
+                    future = self.coroutine.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profiler.disable()
+            try:
+                value, error = (yield future), None
+            except BaseException as raised:
+                value, error = None, raised
 
-    init_json_files()
+#режим профилирования: ввод-вывод каждого обновления, сводка по типам и cProfile самых медленных / profiling mode: I/O of every update, a summary by update type and cProfile of the slowest ones
+class UpdateProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+    
+    def reset(self):
+        self.profiled = 0
+        self.background = UpdateProfile()
+        #метка -> [обновлений, секунд, {файл: счетчики}, {функция: вызовы}] / label -> [updates, seconds, {file: counters}, {function: calls}]
+        self.by_label = {}
+        #куча (секунды, номер, профиль), наверху самое быстрое из хранимых / a heap of (seconds, number, profile), the fastest kept one on top
+        self.slowest = []
+    
+    def toggle(self):
+        self.enabled = not self.enabled
+        return self.enabled
+    
+    async def run(self, update, coroutine):
+        if update.callback_query:
+            label = "callback"
+        elif update.message and update.message.text and update.message.text.startswith("/"):
+            label = update.message.text.split()[0]
+        else:
+            label = "message"
+        profile = UpdateProfile(update.update_id, label)
+        token = current_update_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            await ProfiledCoroutine(coroutine, profile.profiler)
+        finally:
+            profile.seconds = time.perf_counter() - started
+            current_update_profile.reset(token)
+            self._keep(profile)
     
+    def _keep(self, profile):
+        self.profiled += 1
+        totals = self.by_label.setdefault(profile.label, [0, 0.0, {}, {}])
+        totals[0] += 1
+        totals[1] += profile.seconds
+        for name, stats in profile.files.items():
+            file_totals = totals[2].setdefault(name, dict.fromkeys(stats, 0))
+            for key, value in stats.items():
+                file_totals[key] += value
+        for name, (calls, _) in profile.calls.items():
+            totals[3][name] = totals[3].get(name, 0) + calls
+        #профили остальных обновлений сразу отпускаются / profiles of the other updates are dropped right away
+        entry = (profile.seconds, self.profiled, profile)
+        if len(self.slowest) < PROFILE_KEEP_SLOWEST:
+            heapq.heappush(self.slowest, entry)
+        elif entry[0] > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+    
+    @staticmethod
+    def _format_files(files, per=1):
+        lines = []
+        for name, stats in sorted(files.items(), key=lambda item: -item[1]['seconds']):
+            lines.append(
+                f"    {name:<24} opens {stats['opens'] / per:>6.1f}  parse {stats['parse'] / per:>5.1f}  read {stats['read'] / per:>5.1f}"
+                f"  rewrite {stats['rewrite'] / per:>5.1f}  append {stats['append'] / per:>5.1f}"
+                f"  KB {stats['bytes'] / 1024 / per:>9.1f}  ms {stats['seconds'] * 1000 / per:>8.2f}"
+            )
+        return lines
+    
+    def dump(self):
+        #отчет summary.txt и по .prof на каждое медленное обновление (pstats, snakeviz) / a summary.txt report and a .prof per slow update (pstats, snakeviz)
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        lines = [f"Профилировано обновлений / updates profiled: {self.profiled}", ""]
+        lines.append("== Среднее на обновление по типам / average per update by type ==")
+        for label, (count, seconds, files, calls) in sorted(self.by_label.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{label}: {count} updates, avg {seconds * 1000 / count:.2f} ms")
+            lines.extend(self._format_files(files, count))
+            if calls:
+                lines.append("    calls: " + ", ".join(f"{name} {total / count:.1f}" for name, total in sorted(calls.items())))
+        lines.append("")
+        lines.append("== Фоновый сброс, всего / background flush, total ==")
+        lines.extend(self._format_files(self.background.files))
+        lines.append("")
+        lines.append("== Самые медленные / slowest (время в await не входит в профиль / time spent in await is not in the profile) ==")
+        for rank, (seconds, _, profile) in enumerate(sorted(self.slowest, reverse=True), 1):
+            prof_file = os.path.join(PROFILE_DIR, f"slowest_{rank:02d}_{profile.update_id}.prof")
+            profile.profiler.dump_stats(prof_file)
+            lines.append(f"#{rank} update {profile.update_id} {profile.label}: {seconds * 1000:.2f} ms -> {prof_file}")
+            lines.extend(self._format_files(profile.files))
+            for name, (calls, call_seconds) in sorted(profile.calls.items()):
+                lines.append(f"    {name}: {calls} calls, {call_seconds * 1000:.2f} ms")
+            output = io.StringIO()
+            pstats.Stats(profile.profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+            lines.extend("    " + line for line in output.getvalue().strip().splitlines())
+            lines.append("")
+        summary_file = os.path.join(PROFILE_DIR, "summary.txt")
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        return summary_file
+
+update_profiler = UpdateProfiler()
+
+def label_update_profile(label):
+    profile = current_update_profile.get()
+    if profile is not None:
+        profile.label = label
+
+def toggle_profiling():
+    #SIGUSR1: включает профилирование, повторный сигнал выключает и пишет отчет / SIGUSR1 turns profiling on, the next one turns it off and writes the report
+    if update_profiler.toggle():
+        logging.info("Profiling enabled")
+    else:
+        logging.info("Profiling disabled, report written to %s", update_profiler.dump())
+
+async def serve_metrics(request: HttpRequest):
+    return 200, 'text/plain; version=0.0.4; charset=utf-8', metrics.render().encode('utf-8')
 
-    application = Application.builder().token("YOUR TOKEN HERE").build()
+#запросы к Bot API с замером времени по методу; повторы и ошибки считает сама библиотека выше / Bot API requests timed per method; retries and errors are handled by the library above
+class MeasuredRequest(HTTPXRequest):
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        labels = (('method', url.rpartition("/")[2]),)
+        started = time.perf_counter()
+        try:
+            status, payload = await super().do_request(url, method, request_data, **kwargs)
+        except Exception:
+            metrics.inc('bot_api_errors_total', labels)
+            raise
+        finally:
+            metrics.observe('bot_api_seconds', labels, time.perf_counter() - started)
+        if status >= 400:
+            metrics.inc('bot_api_errors_total', labels)
+        return status, payload
+
+def register_gauges(application: Application):
+    processor = application.update_processor
+    metrics.gauge('bot_update_queue_depth', "Updates received but not yet picked up", application.update_queue.qsize)
+    if isinstance(processor, ChatOrderedUpdateProcessor):
+        metrics.gauge('bot_updates_in_progress', "Updates being handled or waiting for their chat", lambda: processor.in_progress)
+        metrics.gauge('bot_busy_chats', "Chats with an update in progress", processor.busy_chats)
+    metrics.gauge('bot_outbox_pending', "Undelivered notifications", outbox.pending_count)
+    metrics.gauge('bot_outbox_queue_depth', "Notifications waiting for a sender", outbox.queued_count)
+    metrics.gauge('bot_write_behind_pending', "Changes waiting for the next flush", lambda: {
+        (('what', 'users'),): user_repository.pending_count(),
+        (('what', 'sessions'),): session_store.pending_count(),
+    })
+
+#режим вебхука: тот же жизненный цикл, что у run_polling, но обновления приходят на свой HTTP сервер / webhook mode: the same lifecycle as run_polling, but updates arrive at our own HTTP server
+async def run_webhook(application: Application, stop=None):
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            #Windows: Ctrl+C отменяет задачу через asyncio.run, остановка идет в finally / Windows: Ctrl+C cancels the task via asyncio.run, shutdown runs in finally
+            pass
     
+    server = HttpServer(WEBHOOK_LISTEN, WEBHOOK_PORT)
+    server.route('POST', WEBHOOK_PATH, functools.partial(receive_webhook, application))
+    
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    await server.start()
+    if WEBHOOK_URL:
+        await application.bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET_TOKEN or None)
+    try:
+        await stop.wait()
+    finally:
+        #порядок остановки: прием HTTP, очередь обновлений, сброс хранилища / shutdown order: HTTP intake, the update queue, the storage flush
+        await server.stop(WEBHOOK_DRAIN_TIMEOUT)
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+
+async def on_startup(application: Application):
+    application.bot_data['flush_task'] = asyncio.create_task(run_write_behind())
+    application.bot_data['maintenance_task'] = asyncio.create_task(run_storage_maintenance())
+    application.bot_data['outbox_tasks'] = outbox.start(application.bot)
+    register_gauges(application)
+    profile_signal = getattr(signal, 'SIGUSR1', None)
+    if profile_signal is not None:
+        try:
+            asyncio.get_running_loop().add_signal_handler(profile_signal, toggle_profiling)
+        except (NotImplementedError, RuntimeError):
+            pass
+    application.bot_data['metrics_server'] = None
+    if METRICS_PORT:
+        server = HttpServer(METRICS_LISTEN, METRICS_PORT)
+        server.route('GET', METRICS_PATH, serve_metrics)
+        try:
+            await server.start()
+        except OSError as error:
+            #без метрик бот работает дальше / the bot keeps running without metrics
+            logging.error("Metrics endpoint not started: %s", error)
+        else:
+            application.bot_data['metrics_server'] = server
+
+async def on_stop(application: Application):
+    application.bot_data['flush_task'].cancel()
+    application.bot_data['maintenance_task'].cancel()
+    #недоставленные уведомления сохраняются и уйдут после перезапуска / undelivered notifications are persisted and go out after a restart
+    for task in application.bot_data['outbox_tasks']:
+        task.cancel()
+    if application.bot_data['metrics_server'] is not None:
+        await application.bot_data['metrics_server'].stop(1)
+    #при остановке сбрасывается все, что еще в памяти, и пишется снимок книги / on shutdown everything still in memory is flushed and a ledger snapshot is written
+    flush_storage(force_snapshot=True)
+    traffic_recorder.close()
+    storage.compact_journals(force=True)
+    storage.close()
+
+#/profile on|off|dump|reset — профилирование обновлений, только для админов / /profile on|off|dump|reset — update profiling, admins only
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        return
+    action = context.args[0] if context.args else ""
+    if action == "on":
+        update_profiler.enabled = True
+        text = f"🔬 *Профилирование включено*\n\nСохраняется самых медленных обновлений: {PROFILE_KEEP_SLOWEST}"
+    elif action == "off":
+        update_profiler.enabled = False
+        text = f"⏹ *Профилирование выключено*\n\nОтчет: `{update_profiler.dump()}`"
+    elif action == "dump":
+        text = f"📄 *Отчет записан*\n\n`{update_profiler.dump()}`"
+    elif action == "reset":
+        update_profiler.reset()
+        text = "🧹 *Данные профилирования сброшены*"
+    else:
+        state = "включено" if update_profiler.enabled else "выключено"
+        text = (
+            f"🔬 *Профилирование {state}*\n\nОбновлений профилировано: {update_profiler.profiled}\n\n"
+            "💡 `/profile on`, `/profile off`, `/profile dump`, `/profile reset`"
+        )
+    await update.message.reply_text(text, parse_mode='Markdown')
+
+#обработчики отдельно от main, чтобы бенчмарк собирал то же приложение / handlers live apart from main so the benchmark builds the same application
+def register_handlers(application: Application):
+    application.add_handler(TypeHandler(Update, load_session), group=-1)
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("profile", profile_command))
     application.add_handler(CallbackQueryHandler(handle_callback))
     application.add_handler(MessageHandler(filters.TEXT | filters.PHOTO, handle_message))
+    application.add_handler(TypeHandler(Update, save_session), group=1)
+
+def main():
+    #разовый перенос JSON -> SQLite: python bot.py migrate / one-shot JSON -> SQLite migration: python bot.py migrate
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        migrate_json_to_sqlite()
+        return
+    
+    #сверка балансов с книгой: python bot.py reconcile / balances vs ledger check: python bot.py reconcile
+    if len(sys.argv) > 1 and sys.argv[1] == "reconcile":
+        init_storage()
+        total, mismatched = reconcile_balances()
+        storage.close()
+        print(f"Сумма по счетам / trial balance: {from_minor(total)}")
+        print(f"Расхождений / mismatched users: {len(mismatched)} {mismatched[:20]}")
+        sys.exit(1 if total or mismatched else 0)
+
+    init_storage()
+    
+
+    application = (
+        Application.builder()
+        .token("YOUR TOKEN HERE")
+        .request(MeasuredRequest(connection_pool_size=256))
+        .get_updates_request(MeasuredRequest())
+        .concurrent_updates(ChatOrderedUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .build()
+    )
+    
+    register_handlers(application)
     
     print("Бот запущен")
-    application.run_polling()
+    if UPDATE_MODE == "webhook":
+        asyncio.run(run_webhook(application))
+    else:
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
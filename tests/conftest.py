@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot
+
+
+#каждый тест работает в пустом каталоге данных, на обоих хранилищах / every test runs in an empty data directory, on both backends
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bot, 'STORAGE_BACKEND', request.param)
+    bot.init_storage()
+    yield request.param
+    bot.storage.close()
+
+
+#сброс, закрытие и повторное открытие хранилища, как при перезапуске / flush, close and reopen the storage, as on a restart
+@pytest.fixture
+def reopen(backend):
+    def reopen(force_snapshot=False):
+        bot.flush_storage(force_snapshot)
+        bot.storage.close()
+        bot.init_storage()
+    return reopen
+
+
+@pytest.fixture
+def make_user(backend):
+    def make_user(user_id, full_name="Test User"):
+        user = bot.User(user_id, full_name, "1234 567890")
+        bot.save_user_to_json(user)
+        return user
+    return make_user
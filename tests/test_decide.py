@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+import bot
+
+
+def decide(kind, request_ids, decision):
+    return asyncio.run(bot.decide_requests(kind, request_ids, decision))
+
+
+@pytest.fixture
+def deposits(make_user):
+    user = make_user(1)
+    request_ids = []
+    for amount in (100, 200, 300):
+        request = bot.DepositRequest(bot.next_request_id('deposit'), user.user_id, amount)
+        bot.save_request(request)
+        request_ids.append(request.request_id)
+    return request_ids
+
+
+@pytest.fixture
+def withdrawals(make_user):
+    user = make_user(2)
+    bot.credit_balance(user, 1000, bot.DEPOSITS_ACCOUNT, 'deposit', 'deposit:0')
+    request_ids = []
+    for amount in (100, 200, 300):
+        request_id = bot.next_request_id('withdrawal')
+        bot.hold_withdrawal(user, amount, ref=f"withdrawal:{request_id}")
+        bot.save_request(bot.WithdrawalRequest(request_id, user.user_id, amount, "card"))
+        request_ids.append(request_id)
+    return request_ids
+
+
+def test_bulk_approve_credits_each_deposit_once(deposits, reopen):
+    assert decide('deposit', deposits, 'approve') == (3, 0)
+    assert decide('deposit', deposits, 'approve') == (0, 0)
+    assert bot.get_user_from_json(1).balance == 600
+
+    reopen()
+    assert [bot.get_request('deposit', request_id).status for request_id in deposits] == ["approved"] * 3
+    assert bot.get_user_from_json(1).balance == 600
+    assert bot.reconcile_balances() == (0, [])
+
+
+def test_bulk_decide_skips_requests_decided_meanwhile(deposits):
+    first, second, third = deposits
+    #другой сотрудник успел решить две заявки / another staff member already decided two of the requests
+    bot.approve_deposit(bot.get_request('deposit', first))
+    bot.reject_deposit(bot.get_request('deposit', second))
+    pending = bot.outbox.pending_count()
+
+    assert decide('deposit', deposits, 'approve') == (1, 0)
+    assert bot.outbox.pending_count() - pending == 1
+    assert bot.get_user_from_json(1).balance == 400
+    assert bot.get_request('deposit', second).status == "rejected"
+    assert bot.get_request('deposit', third).status == "approved"
+
+
+def test_bulk_reject_releases_only_pending_withdrawals(withdrawals, reopen):
+    first, second, third = withdrawals
+    bot.approve_withdrawal(bot.get_request('withdrawal', first))
+
+    assert decide('withdrawal', withdrawals, 'reject') == (2, 0)
+    user = bot.get_user_from_json(2)
+    assert (user.balance, user.on_hold) == (900, 0)
+    assert bot.ledger.balance(bot.WITHDRAWALS_ACCOUNT) == 10000
+
+    reopen()
+    assert bot.get_request('withdrawal', first).status == "approved"
+    assert bot.reconcile_balances() == (0, [])
+
+
+def test_bulk_decide_skips_deleted_verifications(make_user):
+    user = make_user(3)
+    request_ids = []
+    for photo in ("photo-a", "photo-b"):
+        request = bot.VerificationRequest(bot.next_request_id('verification'), user.user_id, photo)
+        bot.save_request(request)
+        request_ids.append(request.request_id)
+    bot.approve_verification(bot.get_request('verification', request_ids[0]))
+
+    assert decide('verification', request_ids + [999], 'reject') == (1, 0)
+    assert bot.get_requests('verification') == []
+    assert bot.get_user_from_json(3).verified
+
+
+def test_broken_request_does_not_abort_the_batch(make_user, reopen, backend):
+    if backend != "json":
+        pytest.skip("SQLite refuses to store a NaN amount")
+    user = make_user(4)
+    request_ids = []
+    #NaN из старых данных, в обход проверки ввода / a NaN from old data, past the input check
+    for amount in (100, float('nan'), 50):
+        request = bot.DepositRequest(bot.next_request_id('deposit'), user.user_id, amount)
+        bot.save_request(request)
+        request_ids.append(request.request_id)
+    pending = bot.outbox.pending_count()
+
+    assert decide('deposit', request_ids, 'approve') == (2, 1)
+    assert bot.outbox.pending_count() - pending == 2
+    assert [bot.get_request('deposit', request_id).status for request_id in request_ids] == ["approved", "pending", "approved"]
+
+    #битая заявка падает снова, но больше ничего не трогает / the broken request fails again but touches nothing else
+    assert decide('deposit', request_ids, 'approve') == (0, 1)
+    reopen()
+    assert bot.get_user_from_json(4).balance == 150
+    assert bot.reconcile_balances() == (0, [])
+
+
+def test_bulk_notifications_go_out_after_the_flush(deposits, monkeypatch):
+    sent = []
+
+    class Bot:
+        async def send_message(self, chat_id, text, **kwargs):
+            sent.append(chat_id)
+
+    monkeypatch.setattr(bot, 'OUTBOX_CHAT_INTERVAL', 0)
+    monkeypatch.setattr(bot, 'OUTBOX_GLOBAL_RATE', 1000)
+    monkeypatch.setattr(bot, 'outbox', bot.Outbox())
+    bot.outbox.load()
+
+    async def run():
+        workers = bot.outbox.start(Bot())
+        #решение и уведомления фиксируются одним сбросом в конце транзакции / the decision and notifications are committed by one flush at the end of the transaction
+        async with bot.storage_transaction():
+            notifications = [(1, bot.approve_deposit(bot.get_request('deposit', request_id))) for request_id in deposits]
+            bot.notify_many(notifications)
+            await asyncio.sleep(0.01)
+            assert sent == []
+        await asyncio.sleep(0.05)
+        for worker in workers:
+            worker.cancel()
+
+    asyncio.run(run())
+    assert sent == [1, 1, 1]
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = bot.RequestJournal(str(tmp_path / "deposits.json"))
+    yield journal
+    journal.close()
+
+
+def put(journal, request_id, status="pending"):
+    journal.put({'request_id': request_id, 'user_id': 1, 'amount': 10, 'status': status})
+
+
+def statuses(journal):
+    #новый объект читает только диск / a fresh object only reads the disk
+    return {record['request_id']: record['status'] for record in bot.RequestJournal(journal.snapshot_file).load()}
+
+
+def test_log_is_replayed_over_the_snapshot(journal):
+    for request_id in (1, 2, 3):
+        put(journal, request_id)
+    journal.set_status(2, "approved")
+    journal.delete(3)
+    journal.flush()
+
+    assert statuses(journal) == {1: "pending", 2: "approved"}
+
+
+def test_unknown_ids_are_not_logged(journal):
+    put(journal, 1)
+    assert not journal.set_status(7, "approved")
+    assert not journal.delete(7)
+    journal.flush()
+    assert journal.pending_ops == 1
+
+
+def test_compaction_folds_the_log_into_the_snapshot(journal):
+    for request_id in (1, 2):
+        put(journal, request_id)
+    journal.set_status(1, "rejected")
+    journal.compact()
+
+    assert not os.path.exists(journal.journal_file)
+    assert not os.path.exists(journal.compacting_file)
+    assert journal.pending_ops == 0
+    assert statuses(journal) == {1: "rejected", 2: "pending"}
+
+    #после свертки запись идет в свежий лог / after compaction writes go to a fresh log
+    journal.delete(2)
+    put(journal, 3)
+    journal.flush()
+    assert statuses(journal) == {1: "rejected", 3: "pending"}
+
+
+def test_interrupted_compaction_is_folded_on_load(journal):
+    for request_id in (1, 2):
+        put(journal, request_id)
+    journal.close()
+    #сбой после переименования лога, но до записи снимка / a crash after the log rename but before the snapshot write
+    os.replace(journal.journal_file, journal.compacting_file)
+
+    restarted = bot.RequestJournal(journal.snapshot_file)
+    assert {record['request_id'] for record in restarted.load()} == {1, 2}
+    restarted.set_status(1, "approved")
+    put(restarted, 3)
+    restarted.flush()
+    assert statuses(journal) == {1: "approved", 2: "pending", 3: "pending"}
+
+    #свертка дописывает оставшийся .compacting, свежий лог сворачивается следующей / compaction finishes the leftover .compacting, the fresh log is folded by the next one
+    restarted.compact()
+    assert not os.path.exists(restarted.compacting_file)
+    assert statuses(journal) == {1: "approved", 2: "pending", 3: "pending"}
+    restarted.compact()
+    assert not os.path.exists(restarted.journal_file)
+    assert statuses(journal) == {1: "approved", 2: "pending", 3: "pending"}
+    restarted.close()
+
+
+def test_torn_line_is_skipped_and_closed(journal):
+    put(journal, 1)
+    journal.close()
+    with open(journal.journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"op":"put","da')
+
+    restarted = bot.RequestJournal(journal.snapshot_file)
+    assert [record['request_id'] for record in restarted.load()] == [1]
+    put(restarted, 2)
+    restarted.close()
+    assert statuses(journal) == {1: "pending", 2: "pending"}
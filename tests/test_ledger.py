@@ -0,0 +1,194 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+import bot
+
+
+def trial_balance():
+    return sum(bot.ledger.balances.values())
+
+
+def test_unbalanced_entry_is_rejected(backend):
+    with pytest.raises(ValueError):
+        bot.ledger.post('broken', [(bot.user_account(1, 'balance'), 100)])
+    assert bot.ledger.seq == 0
+
+
+@pytest.mark.parametrize("amount", [float('nan'), float('inf'), float('-inf'), 1e308])
+def test_non_finite_amounts_never_reach_the_ledger(backend, amount):
+    with pytest.raises(ValueError):
+        bot.to_minor(amount)
+
+
+@pytest.mark.parametrize("text", ["nan", "NaN", "inf", "-Infinity", "1e308", "abc"])
+def test_parse_amount_rejects_non_finite_text(text):
+    with pytest.raises(ValueError):
+        bot.parse_amount(text)
+
+
+def test_parse_amount_accepts_plain_numbers():
+    assert bot.parse_amount(" 150.5 ") == 150.5
+    assert bot.to_minor(bot.parse_amount("0.1")) == 10
+
+
+def test_balances_follow_postings(make_user):
+    user = make_user(1)
+    bot.credit_balance(user, 150.5, bot.DEPOSITS_ACCOUNT, 'deposit', 'deposit:1')
+    bot.hold_withdrawal(user, 50, 'withdrawal:1')
+    bot.settle_withdrawal(user, 30, 'withdrawal:1')
+    bot.release_withdrawal(user, 20, 'withdrawal:1')
+    bot.debit_balance(user, 0.5, bot.ADJUSTMENTS_ACCOUNT, 'adjustment')
+
+    assert (user.balance, user.on_hold) == (120, 0)
+    assert bot.ledger.balance(bot.DEPOSITS_ACCOUNT) == -15050
+    assert bot.ledger.balance(bot.WITHDRAWALS_ACCOUNT) == 3000
+    assert trial_balance() == 0
+
+
+def test_snapshot_and_tail_replay_after_restart(make_user, reopen, monkeypatch):
+    monkeypatch.setattr(bot, 'LEDGER_SNAPSHOT_EVERY', 3)
+    user = make_user(1)
+    for request_id in range(1, 6):
+        bot.credit_balance(user, 10, bot.DEPOSITS_ACCOUNT, 'deposit', f"deposit:{request_id}")
+    reopen()
+    assert (bot.ledger.seq, bot.ledger.snapshot_seq) == (5, 5)
+
+    #проводки после снимка читаются из хвоста книги / postings after the snapshot are read from the ledger tail
+    user = bot.get_user_from_json(1)
+    bot.hold_withdrawal(user, 15, 'withdrawal:1')
+    bot.credit_balance(user, 2.25, bot.ADJUSTMENTS_ACCOUNT, 'adjustment')
+    balances = dict(bot.ledger.balances)
+    reopen()
+
+    assert (bot.ledger.seq, bot.ledger.snapshot_seq) == (7, 5)
+    assert bot.ledger.balances == balances
+    user = bot.get_user_from_json(1)
+    assert (user.balance, user.on_hold) == (37.25, 15)
+
+
+def test_replay_without_snapshot_matches_live_balances(make_user, reopen):
+    user = make_user(1)
+    other = make_user(2)
+    bot.credit_balance(user, 99.99, bot.DEPOSITS_ACCOUNT, 'deposit', 'deposit:1')
+    bot.credit_balance(other, 5, bot.DEPOSITS_ACCOUNT, 'deposit', 'deposit:2')
+    bot.hold_withdrawal(other, 5, 'withdrawal:1')
+    balances = dict(bot.ledger.balances)
+    reopen()
+
+    assert bot.ledger.snapshot_seq == 0
+    assert bot.ledger.balances == balances
+    assert trial_balance() == 0
+
+
+def test_forced_snapshot_on_shutdown(make_user, reopen):
+    user = make_user(1)
+    bot.credit_balance(user, 10, bot.DEPOSITS_ACCOUNT, 'deposit', 'deposit:1')
+    reopen(force_snapshot=True)
+    assert bot.ledger.snapshot_seq == bot.ledger.seq == 1
+    assert bot.get_user_from_json(1).balance == 10
+
+
+def test_torn_ledger_line_is_skipped(make_user, reopen, backend):
+    if backend != "json":
+        pytest.skip("torn lines only exist in the JSON ledger")
+    user = make_user(1)
+    bot.credit_balance(user, 10, bot.DEPOSITS_ACCOUNT, 'deposit', 'deposit:1')
+    bot.flush_storage()
+    with open(bot.JSON_LEDGER_FILE, 'ab') as f:
+        f.write(b'{"seq":2,"po')
+    reopen()
+
+    bot.credit_balance(bot.get_user_from_json(1), 1, bot.ADJUSTMENTS_ACCOUNT, 'adjustment')
+    reopen()
+    assert bot.ledger.seq == 2
+    assert bot.get_user_from_json(1).balance == 11
+
+
+def test_reconcile_reports_stale_user_rows(make_user, backend):
+    user = make_user(1)
+    make_user(2)
+    bot.credit_balance(user, 40, bot.DEPOSITS_ACCOUNT, 'deposit', 'deposit:1')
+    bot.hold_withdrawal(user, 15, 'withdrawal:1')
+    assert bot.reconcile_balances() == (0, [])
+
+    #строка пользователя расходится с книгой / the user row disagrees with the ledger
+    if backend == "json":
+        with open(bot.JSON_USERS_FILE, encoding='utf-8') as f:
+            users = json.load(f)
+        for user_data in users:
+            if user_data['user_id'] == 1:
+                user_data['balance'] = 1000
+        with open(bot.JSON_USERS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(users, f)
+    else:
+        bot.storage.conn.execute("UPDATE users SET balance = 1000 WHERE user_id = 1")
+        bot.storage.conn.commit()
+
+    assert bot.reconcile_balances() == (0, [1])
+
+
+def test_legacy_balances_are_carried_over_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bot, 'STORAGE_BACKEND', "json")
+    with open(bot.JSON_USERS_FILE, 'w', encoding='utf-8') as f:
+        json.dump([
+            {'user_id': 1, 'full_name': "A", 'balance': 150.5, 'on_hold': 20, 'verified': True, 'language': 'ru'},
+            {'user_id': 2, 'full_name': "B", 'balance': 0, 'on_hold': 0},
+        ], f)
+    try:
+        bot.init_storage()
+        assert bot.ledger.seq == 1
+        bot.flush_storage()
+        bot.storage.close()
+
+        bot.init_storage()
+        user = bot.get_user_from_json(1)
+        assert bot.ledger.seq == 1
+        assert (user.balance, user.on_hold) == (150.5, 20)
+        assert bot.ledger.balance(bot.OPENING_ACCOUNT) == -17050
+    finally:
+        bot.storage.close()
+
+
+def test_single_decision_is_on_disk_with_its_notification(make_user, backend):
+    user = make_user(5)
+    request = bot.DepositRequest(bot.next_request_id('deposit'), user.user_id, 70)
+    bot.save_request(request)
+    bot.flush_storage()
+
+    assert asyncio.run(bot.decide_request(request, 'approve'))
+    assert not asyncio.run(bot.decide_request(request, 'reject'))
+
+    #без фонового сброса: решение, проводка и уведомление уже записаны / no background flush: the decision, the posting and the notification are already written
+    if backend == "json":
+        with open(bot.JSON_LEDGER_FILE, encoding='utf-8') as f:
+            refs = [json.loads(line)['ref'] for line in f]
+        outbox = bot.JsonStorage().load_outbox()
+        statuses = {record['request_id']: record['status'] for record in bot.RequestJournal(bot.JSON_DEPOSITS_FILE).load()}
+    else:
+        conn = sqlite3.connect(bot.SQLITE_DB_FILE)
+        refs = [row[0] for row in conn.execute("SELECT ref FROM ledger")]
+        outbox = conn.execute("SELECT chat_id FROM outbox").fetchall()
+        statuses = dict(conn.execute("SELECT request_id, status FROM deposits"))
+        conn.close()
+    assert f"deposit:{request.request_id}" in refs
+    assert len(outbox) == 1
+    assert statuses == {request.request_id: "approved"}
+
+
+def test_user_mirror_matches_the_ledger(make_user, reopen):
+    user = make_user(6)
+    bot.credit_balance(user, 80.5, bot.DEPOSITS_ACCOUNT, 'deposit', 'deposit:1')
+    bot.hold_withdrawal(user, 30, 'withdrawal:1')
+    expected = (bot.ledger.balance(bot.user_account(6, 'balance')), bot.ledger.balance(bot.user_account(6, 'on_hold')))
+    assert tuple(bot.ledger.user_balances(6)) == expected == (5050, 3000)
+    assert bot.ledger.user_balances(7) == (0, 0)
+
+    reopen()
+    user = bot.get_user_from_json(6)
+    assert tuple(bot.ledger.user_balances(6)) == expected
+    assert user.to_dict()['balance'] == 50.5
+    assert user.to_row() == (6, "Test User", "1234 567890", 50.5, 30, False, 'ru')
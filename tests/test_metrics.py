@@ -0,0 +1,63 @@
+import asyncio
+
+import bot
+
+
+def test_counters_and_gauges_are_rendered():
+    metrics = bot.Metrics()
+    metrics.counter('errors_total', "Errors")
+    metrics.inc('errors_total', (('method', 'sendMessage'),))
+    metrics.inc('errors_total', (('method', 'sendMessage'),), 2)
+    metrics.gauge('depth', "Queue depth", lambda: 4)
+    metrics.gauge('pending', "Pending by kind", lambda: {(('what', 'users'),): 1})
+
+    assert metrics.render().splitlines() == [
+        "# HELP errors_total Errors",
+        "# TYPE errors_total counter",
+        'errors_total{method="sendMessage"} 3',
+        "# HELP depth Queue depth",
+        "# TYPE depth gauge",
+        "depth 4",
+        "# HELP pending Pending by kind",
+        "# TYPE pending gauge",
+        'pending{what="users"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = bot.Metrics()
+    metrics.histogram('latency_seconds', "Latency", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        metrics.observe('latency_seconds', (('route', 'x'),), value)
+
+    assert metrics.render().splitlines()[2:] == [
+        'latency_seconds_bucket{route="x",le="0.1"} 2',
+        'latency_seconds_bucket{route="x",le="1"} 3',
+        'latency_seconds_bucket{route="x",le="+Inf"} 4',
+        'latency_seconds_sum{route="x"} 3.65',
+        'latency_seconds_count{route="x"} 4',
+    ]
+
+
+def test_label_values_are_escaped_and_failing_gauges_skipped():
+    metrics = bot.Metrics()
+    metrics.counter('calls_total', "Calls")
+    metrics.inc('calls_total', (('route', 'a"b\\c\nd'),))
+    metrics.gauge('broken', "Broken gauge", lambda: 1 / 0)
+
+    text = metrics.render()
+    assert 'calls_total{route="a\\"b\\\\c\\nd"} 1' in text
+    assert "broken" not in text
+
+
+def test_metrics_endpoint(monkeypatch):
+    metrics = bot.Metrics()
+    metrics.counter('requests_total', "Requests")
+    metrics.inc('requests_total')
+    monkeypatch.setattr(bot, 'metrics', metrics)
+
+    request = bot.HttpRequest('GET', '/metrics', "", {}, b"")
+    status, content_type, body = asyncio.run(bot.serve_metrics(request))
+    assert status == 200
+    assert content_type.startswith('text/plain; version=0.0.4')
+    assert body.decode('utf-8').endswith("requests_total 1\n")
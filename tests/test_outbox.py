@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import Forbidden, RetryAfter
+
+import bot
+
+
+class FakeBot:
+    def __init__(self, failures=()):
+        #ошибки для первых вызовов, дальше успех / errors for the first calls, success after that
+        self.failures = list(failures)
+        self.calls = 0
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def outbox(backend, monkeypatch):
+    monkeypatch.setattr(bot, 'OUTBOX_CHAT_INTERVAL', 0)
+    monkeypatch.setattr(bot, 'OUTBOX_GLOBAL_RATE', 1000)
+    monkeypatch.setattr(bot, 'OUTBOX_RETRY_BASE', 0.01)
+    monkeypatch.setattr(bot, 'outbox', bot.Outbox())
+    bot.outbox.load()
+    return bot.outbox
+
+
+def run(fake_bot, body=None, settle=0.05):
+    async def main():
+        workers = bot.outbox.start(fake_bot)
+        if body is not None:
+            await body()
+        await asyncio.sleep(settle)
+        await bot.flush_storage_async()
+        for worker in workers:
+            worker.cancel()
+    asyncio.run(main())
+
+
+def test_nothing_is_sent_before_the_flush(outbox):
+    fake_bot = FakeBot()
+
+    async def body():
+        bot.notify(1, "first")
+        await asyncio.sleep(0.02)
+        assert fake_bot.sent == []
+        await bot.flush_storage_async()
+
+    run(fake_bot, body)
+    assert fake_bot.sent == [(1, "first")]
+    assert outbox.pending_count() == 0
+
+
+def test_undelivered_notifications_survive_a_restart(outbox, reopen):
+    bot.notify_many([(1, "a"), (2, "b")])
+    bot.flush_storage()
+    reopen()
+    bot.outbox.load()
+    assert bot.outbox.pending_count() == 2
+
+    #сохраненное с прошлого запуска уходит без нового сброса / messages saved by the previous run go out without a new flush
+    fake_bot = FakeBot()
+    run(fake_bot)
+    assert fake_bot.sent == [(1, "a"), (2, "b")]
+    reopen()
+    bot.outbox.load()
+    assert bot.outbox.pending_count() == 0
+
+
+def test_retry_after_and_network_errors_are_retried(outbox):
+    bot.notify(1, "retried")
+    bot.flush_storage()
+    fake_bot = FakeBot([RetryAfter(0), ConnectionError("down")])
+    run(fake_bot, settle=0.1)
+    assert fake_bot.calls == 3
+    assert fake_bot.sent == [(1, "retried")]
+    assert outbox.pending_count() == 0
+
+
+def test_hopeless_notifications_are_dropped(outbox, monkeypatch):
+    monkeypatch.setattr(bot, 'OUTBOX_MAX_ATTEMPTS', 2)
+    bot.notify_many([(1, "blocked"), (2, "unreachable")])
+    bot.flush_storage()
+    fake_bot = FakeBot([Forbidden("blocked"), ConnectionError("down"), ConnectionError("down")])
+    run(fake_bot, settle=0.1)
+    assert fake_bot.calls == 3
+    assert fake_bot.sent == []
+    assert outbox.pending_count() == 0
+
+
+def test_messages_to_one_chat_are_spaced(outbox, monkeypatch):
+    monkeypatch.setattr(bot, 'OUTBOX_CHAT_INTERVAL', 0.05)
+    bot.notify_many([(1, "a"), (1, "b"), (2, "c")])
+    bot.flush_storage()
+    fake_bot = FakeBot()
+
+    async def body():
+        await asyncio.sleep(0.02)
+        assert sorted(fake_bot.sent) == [(1, "a"), (2, "c")]
+
+    run(fake_bot, body, settle=0.1)
+    assert fake_bot.sent[-1] == (1, "b")
+
+
+def test_rate_limiter_spreads_calls():
+    limiter = bot.RateLimiter(100)
+
+    async def main():
+        started = time.monotonic()
+        for _ in range(6):
+            await limiter.acquire()
+        return time.monotonic() - started
+
+    #первый вызов сразу, остальные через 10 мс / the first call is immediate, the rest 10 ms apart
+    assert asyncio.run(main()) >= 0.045
@@ -0,0 +1,43 @@
+import bot
+
+
+def page(after=None, before=None):
+    users, has_prev, has_next = bot.get_users_page(after=after, before=before, limit=3)
+    return [user.user_id for user in users], has_prev, has_next
+
+
+def test_empty_list(backend):
+    assert page() == ([], False, False)
+
+
+def test_pages_forward_and_back(make_user, reopen):
+    #пользователи добавляются не по порядку id / users are added out of id order
+    for user_id in (9, 1, 13, 5, 11, 3, 7):
+        make_user(user_id)
+    reopen()
+
+    assert page() == ([1, 3, 5], False, True)
+    assert page(after=5) == ([7, 9, 11], True, True)
+    assert page(after=11) == ([13], True, False)
+    assert page(before=13) == ([7, 9, 11], True, True)
+    assert page(before=7) == ([1, 3, 5], False, True)
+
+
+def test_cursor_of_a_removed_user_still_works(make_user):
+    for user_id in (1, 3, 5, 7):
+        make_user(user_id)
+    #курсор указывает между id, сам пользователь не нужен / the cursor points between ids, the user itself is not needed
+    assert page(after=4) == ([5, 7], True, False)
+    assert page(before=4) == ([1, 3], False, True)
+
+
+def test_unflushed_users_show_up(make_user, reopen):
+    for user_id in (2, 4, 6):
+        make_user(user_id)
+    reopen()
+    assert page() == ([2, 4, 6], False, False)
+
+    make_user(5)
+    assert page() == ([2, 4, 5], False, True)
+    assert page(after=5) == ([6], True, False)
+    assert bot.get_users_page(limit=3)[0][2].full_name == "Test User"
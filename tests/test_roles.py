@@ -0,0 +1,59 @@
+import asyncio
+import types
+
+import pytest
+
+import bot
+
+
+class Query:
+    def __init__(self, user_id, data):
+        self.data = data
+        self.from_user = types.SimpleNamespace(id=user_id)
+        self.edited = []
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edited.append(text)
+
+
+def press(user_id, data, user_data):
+    query = Query(user_id, data)
+    update = types.SimpleNamespace(callback_query=query, effective_user=query.from_user)
+    context = types.SimpleNamespace(user_data=user_data)
+    asyncio.run(bot.handle_callback(update, context))
+    return query.edited
+
+
+@pytest.mark.parametrize("data", ["back_to_admin_user_detail", "admin_back_to_user_detail"])
+def test_user_detail_screen_needs_staff(make_user, data):
+    client = make_user(10)
+    make_user(11, "Staff Member")
+    user_data = {'managed_user': client}
+
+    assert press(10, data, user_data) == []
+    assert 'state' not in user_data
+
+    bot.add_staff_to_json(11, "Staff Member")
+    assert press(11, data, user_data)
+    assert user_data['state'] == bot.ADMIN_USER_DETAIL
+
+
+def test_staff_roles_survive_a_restart(make_user, reopen):
+    admin_id = bot.ADMIN_IDS[0]
+    assert bot.is_admin(admin_id) and bot.is_staff(admin_id)
+    assert not bot.is_staff(12)
+
+    bot.add_staff_to_json(12, "Staff Member")
+    assert bot.is_staff(12) and not bot.is_admin(12)
+    reopen()
+    assert bot.is_staff(12)
+
+
+def test_admin_routes_require_a_role(backend):
+    #все маршруты панели управления закрыты правами / every management panel route is behind a role
+    for route in bot.callback_router.routes:
+        if route.pattern.startswith(("admin_", "approve_", "reject_", "bulk_", "back_to_admin")):
+            assert route.access in ('staff', 'admin'), route.pattern
@@ -0,0 +1,64 @@
+import pytest
+
+import bot
+
+
+def resolve(data):
+    resolved = bot.callback_router.resolve(data)
+    if resolved is None:
+        return None
+    route, args = resolved
+    return route.pattern, list(args)
+
+
+def test_exact_routes_take_no_arguments():
+    assert resolve("register") == ("register", [])
+    assert resolve("back_to_admin_user_detail") == ("back_to_admin_user_detail", [])
+
+
+@pytest.mark.parametrize("data, expected", [
+    ("admin_user_42", ("admin_user_{user_id_to_manage:int}", [42])),
+    ("admin_users_next_42", ("admin_users_next_{after:int}", [42])),
+    ("admin_users_prev_7", ("admin_users_prev_{before:int}", [7])),
+    ("approve_deposit_3", ("approve_deposit_{request_id:int}", [3])),
+    ("bulk_toggle_withdrawal_9", ("bulk_toggle_{kind:str}_{request_id:int}", ['withdrawal', 9])),
+    ("set_language_en", ("set_language_{new_language:str}", ['en'])),
+])
+def test_parameterized_routes_decode_their_arguments(data, expected):
+    assert resolve(data) == expected
+
+
+@pytest.mark.parametrize("data", [
+    "admin_user_abc",
+    "admin_user_",
+    "admin_user_1_2",
+    "approve_deposit",
+    "no_such_route",
+    "",
+])
+def test_unroutable_data_resolves_to_none(data):
+    assert resolve(data) is None
+
+
+def test_longest_prefix_wins_regardless_of_registration_order():
+    router = bot.CallbackRouter()
+
+    @router.route("item_{name:str}")
+    async def item(update, context, user, language):
+        pass
+
+    @router.route("item_next_{after:int}")
+    async def item_next(update, context, user, language):
+        pass
+
+    route, args = router.resolve("item_next_5")
+    assert route.handler is item_next and args == [5]
+    route, args = router.resolve("item_other")
+    assert route.handler is item and args == ['other']
+    #неверный аргумент длинного маршрута не откатывается к короткому / a bad argument for the long route does not fall back to the short one
+    assert router.resolve("item_next_x") is None
+
+
+def test_prefix_must_end_with_separator():
+    with pytest.raises(ValueError):
+        bot.CallbackRoute("item{name}", None)
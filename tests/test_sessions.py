@@ -0,0 +1,70 @@
+import asyncio
+import types
+
+import bot
+
+
+def restore(user_id):
+    user_data = {}
+    bot.session_store.restore(user_id, user_data)
+    return user_data
+
+
+def test_session_survives_a_restart(make_user, reopen):
+    client = make_user(1)
+    make_user(2, "Staff Member")
+    request = bot.DepositRequest(bot.next_request_id('deposit'), client.user_id, 40)
+    bot.save_request(request)
+    bot.session_store.track(2, {
+        'state': bot.ADMIN_USER_DETAIL,
+        'managed_user': client,
+        'current_deposit_request': request,
+        'bulk_selected': {3, 1},
+        'bulk_kind': 'deposit',
+    })
+    reopen()
+
+    #кешированные объекты перечитываются из хранилища / cached objects are re-read from storage
+    user_data = restore(2)
+    assert user_data['state'] == bot.ADMIN_USER_DETAIL
+    assert user_data['managed_user'].user_id == 1
+    assert user_data['current_deposit_request'].request_id == request.request_id
+    assert user_data['bulk_selected'] == {1, 3}
+    assert user_data['bulk_kind'] == 'deposit'
+
+
+def test_vanished_references_are_dropped(make_user, reopen):
+    make_user(1)
+    bot.session_store.track(1, {'state': bot.START, 'managed_user': bot.User(5, "Gone", "")})
+    reopen()
+    assert restore(1) == {'state': bot.START}
+
+
+def test_unchanged_and_emptied_sessions(make_user, reopen):
+    make_user(1)
+    bot.session_store.track(1, {'state': bot.START})
+    bot.flush_storage()
+    #повторная отметка без изменений ничего не пишет / tracking an unchanged session writes nothing
+    bot.session_store.track(1, {'state': bot.START})
+    assert bot.session_store.pending_count() == 0
+
+    bot.session_store.track(1, {})
+    assert bot.session_store.pending_count() == 1
+    reopen()
+    assert restore(1) == {}
+
+
+def test_session_is_read_once_per_user(backend, monkeypatch):
+    bot.session_store.track(1, {'state': bot.START})
+    bot.flush_storage()
+    bot.session_store.reset()
+    reads = []
+    load_session = bot.storage.load_session
+    monkeypatch.setattr(bot.storage, 'load_session', lambda user_id: reads.append(user_id) or load_session(user_id))
+
+    update = types.SimpleNamespace(effective_user=types.SimpleNamespace(id=1))
+    context = types.SimpleNamespace(user_data={})
+    for _ in range(3):
+        asyncio.run(bot.load_session(update, context))
+    assert reads == [1]
+    assert context.user_data == {'state': bot.START}